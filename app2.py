@@ -1,90 +1,149 @@
-from flask import Flask, render_template_string, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify, send_file
 import os
 from datetime import date, datetime, timedelta
 import json
 import sys
+import tempfile
 import sqlite3
 from io import BytesIO
-from server.db import init_db, recalc_all_streaks as recalc_all_streaks_db, update_streak as update_streak_db
+from server import analytics, assets, export, habit_search, history, importer, metrics, planner_due, planner_tasks, profiling
+from server.connection import configure as configure_db, connect, get_db, init_app as init_db_app, open_connection
+from server.combinations import get_engine as get_combination_engine, invalidate as invalidate_combinations
+from server.db import friction_multiplier, init_db
+from server.loaders import get_or_create_habits, streaks_by_habit, subtasks_by_habit
+from server.roadmap import RoadmapIndex
+from server.roadmap_search import RoadmapSearch
+from server.rollups import all_time_totals, apply_day_changes, range_totals, rebuild as rebuild_rollups_db, snapshot_days
+from server.streaks import rebuild_all as rebuild_all_streaks, success_habits_on, sync_day as sync_streaks_day
+from server.versioning import bumps, conditional
+from server.writer import submit as submit_write, write
+
+# /static отдаёт server.assets (кеш с gzip и ETag), а не встроенный маршрут Flask
+app = Flask(__name__, static_folder=None)
+# Общий слой соединений SQLite (WAL, прагмы, одно соединение на поток)
+init_db_app(app)
+# Метрики маршрутов и SQL (/api/metrics, заголовок Server-Timing)
+metrics.init_app(app)
 
-app = Flask(__name__)
-
-# Загружаем HTML-код
 # Получаем директорию, где находится app.py
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 HTML_FILE = os.path.join(BASE_DIR, 'report_generator.html')
 PLANNER_FILE = os.path.join(BASE_DIR, 'planner.html')
+TASKS_FILE = os.path.join(BASE_DIR, 'tasks.html')
+PORTABLE_FILE = os.path.join(BASE_DIR, 'portable_report.html')
 
-# Проверяем существование файла
-if not os.path.exists(HTML_FILE):
-    print(f"❌ Файл не найден: {HTML_FILE}")
-    print(f"📍 Текущая директория: {BASE_DIR}")
-    print(f"📁 Содержимое директории: {os.listdir(BASE_DIR)}")
-    sys.exit(1)
+# Страницы и /static: собираются в байты один раз (в create_app), с gzip и ETag
+page_cache = assets.init_app(app, os.path.join(BASE_DIR, 'static'))
 
-# Загружаем HTML-код
-with open(HTML_FILE, 'r', encoding='utf-8') as f:
-    HTML_TEMPLATE = f.read()
+# Профилирование отдельных запросов по требованию (флаг PROFILING + X-Profile: 1)
+profiling.init_app(app, os.path.join(BASE_DIR, 'profiles'))
 
-# Загружаем шаблон планировщика (если есть)
-PLANNER_TEMPLATE = None
-if os.path.exists(PLANNER_FILE):
-    with open(PLANNER_FILE, 'r', encoding='utf-8') as f:
-        PLANNER_TEMPLATE = f.read()
+# Папка дорожных карт планировщика и её кеш
+app.config.setdefault('ROADMAPS_DIR', os.path.join(BASE_DIR, 'roadmaps'))
+roadmap_index = RoadmapIndex(app.config['ROADMAPS_DIR'])
+# Полнотекстовый индекс дорожных карт (отдельная БД рядом с папкой; создаётся в create_app)
+app.config.setdefault('ROADMAP_INDEX_DB', None)
+roadmap_search = None
+# Интервалы повторений задач обучающих проектов (дни по числу сделанных повторений)
+app.config.setdefault('PLANNER_REVIEW_INTERVALS', planner_due.DEFAULT_INTERVALS)
 
-# Загружаем шаблон страницы мелких задач (если есть)
-TASKS_FILE = os.path.join(BASE_DIR, 'tasks.html')
-TASKS_TEMPLATE = None
-if os.path.exists(TASKS_FILE):
-    with open(TASKS_FILE, 'r', encoding='utf-8') as f:
-        TASKS_TEMPLATE = f.read()
 
-print(f"✅ HTML файл загружен: {HTML_FILE}")
+def _load_templates():
+    """Собрать HTML-страницы в кеш (шаблоны без переменных — рендерятся один раз)"""
+    # Проверяем существование файла
+    if not os.path.exists(HTML_FILE):
+        print(f"❌ Файл не найден: {HTML_FILE}")
+        print(f"📍 Текущая директория: {BASE_DIR}")
+        print(f"📁 Содержимое директории: {os.listdir(BASE_DIR)}")
+        sys.exit(1)
+
+    page_cache.add_page('index', HTML_FILE)
+    # Планировщик, мелкие задачи и портативная версия — если файлы есть
+    page_cache.add_page('planner', PLANNER_FILE)
+    page_cache.add_page('tasks', TASKS_FILE)
+    page_cache.add_page('portable', PORTABLE_FILE)
+
+    print(f"✅ HTML файл загружен: {HTML_FILE}")
+
+
+def create_app(config=None, init_schema=True):
+    """Настроить приложение и вернуть его.
+
+    `config` — переопределения app.config (DATABASE, ROADMAPS_DIR, SQLITE_*,
+    PROFILING, ...). Схема БД создаётся/обновляется здесь, если `init_schema`;
+    при запуске нескольких процессов (serve.py) это делается один раз в
+    родительском процессе до fork.
+    """
+    global roadmap_index, roadmap_search
+    if config:
+        app.config.update(config)
+    configure_db(
+        db_path=app.config['DATABASE'],
+        cache_size_kb=app.config['SQLITE_CACHE_SIZE_KB'],
+        mmap_size=app.config['SQLITE_MMAP_SIZE'],
+    )
+    _load_templates()
+
+    # Инициализация БД (вынесена в модуль server.db)
+    if init_schema:
+        init_db()
+
+    if roadmap_index.root != app.config['ROADMAPS_DIR']:
+        roadmap_index = RoadmapIndex(app.config['ROADMAPS_DIR'])
+    if roadmap_search is None or roadmap_search.root != app.config['ROADMAPS_DIR']:
+        roadmap_search = RoadmapSearch(app.config['ROADMAPS_DIR'], app.config['ROADMAP_INDEX_DB'])
+    # файлы, изменённые мимо приложения, — перечитываются только они (по size/mtime)
+    roadmap_search.reconcile()
+    # метаданные задач: строки для файлов, появившихся мимо приложения (как init_db — до fork)
+    conn = connect()
+    planner_tasks.reconcile(conn, app.config['ROADMAPS_DIR'], app.config['PLANNER_REVIEW_INTERVALS'])
+    conn.commit()
+    return app
 
-# Инициализация БД (вынесена в модуль server.db)
-init_db()
 
 @app.route('/')
 def index():
     """Главная страница с генератором отчетов"""
-    return render_template_string(HTML_TEMPLATE)
+    return assets.respond(page_cache.page('index'))
 
 
 @app.route('/planner')
 def planner_page():
     """Отдельная страница планировщика"""
-    if PLANNER_TEMPLATE:
-        return render_template_string(PLANNER_TEMPLATE)
+    page = page_cache.page('planner')
+    if page is not None:
+        return assets.respond(page)
     return "Planner page not found", 404
 
 @app.route('/tasks')
 def tasks_page():
     """Отдельная страница для примитивного планировщика мелких дел"""
-    if TASKS_TEMPLATE:
-        return render_template_string(TASKS_TEMPLATE)
+    page = page_cache.page('tasks')
+    if page is not None:
+        return assets.respond(page)
     return "Tasks page not found", 404
 
 @app.route('/portable_report.html')
 def portable_page():
     """Портативная версия генератора отчётов (можно открывать и как файл)"""
-    path = os.path.join(BASE_DIR, 'portable_report.html')
-    if os.path.exists(path):
-        with open(path, 'r', encoding='utf-8') as f:
-            return render_template_string(f.read())
+    page = page_cache.page('portable')
+    if page is not None:
+        return assets.respond(page)
     return "Portable generator not found", 404
 
 # ============ API для работы с привычками ============
 
 @app.route('/api/habits', methods=['GET'])
+@conditional('habits')
 def get_habits():
     """Получение списка всех привычек из справочника"""
     try:
         category = request.args.get('category')
         search = request.args.get('search', '')
         
-        conn = sqlite3.connect('habits.db')
-        conn.row_factory = sqlite3.Row
+        conn = get_db()
         cursor = conn.cursor()
+        cursor.row_factory = sqlite3.Row
         
         query = "SELECT * FROM habits WHERE is_active = 1"
         params = []
@@ -94,49 +153,85 @@ def get_habits():
             params.append(category)
         
         if search:
-            query += " AND (name LIKE ? OR description LIKE ?)"
-            params.append(f"%{search}%")
-            params.append(f"%{search}%")
+            match = habit_search.match_query(search) if habit_search.available(conn) else None
+            if match:
+                query += " AND id IN (SELECT rowid FROM habits_fts WHERE habits_fts MATCH ?)"
+                params.append(match)
+            else:
+                query += " AND (name LIKE ? OR description LIKE ?)"
+                params.append(f"%{search}%")
+                params.append(f"%{search}%")
         
         query += " ORDER BY category, name"
         
         cursor.execute(query, params)
         habits = [dict(row) for row in cursor.fetchall()]
         
-        # Загружаем подзадачи для составных привычек
+        # Загружаем подзадачи для составных привычек (одним запросом)
+        subtasks = subtasks_by_habit(conn, [habit['id'] for habit in habits if habit['is_composite']])
         for habit in habits:
             if habit['is_composite']:
-                cursor.execute('SELECT * FROM habit_subtasks WHERE habit_id = ? ORDER BY order_index', (habit['id'],))
-                habit['subtasks'] = [dict(row) for row in cursor.fetchall()]
+                habit['subtasks'] = subtasks[habit['id']]
         
-        conn.close()
         
         return jsonify({'status': 'success', 'data': habits})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+@app.route('/api/habits/search', methods=['GET'])
+@conditional('habits')
+def search_habits():
+    """Поиск по справочнику по мере ввода: ?q=текст&limit=N&category=...
+
+    Лучшие совпадения сначала; у каждой привычки — highlight (название
+    с <mark>) и snippet (фрагмент любого поля с совпадением).
+    """
+    try:
+        q = request.args.get('q', '')
+        category = request.args.get('category')
+        try:
+            limit = int(request.args.get('limit', habit_search.DEFAULT_LIMIT))
+        except ValueError:
+            return jsonify({'status': 'error', 'message': 'limit must be an integer'}), 400
+        limit = max(1, min(limit, habit_search.MAX_LIMIT))
+
+        conn = get_db()
+        if not habit_search.available(conn):
+            return jsonify({'status': 'error', 'message': 'full-text search (FTS5) is not available'}), 501
+        habits = habit_search.search(conn, q, limit, category)
+
+        subtasks = subtasks_by_habit(conn, [habit['id'] for habit in habits if habit['is_composite']])
+        for habit in habits:
+            habit['rank'] = round(habit['rank'], 4)
+            if habit['is_composite']:
+                habit['subtasks'] = subtasks[habit['id']]
+        return jsonify({'status': 'success', 'data': habits})
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
 @app.route('/api/habits/categories', methods=['GET'])
+@conditional('habits')
 def get_categories():
     """Получение списка всех категорий"""
     try:
-        conn = sqlite3.connect('habits.db')
+        conn = get_db()
         cursor = conn.cursor()
         
         cursor.execute('SELECT DISTINCT category FROM habits WHERE is_active = 1 ORDER BY category')
         categories = [row[0] for row in cursor.fetchall()]
         
-        conn.close()
         
         return jsonify({'status': 'success', 'data': categories})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 @app.route('/api/combinations', methods=['GET'])
+@conditional('combinations', 'habits')
 def get_combinations():
     try:
-        conn = sqlite3.connect('habits.db')
-        conn.row_factory = sqlite3.Row
+        conn = get_db()
         cursor = conn.cursor()
+        cursor.row_factory = sqlite3.Row
         cursor.execute('''
             SELECT c.*, ha.name as name_a, hb.name as name_b
             FROM combinations c
@@ -146,31 +241,60 @@ def get_combinations():
             ORDER BY c.id DESC
         ''')
         combos = [dict(r) for r in cursor.fetchall()]
-        conn.close()
-        return jsonify({'status': 'success', 'data': combos})
+
+        # Сочетания из трёх и более привычек
+        cursor.execute('''
+            SELECT g.*, group_concat(m.habit_id) as member_ids
+            FROM combo_groups g
+            JOIN combo_group_members m ON m.group_id = g.id
+            WHERE g.is_active = 1
+            GROUP BY g.id
+            ORDER BY g.id DESC
+        ''')
+        groups = []
+        for r in cursor.fetchall():
+            group = dict(r)
+            group['habits'] = [int(x) for x in (group.pop('member_ids') or '').split(',') if x]
+            groups.append(group)
+        return jsonify({'status': 'success', 'data': combos, 'groups': groups})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+def _insert_combination(conn, name, members, values):
+    """Запись сочетания (единица работы писателя)"""
+    cursor = conn.cursor()
+    if len(members) == 2:
+        # упорядочим (habit_a < habit_b)
+        a, b = members
+        cursor.execute('''
+            INSERT INTO combinations (name, habit_a, habit_b, i, s, w, e, c, h, st, money, is_active)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (name, a, b) + values + (1,))
+        return {'status':'success','id': cursor.lastrowid}
+    cursor.execute('''
+        INSERT INTO combo_groups (name, i, s, w, e, c, h, st, money, is_active)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (name,) + values + (1,))
+    group_id = cursor.lastrowid
+    cursor.executemany('INSERT INTO combo_group_members (group_id, habit_id) VALUES (?, ?)',
+                       [(group_id, h) for h in members])
+    return {'status':'success','group_id': group_id}
+
+
 @app.route('/api/combinations', methods=['POST'])
+@bumps('combinations')
 def create_combination():
+    """Создание сочетания: пара (habit_a, habit_b) или группа из списка habits"""
     try:
         data = request.json
-        a = int(data.get('habit_a'))
-        b = int(data.get('habit_b'))
-        if a == b:
+        if data.get('habits'):
+            members = sorted(set(int(h) for h in data.get('habits')))
+        else:
+            members = sorted(set([int(data.get('habit_a')), int(data.get('habit_b'))]))
+        if len(members) < 2:
             return jsonify({'status':'error','message':'habit_a and habit_b must be different'}), 400
-        # упорядочим (habit_a < habit_b)
-        if a > b:
-            a, b = b, a
 
-        conn = sqlite3.connect('habits.db')
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO combinations (name, habit_a, habit_b, i, s, w, e, c, h, st, money, is_active)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            data.get('name'),
-            a, b,
+        values = (
             float(data.get('i', 0.0)),
             float(data.get('s', 0.0)),
             float(data.get('w', 0.0)),
@@ -179,332 +303,475 @@ def create_combination():
             float(data.get('h', 0.0)),
             float(data.get('st', 0.0)),
             float(data.get('money', 0.0)),
-            1
-        ))
-        conn.commit()
-        combo_id = cursor.lastrowid
-        conn.close()
-        return jsonify({'status':'success','id': combo_id})
+        )
+
+        result = write(_insert_combination, data.get('name'), members, values)
+        invalidate_combinations()
+        return jsonify(result)
     except Exception as e:
         return jsonify({'status':'error','message':str(e)}), 500
 
 
+@app.route('/api/combinations/bonuses', methods=['GET'])
+@conditional('combinations', 'habits', 'days')
+def get_combination_bonuses():
+    """Пересчёт бонусов сочетаний за диапазон дней (по текущему набору сочетаний)"""
+    try:
+        start = request.args.get('start', '0000-01-01')
+        end = request.args.get('end', '9999-12-31')
+        conn = get_db()
+        bonuses = get_combination_engine(conn).rescore(conn, start, end)
+        return jsonify({'status': 'success', 'data': bonuses})
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
+def _insert_habit(conn, data):
+    """Запись новой привычки с подзадачами (единица работы писателя); None — если уже есть"""
+    cursor = conn.cursor()
+
+    # Проверяем, существует ли уже такая привычка
+    cursor.execute('SELECT id FROM habits WHERE name = ? AND category = ?', 
+                  (data['name'], data.get('category', 'Без категории')))
+    if cursor.fetchone():
+        return None
+    
+    # Добавляем привычку
+    cursor.execute('''
+        INSERT INTO habits 
+        (name, category, description, default_quantity, unit, 
+         i, s, w, e, c, h, st, money, is_composite)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (
+        data['name'],
+        data.get('category', 'Без категории'),
+        data.get('description'),
+        data.get('default_quantity'),
+        data.get('unit'),
+        data.get('i', 0.0),
+        data.get('s', 0.0),
+        data.get('w', 0.0),
+        data.get('e', 0.0),
+        data.get('c', 0.0),
+        data.get('h', 0.0),
+        data.get('st', 0.0),
+        data.get('money', 0.0),
+        1 if data.get('is_composite') else 0
+    ))
+    
+    habit_id = cursor.lastrowid
+    
+    # Если привычка составная, добавляем подзадачи
+    if data.get('is_composite') and data.get('subtasks'):
+        for i, subtask in enumerate(data['subtasks']):
+            cursor.execute('''
+                INSERT INTO habit_subtasks 
+                (habit_id, name, default_quantity, unit, i, s, w, e, c, h, st, money, order_index)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                habit_id,
+                subtask['name'],
+                subtask.get('default_quantity'),
+                subtask.get('unit'),
+                subtask.get('i', 0.0),
+                subtask.get('s', 0.0),
+                subtask.get('w', 0.0),
+                subtask.get('e', 0.0),
+                subtask.get('c', 0.0),
+                subtask.get('h', 0.0),
+                subtask.get('st', 0.0),
+                subtask.get('money', 0.0),
+                i
+            ))
+    return habit_id
+
+
 @app.route('/api/habits', methods=['POST'])
+@bumps('habits')
 def add_habit():
     """Добавление новой привычки в справочник"""
     try:
         data = request.json
-        
-        conn = sqlite3.connect('habits.db')
-        cursor = conn.cursor()
-        
-        # Проверяем, существует ли уже такая привычка
-        cursor.execute('SELECT id FROM habits WHERE name = ? AND category = ?', 
-                      (data['name'], data.get('category', 'Без категории')))
-        if cursor.fetchone():
-            conn.close()
+        habit_id = write(_insert_habit, data)
+        if habit_id is None:
             return jsonify({'status': 'error', 'message': 'Привычка уже существует'}), 400
-        
-        # Добавляем привычку
-        cursor.execute('''
-            INSERT INTO habits 
-            (name, category, description, default_quantity, unit, 
-             i, s, w, e, c, h, st, money, is_composite)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            data['name'],
-            data.get('category', 'Без категории'),
-            data.get('description'),
-            data.get('default_quantity'),
-            data.get('unit'),
-            data.get('i', 0.0),
-            data.get('s', 0.0),
-            data.get('w', 0.0),
-            data.get('e', 0.0),
-            data.get('c', 0.0),
-            data.get('h', 0.0),
-            data.get('st', 0.0),
-            data.get('money', 0.0),
-            1 if data.get('is_composite') else 0
-        ))
-        
-        habit_id = cursor.lastrowid
-        
-        # Если привычка составная, добавляем подзадачи
-        if data.get('is_composite') and data.get('subtasks'):
-            for i, subtask in enumerate(data['subtasks']):
-                cursor.execute('''
-                    INSERT INTO habit_subtasks 
-                    (habit_id, name, default_quantity, unit, i, s, w, e, c, h, st, money, order_index)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    habit_id,
-                    subtask['name'],
-                    subtask.get('default_quantity'),
-                    subtask.get('unit'),
-                    subtask.get('i', 0.0),
-                    subtask.get('s', 0.0),
-                    subtask.get('w', 0.0),
-                    subtask.get('e', 0.0),
-                    subtask.get('c', 0.0),
-                    subtask.get('h', 0.0),
-                    subtask.get('st', 0.0),
-                    subtask.get('money', 0.0),
-                    i
-                ))
-        
-        conn.commit()
-        conn.close()
-        
         return jsonify({'status': 'success', 'habit_id': habit_id})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+
+def _update_habit_row(conn, habit_id, data):
+    """Обновление основных данных привычки (единица работы писателя)"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        UPDATE habits SET
+            name = COALESCE(?, name),
+            category = COALESCE(?, category),
+            description = COALESCE(?, description),
+            default_quantity = COALESCE(?, default_quantity),
+            unit = COALESCE(?, unit),
+            i = COALESCE(?, i),
+            s = COALESCE(?, s),
+            w = COALESCE(?, w),
+            e = COALESCE(?, e),
+            c = COALESCE(?, c),
+            h = COALESCE(?, h),
+            st = COALESCE(?, st),
+            money = COALESCE(?, money),
+            updated_at = CURRENT_TIMESTAMP
+        WHERE id = ?
+    ''', (
+        data.get('name'),
+        data.get('category'),
+        data.get('description'),
+        data.get('default_quantity'),
+        data.get('unit'),
+        data.get('i'),
+        data.get('s'),
+        data.get('w'),
+        data.get('e'),
+        data.get('c'),
+        data.get('h'),
+        data.get('st'),
+        data.get('money'),
+        habit_id
+    ))
+
+
 @app.route('/api/habits/<int:habit_id>', methods=['PUT'])
+@bumps('habits')
 def update_habit(habit_id):
     """Обновление привычки в справочнике"""
     try:
         data = request.json
         
-        conn = sqlite3.connect('habits.db')
-        cursor = conn.cursor()
-        
-        # Обновляем основные данные
-        cursor.execute('''
-            UPDATE habits SET
-                name = COALESCE(?, name),
-                category = COALESCE(?, category),
-                description = COALESCE(?, description),
-                default_quantity = COALESCE(?, default_quantity),
-                unit = COALESCE(?, unit),
-                i = COALESCE(?, i),
-                s = COALESCE(?, s),
-                w = COALESCE(?, w),
-                e = COALESCE(?, e),
-                c = COALESCE(?, c),
-                h = COALESCE(?, h),
-                st = COALESCE(?, st),
-                money = COALESCE(?, money),
-                updated_at = CURRENT_TIMESTAMP
-            WHERE id = ?
-        ''', (
-            data.get('name'),
-            data.get('category'),
-            data.get('description'),
-            data.get('default_quantity'),
-            data.get('unit'),
-            data.get('i'),
-            data.get('s'),
-            data.get('w'),
-            data.get('e'),
-            data.get('c'),
-            data.get('h'),
-            data.get('st'),
-            data.get('money'),
-            habit_id
-        ))
-        
-        conn.commit()
-        conn.close()
-        
+        write(_update_habit_row, habit_id, data)
         return jsonify({'status': 'success'})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+def _deactivate_habit(conn, habit_id):
+    conn.execute('UPDATE habits SET is_active = 0 WHERE id = ?', (habit_id,))
+
+
 @app.route('/api/habits/<int:habit_id>', methods=['DELETE'])
+@bumps('habits')
 def delete_habit(habit_id):
     """Удаление привычки из справочника"""
     try:
-        conn = sqlite3.connect('habits.db')
-        cursor = conn.cursor()
-        
         # Мягкое удаление
-        cursor.execute('UPDATE habits SET is_active = 0 WHERE id = ?', (habit_id,))
-        
-        conn.commit()
-        conn.close()
-        
+        write(_deactivate_habit, habit_id)
+        invalidate_combinations()
+
         return jsonify({'status': 'success'})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-# ============ API для работы с выполненными привычками ============
 
-def update_streak(habit_id, date_str, success):
-    """Обновление/создание стрика для привычки"""
-    # Перенаправляем вызов в реализацию в server.db
+@app.route('/api/habits/<int:habit_id>/history', methods=['GET'])
+@conditional('days', 'habits')
+def get_habit_history(habit_id):
+    """История выполнений привычки за период.
+
+    ?start=&end= — период; ?group=week|month — итоги по периодам;
+    иначе страницы по (date, id): ?limit=N&after=<next_cursor>&order=asc|desc
+    """
     try:
-        update_streak_db(habit_id, date_str, success)
+        start, end = request.args.get('start'), request.args.get('end')
+        group = request.args.get('group')
+        order = request.args.get('order', 'asc')
+        if group and group not in history.GROUPS:
+            return jsonify({'status': 'error', 'message': f'group must be one of: {", ".join(history.GROUPS)}'}), 400
+        if order not in ('asc', 'desc'):
+            return jsonify({'status': 'error', 'message': 'order must be asc or desc'}), 400
+        try:
+            limit = int(request.args.get('limit', history.DEFAULT_LIMIT))
+            after = request.args.get('after')
+            after = history.parse_cursor(after) if after else None
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        limit = max(1, min(limit, history.MAX_LIMIT))
+
+        conn = get_db()
+        if conn.execute('SELECT 1 FROM habits WHERE id = ?', (habit_id,)).fetchone() is None:
+            return jsonify({'status': 'error', 'message': 'habit not found'}), 404
+
+        if group:
+            data = history.grouped(conn, habit_id, group, start, end)
+            return jsonify({'status': 'success', 'group': group, 'data': data})
+        data, next_cursor = history.page(conn, habit_id, start, end, after, limit, descending=order == 'desc')
+        return jsonify({'status': 'success', 'data': data, 'next_cursor': next_cursor})
     except Exception as e:
-        print(f"Error forwarding update_streak: {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
 
-@app.route('/api/completions', methods=['POST'])
-def save_completions():
-    """Сохранение выполненных привычек за день (и пересчёт стриков)
-       + применение индекса трения (friction_index 1..10 -> множитель 1..3)
-    """
+# ============ API для работы с выполненными привычками ============
+
+COMPLETION_FIELDS = ('quantity', 'success', 'i', 's', 'w', 'e', 'c', 'h', 'st', 'money',
+                     'day_number', 'state', 'emotion_morning', 'thoughts')
+
+
+def _friction_from(data):
+    """Индекс трения 1..10 и множитель (1 -> 1.0, 10 -> 2.0)"""
+    # --- НОВОЕ: читаем индекс трения и вычисляем множитель (переиграли, теперь максимально х2) ---
+    return friction_multiplier(data.get('friction_index', 1))
+
+
+def _as_real(value):
+    """Значение для столбца REAL так, как его сохранит SQLite: число -> float, пусто -> None"""
+    if value is None or value == '':
+        return None
     try:
-        data = request.json
-        day_date = data.get('date', date.today().isoformat())
+        return float(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def _as_integer(value):
+    """Значение для столбца INTEGER так, как его сохранит SQLite ("3" и 3.0 -> 3)"""
+    real = _as_real(value)
+    if isinstance(real, float) and real.is_integer():
+        return int(real)
+    return real
+
+
+def _as_text(value):
+    """Значение для столбца TEXT так, как его сохранит SQLite (числа -> строка)"""
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, bool):
+        return str(int(value))
+    return str(value)
 
-        # --- НОВОЕ: читаем индекс трения и вычисляем множитель (переиграли, теперь максимально х2) ---
+
+def _completion_values(data, habit):
+    """Значения COMPLETION_FIELDS для одной привычки из тела запроса
+
+    Значения приведены к типам столбцов, чтобы сравнение с сохранёнными
+    строками (_diff_day_rows) не видело разницы между "5" и 5.0 или True и 1.
+    """
+    # характеристики сохраняем как пришли (умножение к общей сумме применим ниже)
+    def _r(v):
         try:
-            friction = int(data.get('friction_index', 1) or 1)
+            return float(v or 0.0)
         except Exception:
-            friction = 1
-        # Ограничим 1..10
-        friction = max(1, min(10, friction))
-        # Линейная шкала: 1 -> 1.0, 10 -> 2.0 (нерфим мультипликатор)
-        multiplier = 1.0 + (friction - 1) * (1.0 / 9.0)
+            return 0.0
+
+    return (
+        _as_real(habit.get('quantity')),
+        1 if habit.get('success') else 0,
+        _r(habit.get('i', 0.0)),
+        _r(habit.get('s', 0.0)),
+        _r(habit.get('w', 0.0)),
+        _r(habit.get('e', 0.0)),
+        _r(habit.get('c', 0.0)),
+        _r(habit.get('h', 0.0)),
+        _r(habit.get('st', 0.0)),
+        _r(habit.get('money', 0.0)),
+        _as_integer(data.get('day_number')),
+        _as_text(data.get('state')),
+        _as_text(data.get('emotion_morning')),
+        _as_text(data.get('thoughts')),
+    )
+
+
+def _incoming_habits(data):
+    """Привычки из тела запроса (только с habit_id)"""
+    habits = []
+    for habit in data.get('habits', []):
+        if not habit.get('habit_id'):
+            print('Skipping habit without habit_id:', habit)
+            continue
+        habits.append(habit)
+    return habits
+
+
+def _incoming_rows(data):
+    """{(habit_id, subtask_id): значения COMPLETION_FIELDS} из тела запроса
+
+    Ключ приведён к целым (id может прийти строкой "3"); повтор ключа — последняя строка.
+    Так строки дня строят оба пути сохранения: полная перезапись и по разнице.
+    """
+    rows = {}
+    for habit in _incoming_habits(data):
+        key = (int(habit['habit_id']), _as_integer(habit.get('subtask_id')))
+        rows[key] = _completion_values(data, habit)
+    return rows
 
-        conn = sqlite3.connect('habits.db')
-        cursor = conn.cursor()
 
-        # Удаляем старые записи за этот день
-        cursor.execute('DELETE FROM completed_habits WHERE date = ?', (day_date,))
-
-        # Сохраняем каждую привычку (только если есть habit_id)
-        for habit in data.get('habits', []):
-            if not habit.get('habit_id'):
-                print('Skipping habit without habit_id:', habit)
-                continue
-
-            # характеристики сохраняем как пришли (умножение к общей сумме применим ниже)
-            def _r(v):
-                try:
-                    return float(v or 0.0)
-                except Exception:
-                    return 0.0
-
-            i_val = _r(habit.get('i', 0.0))
-            s_val = _r(habit.get('s', 0.0))
-            w_val = _r(habit.get('w', 0.0))
-            e_val = _r(habit.get('e', 0.0))
-            c_val = _r(habit.get('c', 0.0))
-            h_val = _r(habit.get('h', 0.0))
-            st_val = _r(habit.get('st', 0.0))
-            money_val = _r(habit.get('money', 0.0))
+def _replace_day_rows(cursor, day_date, data):
+    """Полная перезапись дня: удалить все строки и вставить заново"""
+    cursor.execute('DELETE FROM completed_habits WHERE date = ?', (day_date,))
+    cursor.executemany(
+        'INSERT INTO completed_habits (habit_id, subtask_id, date, ' + ', '.join(COMPLETION_FIELDS) + ')'
+        ' VALUES (' + ', '.join('?' * (3 + len(COMPLETION_FIELDS))) + ')',
+        [key + (day_date,) + values for key, values in _incoming_rows(data).items()])
 
-            cursor.execute('''
-                INSERT INTO completed_habits 
-                (habit_id, date, quantity, success, i, s, w, e, c, h, st, money, 
-                 day_number, state, emotion_morning, thoughts)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                habit.get('habit_id'),
-                day_date,
-                habit.get('quantity'),
-                1 if habit.get('success') else 0,
-                i_val,
-                s_val,
-                w_val,
-                e_val,
-                c_val,
-                h_val,
-                st_val,
-                money_val,
-                data.get('day_number'),
-                data.get('state'),
-                data.get('emotion_morning'),
-                data.get('thoughts')
-            ))
 
-        # ---- вычислить и применить бонусы сочетаний ----
-        try:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            cursor.execute('SELECT DISTINCT habit_id FROM completed_habits WHERE date = ? AND success = 1', (day_date,))
-            done_ids = set([r['habit_id'] for r in cursor.fetchall()])
-
-            if done_ids:
-                cursor.execute('SELECT * FROM combinations WHERE is_active = 1')
-                combos = [dict(r) for r in cursor.fetchall()]
-                combo_bonus = {'I':0.0,'S':0.0,'W':0.0,'E':0.0,'C':0.0,'H':0.0,'ST':0.0,'$':0.0}
-                for c in combos:
-                    if c['habit_a'] in done_ids and c['habit_b'] in done_ids:
-                        combo_bonus['I'] += c.get('i', 0.0) or 0.0
-                        combo_bonus['S'] += c.get('s', 0.0) or 0.0
-                        combo_bonus['W'] += c.get('w', 0.0) or 0.0
-                        combo_bonus['E'] += c.get('e', 0.0) or 0.0
-                        combo_bonus['C'] += c.get('c', 0.0) or 0.0
-                        combo_bonus['H'] += c.get('h', 0.0) or 0.0
-                        combo_bonus['ST'] += c.get('st', 0.0) or 0.0
-                        combo_bonus['$'] += c.get('money', 0.0) or 0.0
-
-                totals = data.get('totals', {}) or {}
-                totals = {
-                    'I': totals.get('I', 0.0) + combo_bonus['I'],
-                    'S': totals.get('S', 0.0) + combo_bonus['S'],
-                    'W': totals.get('W', 0.0) + combo_bonus['W'],
-                    'E': totals.get('E', 0.0) + combo_bonus['E'],
-                    'C': totals.get('C', 0.0) + combo_bonus['C'],
-                    'H': totals.get('H', 0.0) + combo_bonus['H'],
-                    'ST': totals.get('ST', 0.0) + combo_bonus['ST'],
-                    '$': totals.get('$', 0.0) + combo_bonus['$']
-                }
-                data['totals'] = totals
-        except Exception as e:
-            print('Error applying combinations bonuses:', e)
-
-        # Сохраняем статистику дня (и приводим к числам)
-        totals = data.get('totals', {}) or {}
-        for _k in ('I','S','W','E','C','H','ST','$'):
-            try:
-                totals[_k] = float(totals.get(_k, 0) or 0.0)
-            except Exception:
-                totals[_k] = 0.0
+def _diff_day_rows(cursor, day_date, data):
+    """Сохранение дня по разнице: меняются только отличающиеся строки.
 
-        # ---- НОВОЕ: применить множитель трения к итоговым показателям дня ----
-        for _k in ('I','S','W','E','C','H','ST','$'):
-            totals[_k] = totals.get(_k, 0.0) * multiplier
+    UNIQUE(habit_id, subtask_id, date) не срабатывает при subtask_id = NULL
+    (в SQLite NULL-ы различны), поэтому сопоставляем строки по ключу
+    (habit_id, subtask_id) сами и обновляем их по rowid.
+    """
+    incoming = _incoming_rows(data)
+    cursor.execute(
+        'SELECT id, habit_id, subtask_id, ' + ', '.join(COMPLETION_FIELDS) +
+        ' FROM completed_habits WHERE date = ?', (day_date,))
+    stored = {}
+    to_delete = []
+    for row in cursor.fetchall():
+        key = (row[1], row[2])
+        if key in stored:
+            # дубликаты (старые данные) — оставляем одну строку
+            to_delete.append((row[0],))
+            continue
+        stored[key] = (row[0], tuple(row[3:]))
+
+    to_insert, to_update = [], []
+    for key, values in incoming.items():
+        if key not in stored:
+            to_insert.append(key + (day_date,) + values)
+        elif stored[key][1] != values:
+            to_update.append(values + (stored[key][0],))
+    to_delete.extend((row_id,) for key, (row_id, _) in stored.items() if key not in incoming)
+
+    if to_delete:
+        cursor.executemany('DELETE FROM completed_habits WHERE id = ?', to_delete)
+    if to_update:
+        cursor.executemany(
+            'UPDATE completed_habits SET ' + ', '.join(f + ' = ?' for f in COMPLETION_FIELDS) + ' WHERE id = ?',
+            to_update)
+    if to_insert:
+        cursor.executemany(
+            'INSERT INTO completed_habits (habit_id, subtask_id, date, ' + ', '.join(COMPLETION_FIELDS) + ')'
+            ' VALUES (' + ', '.join('?' * (3 + len(COMPLETION_FIELDS))) + ')',
+            to_insert)
+    return {'inserted': len(to_insert), 'updated': len(to_update), 'deleted': len(to_delete)}
+
+
+def _store_day(conn, day_date, data, diff=False):
+    """Сохранить день (строки привычек, бонусы сочетаний, итоги дня, стрики).
+
+    Единица работы писателя: всё в его транзакции, commit делает писатель.
+    """
+    friction, multiplier = _friction_from(data)
+    cursor = conn.cursor()
 
-        # ---- вставка discipline_days (как раньше) ----
-        conn.row_factory = None
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT OR REPLACE INTO discipline_days 
-            (date, day_number, state, emotion_morning, thoughts,
-             total_i, total_s, total_w, total_e, total_c, total_h, total_st, total_money,
-             completed_count, total_count, friction_index)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            day_date,
-            data.get('day_number'),
-            data.get('state'),
-            data.get('emotion_morning'),
-            data.get('thoughts'),
-            totals.get('I', 0.0),
-            totals.get('S', 0.0),
-            totals.get('W', 0.0),
-            totals.get('E', 0.0),
-            totals.get('C', 0.0),
-            totals.get('H', 0.0),
-            totals.get('ST', 0.0),
-            totals.get('$', 0.0),
-            data.get('completed_count', 0),
-            data.get('total_count', 0),
-            friction
-        ))
+    # Запоминаем, какие привычки были выполнены в этот день до сохранения
+    done_before = success_habits_on(conn, day_date)
+    rollup_before = snapshot_days(conn, [day_date])
+
+    if diff:
+        changes = _diff_day_rows(cursor, day_date, data)
+    else:
+        _replace_day_rows(cursor, day_date, data)
+        changes = None
 
-        conn.commit()
+    done_after = success_habits_on(conn, day_date)
 
-        recalc_all_streaks(conn)
+    # ---- вычислить и применить бонусы сочетаний ----
+    try:
+        if done_after:
+            combo_bonus = get_combination_engine(conn).bonus(done_after)
+            totals = data.get('totals', {}) or {}
+            data['totals'] = {k: totals.get(k, 0.0) + combo_bonus[k] for k in combo_bonus}
+    except Exception as e:
+        print('Error applying combinations bonuses:', e)
 
-        conn.close()
+    # Сохраняем статистику дня (и приводим к числам)
+    totals = data.get('totals', {}) or {}
+    for _k in ('I','S','W','E','C','H','ST','$'):
+        try:
+            totals[_k] = float(totals.get(_k, 0) or 0.0)
+        except Exception:
+            totals[_k] = 0.0
+
+    # ---- НОВОЕ: применить множитель трения к итоговым показателям дня ----
+    for _k in ('I','S','W','E','C','H','ST','$'):
+        totals[_k] = totals.get(_k, 0.0) * multiplier
+
+    # ---- вставка discipline_days (как раньше) ----
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT OR REPLACE INTO discipline_days 
+        (date, day_number, state, emotion_morning, thoughts,
+         total_i, total_s, total_w, total_e, total_c, total_h, total_st, total_money,
+         completed_count, total_count, friction_index)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (
+        day_date,
+        data.get('day_number'),
+        data.get('state'),
+        data.get('emotion_morning'),
+        data.get('thoughts'),
+        totals.get('I', 0.0),
+        totals.get('S', 0.0),
+        totals.get('W', 0.0),
+        totals.get('E', 0.0),
+        totals.get('C', 0.0),
+        totals.get('H', 0.0),
+        totals.get('ST', 0.0),
+        totals.get('$', 0.0),
+        data.get('completed_count', 0),
+        data.get('total_count', 0),
+        friction
+    ))
+
+    # Инкрементально обновляем стрики только изменившихся привычек (в той же транзакции)
+    sync_streaks_day(conn, day_date, done_before ^ done_after)
+    apply_day_changes(conn, rollup_before)
+    return friction, multiplier, changes
+
+
+@app.route('/api/completions', methods=['POST'])
+@bumps('days')
+def save_completions():
+    """Сохранение выполненных привычек за день (и пересчёт стриков)
+       + применение индекса трения (friction_index 1..10 -> множитель 1..3)
+
+       С флагом "diff": true день сохраняется по разнице (как PATCH).
+    """
+    try:
+        data = request.json
+        day_date = data.get('date', date.today().isoformat())
+
+        friction, multiplier, changes = write(_store_day, day_date, data, diff=bool(data.get('diff')))
 
         # Можно вернуть multiplier обратно клиенту для отладки/отображения
-        return jsonify({'status': 'success', 'friction_index': friction, 'multiplier': multiplier})
+        result = {'status': 'success', 'friction_index': friction, 'multiplier': multiplier}
+        if changes is not None:
+            result['changes'] = changes
+        return jsonify(result)
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
+@app.route('/api/completions/<date>', methods=['PATCH'])
+@bumps('days')
+def patch_completions(date):
+    """Сохранение дня по разнице: upsert изменённых строк, удаление убранных"""
+    try:
+        datetime.strptime(date, '%Y-%m-%d')
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'date must be YYYY-MM-DD'}), 400
+    try:
+        data = request.json or {}
+        friction, multiplier, changes = write(_store_day, date, data, diff=True)
+        return jsonify({'status': 'success', 'friction_index': friction, 'multiplier': multiplier,
+                        'changes': changes})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 
 @app.route('/api/completions/<date>', methods=['GET'])
+@conditional('days', 'habits')
 def get_completions(date):
     """Получение выполненных привычек за день"""
     try:
-        conn = sqlite3.connect('habits.db')
-        conn.row_factory = sqlite3.Row
+        conn = get_db()
         cursor = conn.cursor()
+        cursor.row_factory = sqlite3.Row
         
         # Получаем привычки за день
         cursor.execute('''
@@ -521,26 +788,15 @@ def get_completions(date):
         cursor.execute('SELECT * FROM discipline_days WHERE date = ?', (date,))
         day_data = cursor.fetchone()
         
-        # Получаем информацию о стриках
-        streaks = {}
-        for habit in habits:
-            cursor.execute('SELECT current_streak, longest_streak FROM streaks WHERE habit_id = ?', 
-                          (habit['habit_id'],))
-            streak_data = cursor.fetchone()
-            if streak_data:
-                streaks[habit['habit_id']] = {
-                    'current': streak_data[0],
-                    'longest': streak_data[1]
-                }
+        # Получаем информацию о стриках (одним запросом)
+        streaks = streaks_by_habit(conn, [habit['habit_id'] for habit in habits])
         
-        conn.close()
         
         # Prepare day data and include multiplier for client convenience
         day_json = dict(day_data) if day_data else None
         if day_json is not None:
-            fi = int(day_json.get('friction_index') or 1)
-            day_json['friction_index'] = fi
-            day_json['friction_multiplier'] = 1.0 + (fi - 1) * (1.0 / 9.0)
+            day_json['friction_index'], day_json['friction_multiplier'] = friction_multiplier(
+                day_json.get('friction_index'))
         return jsonify({
             'status': 'success',
             'habits': habits,
@@ -551,7 +807,48 @@ def get_completions(date):
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 
+def _move_day(conn, old, new):
+    """Перенос дня old -> new со стриками и итогами (единица работы писателя)"""
+    cursor = conn.cursor()
+
+    affected = success_habits_on(conn, old) | success_habits_on(conn, new)
+    rollup_before = snapshot_days(conn, [old, new])
+
+    # Если в целевую дату уже есть записи, удалим их (перезапись)
+    cursor.execute('DELETE FROM completed_habits WHERE date = ?', (new,))
+    cursor.execute('DELETE FROM discipline_days WHERE date = ?', (new,))
+
+    # Копируем completed_habits
+    cursor.execute('SELECT habit_id, subtask_id, quantity, success, i, s, w, e, c, h, st, money, notes, day_number, state, emotion_morning, thoughts FROM completed_habits WHERE date = ?', (old,))
+    rows = cursor.fetchall()
+    for r in rows:
+        cursor.execute('''
+            INSERT INTO completed_habits (habit_id, subtask_id, date, quantity, success, i, s, w, e, c, h, st, money, notes, day_number, state, emotion_morning, thoughts)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            r[0], r[1], new, r[2], r[3], r[4], r[5], r[6], r[7], r[8], r[9], r[10], r[11], r[12], r[13], r[14], r[15], r[16]
+        ))
+
+    # Копируем discipline_days (если есть)
+    cursor.execute('SELECT day_number, state, emotion_morning, thoughts, total_i, total_s, total_w, total_e, total_c, total_h, total_st, total_money, completed_count, total_count FROM discipline_days WHERE date = ?', (old,))
+    day = cursor.fetchone()
+    if day:
+        cursor.execute('''
+            INSERT OR REPLACE INTO discipline_days (date, day_number, state, emotion_morning, thoughts, total_i, total_s, total_w, total_e, total_c, total_h, total_st, total_money, completed_count, total_count)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (new, day[0], day[1], day[2], day[3], day[4], day[5], day[6], day[7], day[8], day[9], day[10], day[11], day[12], day[13]))
+
+    # После успешного копирования — удалим старые записи
+    cursor.execute('DELETE FROM completed_habits WHERE date = ?', (old,))
+    cursor.execute('DELETE FROM discipline_days WHERE date = ?', (old,))
+
+    sync_streaks_day(conn, old, affected)
+    sync_streaks_day(conn, new, affected)
+    apply_day_changes(conn, rollup_before)
+
+
 @app.route('/api/completions/change_date', methods=['POST'])
+@bumps('days')
 def change_completion_date():
     """Перенести день из old_date в new_date (копировать + удалять старую запись)."""
     try:
@@ -561,53 +858,42 @@ def change_completion_date():
         if not old or not new:
             return jsonify({'status':'error','message':'old_date and new_date required'}), 400
 
-        conn = sqlite3.connect('habits.db')
-        cursor = conn.cursor()
+        write(_move_day, old, new)
+        return jsonify({'status':'success'})
+    except Exception as e:
+        return jsonify({'status':'error','message':str(e)}), 500
 
-        # Если в целевую дату уже есть записи, удалим их (перезапись)
-        cursor.execute('DELETE FROM completed_habits WHERE date = ?', (new,))
-        cursor.execute('DELETE FROM discipline_days WHERE date = ?', (new,))
+# ============ API для статистики ============
 
-        # Копируем completed_habits
-        cursor.execute('SELECT habit_id, subtask_id, quantity, success, i, s, w, e, c, h, st, money, notes, day_number, state, emotion_morning, thoughts FROM completed_habits WHERE date = ?', (old,))
-        rows = cursor.fetchall()
-        for r in rows:
-            cursor.execute('''
-                INSERT INTO completed_habits (habit_id, subtask_id, date, quantity, success, i, s, w, e, c, h, st, money, notes, day_number, state, emotion_morning, thoughts)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                r[0], r[1], new, r[2], r[3], r[4], r[5], r[6], r[7], r[8], r[9], r[10], r[11], r[12], r[13], r[14], r[15], r[16]
-            ))
+STAT_KEYS = ('i', 's', 'w', 'e', 'c', 'h', 'st', 'money')
 
-        # Копируем discipline_days (если есть)
-        cursor.execute('SELECT day_number, state, emotion_morning, thoughts, total_i, total_s, total_w, total_e, total_c, total_h, total_st, total_money, completed_count, total_count FROM discipline_days WHERE date = ?', (old,))
-        day = cursor.fetchone()
-        if day:
-            cursor.execute('''
-                INSERT OR REPLACE INTO discipline_days (date, day_number, state, emotion_morning, thoughts, total_i, total_s, total_w, total_e, total_c, total_h, total_st, total_money, completed_count, total_count)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (new, day[0], day[1], day[2], day[3], day[4], day[5], day[6], day[7], day[8], day[9], day[10], day[11], day[12], day[13]))
 
-        # После успешного копирования — удалим старые записи
-        cursor.execute('DELETE FROM completed_habits WHERE date = ?', (old,))
-        cursor.execute('DELETE FROM discipline_days WHERE date = ?', (old,))
+def _period_stats(days_count, sums, counts):
+    """Словарь stats (days_count, sum_*, avg_*) из количества дней, сумм и чисел непустых итогов
 
-        conn.commit()
-        conn.close()
-        return jsonify({'status':'success'})
-    except Exception as e:
-        return jsonify({'status':'error','message':str(e)}), 500
+    Среднее, как AVG в SQL, — по дням, где итог не NULL.
+    """
+    stats = {'days_count': int(days_count or 0)}
+    for key, total in zip(STAT_KEYS, sums):
+        stats['sum_' + key] = float(total or 0.0)
+    for key, total, count in zip(STAT_KEYS, sums, counts):
+        stats['avg_' + key] = float(total or 0.0) / count if count else 0.0
+    return stats
 
-# ============ API для статистики ============
 
 @app.route('/api/stats/period', methods=['GET'])
+@conditional('days', key=lambda: request.full_path + date.today().isoformat())
 def get_period_stats():
-    """Получение статистики за период"""
+    """Получение статистики за период
+
+    Суммы, средние и сравнение с предыдущим периодом собираются из
+    предагрегированных итогов (server.rollups), а не сканированием всех дней.
+    """
     try:
         period = request.args.get('period', 'week')  # week, month, all
         end_date = date.today()
         
-        conn = sqlite3.connect('habits.db')
+        conn = get_db()
         cursor = conn.cursor()
         
         if period == 'week':
@@ -615,67 +901,16 @@ def get_period_stats():
         elif period == 'month':
             start_date = end_date - timedelta(days=30)
         else:  # all
-            cursor.execute('SELECT MIN(date) FROM discipline_days')
-            min_date = cursor.fetchone()[0]
+            cursor.execute('SELECT MIN(date), MAX(date) FROM discipline_days')
+            min_date, max_date = cursor.fetchone()
             start_date = datetime.strptime(min_date, '%Y-%m-%d').date() if min_date else end_date
-        
-        # Явные суммы и средние — чтобы фронт имел predictable ключи (sum_* и avg_*)
-        cursor.execute('''
-            SELECT 
-                COUNT(DISTINCT date) as days_count,
-                SUM(total_i) as sum_i,
-                SUM(total_s) as sum_s,
-                SUM(total_w) as sum_w,
-                SUM(total_e) as sum_e,
-                SUM(total_c) as sum_c,
-                SUM(total_h) as sum_h,
-                SUM(total_st) as sum_st,
-                SUM(total_money) as sum_money,
-                AVG(total_i) as avg_i,
-                AVG(total_s) as avg_s,
-                AVG(total_w) as avg_w,
-                AVG(total_e) as avg_e,
-                AVG(total_c) as avg_c,
-                AVG(total_h) as avg_h,
-                AVG(total_st) as avg_st,
-                AVG(total_money) as avg_money
-            FROM discipline_days
-            WHERE date BETWEEN ? AND ?
-        ''', (start_date.isoformat(), end_date.isoformat()))
 
-        row = cursor.fetchone() or (0,)+ (0,)*15  # безопасная подстраховка
-        # row -> tuple in order of select
-        cols = [c[0] for c in cursor.description]
-        raw = dict(zip(cols, row))
-
-        # нормализуем числа: None -> 0, строки -> float
-        def _num(x):
-            try:
-                return float(x) if x is not None else 0.0
-            except Exception:
-                return 0.0
-
-        stats = {
-            'days_count': int(raw.get('days_count') or 0),
-            'sum_i': _num(raw.get('sum_i')),
-            'sum_s': _num(raw.get('sum_s')),
-            'sum_w': _num(raw.get('sum_w')),
-            'sum_e': _num(raw.get('sum_e')),
-            'sum_c': _num(raw.get('sum_c')),
-            'sum_h': _num(raw.get('sum_h')),
-            'sum_st': _num(raw.get('sum_st')),
-            'sum_money': _num(raw.get('sum_money')),
-            'avg_i': _num(raw.get('avg_i')),
-            'avg_s': _num(raw.get('avg_s')),
-            'avg_w': _num(raw.get('avg_w')),
-            'avg_e': _num(raw.get('avg_e')),
-            'avg_c': _num(raw.get('avg_c')),
-            'avg_h': _num(raw.get('avg_h')),
-            'avg_st': _num(raw.get('avg_st')),
-            'avg_money': _num(raw.get('avg_money')),
-        }
+        # Явные суммы и средние — чтобы фронт имел predictable ключи (sum_* и avg_*)
+        if period not in ('week', 'month') and (max_date is None or max_date <= end_date.isoformat()):
+            stats = _period_stats(*all_time_totals(conn))
+        else:
+            stats = _period_stats(*range_totals(conn, start_date, end_date))
 
-        
         # Статистика по дням для графика
         cursor.execute('''
             SELECT date, total_i, total_s, total_w, total_e, total_c, total_h
@@ -700,49 +935,28 @@ def get_period_stats():
         if period == 'week':
             prev_start = start_date - timedelta(days=7)
             prev_end = start_date - timedelta(days=1)
+            prev_stats = _period_stats(*range_totals(conn, prev_start, prev_end))
         elif period == 'month':
             prev_start = start_date - timedelta(days=30)
             prev_end = start_date - timedelta(days=1)
+            prev_stats = _period_stats(*range_totals(conn, prev_start, prev_end))
         else:
-            prev_start = start_date
-            prev_end = end_date
-        
-        cursor.execute('''
-            SELECT 
-                AVG(total_i) as avg_i,
-                AVG(total_s) as avg_s,
-                AVG(total_w) as avg_w,
-                AVG(total_e) as avg_e,
-                AVG(total_c) as avg_c,
-                AVG(total_h) as avg_h
-            FROM discipline_days 
-            WHERE date BETWEEN ? AND ?
-        ''', (prev_start.isoformat(), prev_end.isoformat()))
-        
-        prev_stats = cursor.fetchone()
+            prev_stats = stats
         
         comparison = {}
-        if prev_stats:
-            current_avgs = [stats['avg_i'], stats['avg_s'], stats['avg_w'], 
-                           stats['avg_e'], stats['avg_c'], stats['avg_h']]
-            prev_avgs = [prev_stats[0] or 0, prev_stats[1] or 0, prev_stats[2] or 0,
-                        prev_stats[3] or 0, prev_stats[4] or 0, prev_stats[5] or 0]
-            
-            for i, stat_name in enumerate(['I', 'S', 'W', 'E', 'C', 'H']):
-                current = current_avgs[i]
-                previous = prev_avgs[i]
-                if previous == 0:
-                    comparison[stat_name] = '→'
+        for stat_name, key in zip(['I', 'S', 'W', 'E', 'C', 'H'], STAT_KEYS):
+            current = stats['avg_' + key]
+            previous = prev_stats['avg_' + key]
+            if previous == 0:
+                comparison[stat_name] = '→'
+            else:
+                change = ((current - previous) / abs(previous)) * 100
+                if change > 5:
+                    comparison[stat_name] = '↑'
+                elif change < -5:
+                    comparison[stat_name] = '↓'
                 else:
-                    change = ((current - previous) / abs(previous)) * 100
-                    if change > 5:
-                        comparison[stat_name] = '↑'
-                    elif change < -5:
-                        comparison[stat_name] = '↓'
-                    else:
-                        comparison[stat_name] = '→'
-        
-        conn.close()
+                    comparison[stat_name] = '→'
         
         return jsonify({
             'status': 'success',
@@ -756,25 +970,86 @@ def get_period_stats():
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-def recalc_all_streaks(conn=None):
-    """Обёртка: делегирует пересчёт стриков в server.db.recalc_all_streaks.
 
-    Поддерживает старый вызов с передачей соединения (`conn`), но внутренняя
-    реализация создаёт своё соединение к файлу `habits.db`.
-    """
+@app.route('/api/stats/totals', methods=['GET'])
+@conditional('days')
+def get_totals():
+    """Суммы характеристик за всё время (из строки итогов, O(1))"""
+    try:
+        stats = _period_stats(*all_time_totals(get_db()))
+        return jsonify({'status': 'success', 'stats': stats})
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
+@app.route('/api/days/index', methods=['GET'])
+@conditional('days')
+def get_days_index():
+    """Список дат с данными (новые сверху), с keyset-пагинацией: ?limit=N&before=YYYY-MM-DD"""
+    try:
+        before = request.args.get('before')
+        try:
+            limit = int(request.args.get('limit', 0) or 0)
+        except ValueError:
+            return jsonify({'status': 'error', 'message': 'limit must be an integer'}), 400
+
+        query = 'SELECT date FROM discipline_days'
+        params = []
+        if before:
+            query += ' WHERE date < ?'
+            params.append(before)
+        query += ' ORDER BY date DESC'
+        if limit > 0:
+            query += ' LIMIT ?'
+            params.append(limit + 1)
+
+        cursor = get_db().cursor()
+        cursor.execute(query, params)
+        dates = [row[0] for row in cursor.fetchall()]
+
+        next_before = None
+        if limit > 0 and len(dates) > limit:
+            dates = dates[:limit]
+            next_before = dates[-1]
+        return jsonify({'status': 'success', 'data': dates, 'next_before': next_before})
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
+@app.route('/api/stats/rollups/rebuild', methods=['POST'])
+@bumps('days')
+def rebuild_rollups():
+    """Перестроить недельные/месячные итоги по discipline_days"""
+    try:
+        write(rebuild_rollups_db)
+        return jsonify({'status': 'success'})
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/api/stats/streaks/rebuild', methods=['POST'])
+@bumps('days')
+def rebuild_streaks():
+    """Полный пересчёт стриков по всей истории (команда восстановления)"""
     try:
-        recalc_all_streaks_db()
+        write(rebuild_all_streaks)
+        return jsonify({'status': 'success'})
     except Exception as e:
-        print(f"Error recalculating streaks: {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
 
 
 @app.route('/api/stats/streaks', methods=['GET'])
+@conditional('days', 'habits', key=lambda: request.full_path + date.today().isoformat())
 def get_streaks():
-    """Получение стриков привычек (включая нулевые)"""
+    """Получение стриков привычек (включая нулевые)
+
+    Кроме стриков: success_days и first_date (из строки стрика), days_since_last
+    и completion_rate — доля успешных дней от первого успеха до сегодня.
+    """
     try:
-        conn = sqlite3.connect('habits.db')
-        conn.row_factory = sqlite3.Row
+        conn = get_db()
         cursor = conn.cursor()
+        cursor.row_factory = sqlite3.Row
+        today = date.today().isoformat()
 
         cursor.execute('''
             SELECT 
@@ -783,16 +1058,21 @@ def get_streaks():
                 h.category,
                 COALESCE(s.current_streak, 0) as current_streak,
                 COALESCE(s.longest_streak, 0) as longest_streak,
-                s.last_date
+                s.last_date,
+                COALESCE(s.success_days, 0) as success_days,
+                s.first_date,
+                CAST(julianday(?) - julianday(s.last_date) AS INTEGER) as days_since_last,
+                CASE WHEN s.first_date IS NULL THEN 0.0
+                     ELSE ROUND(1.0 * s.success_days / MAX(1, julianday(?) - julianday(s.first_date) + 1), 4)
+                END as completion_rate
             FROM habits h
             LEFT JOIN streaks s ON h.id = s.habit_id
             WHERE h.is_active = 1
             ORDER BY current_streak DESC, longest_streak DESC, h.category, h.name
-        ''')
+        ''', (today, today))
 
         streaks = [dict(row) for row in cursor.fetchall()]
 
-        conn.close()
 
         return jsonify({'status': 'success', 'data': streaks})
     except Exception as e:
@@ -800,10 +1080,11 @@ def get_streaks():
 
 
 @app.route('/api/stats/total_days', methods=['GET'])
+@conditional('days')
 def get_total_days():
     """Получение общего количества дней дисциплины"""
     try:
-        conn = sqlite3.connect('habits.db')
+        conn = get_db()
         cursor = conn.cursor()
         
         cursor.execute('SELECT COUNT(DISTINCT date) FROM discipline_days')
@@ -812,7 +1093,6 @@ def get_total_days():
         cursor.execute('SELECT MAX(day_number) FROM discipline_days')
         max_day = cursor.fetchone()[0] or 0
         
-        conn.close()
         
         return jsonify({
             'status': 'success',
@@ -823,12 +1103,13 @@ def get_total_days():
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 @app.route('/api/stats/daily_comparison', methods=['GET'])
+@conditional('days', key=lambda: request.full_path + date.today().isoformat())
 def get_daily_comparison():
     """Сравнение характеристик с предыдущим днем"""
     try:
         target_date = request.args.get('date', date.today().isoformat())
         
-        conn = sqlite3.connect('habits.db')
+        conn = get_db()
         cursor = conn.cursor()
         
         # Получаем статистику за целевой день
@@ -879,7 +1160,6 @@ def get_daily_comparison():
                     else:
                         comparison[stat] = '→'
         
-        conn.close()
         
         return jsonify({
             'status': 'success',
@@ -912,6 +1192,34 @@ def save_data():
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+# ============ Аналитика (NumPy) ============
+
+@app.route('/api/analytics/<view>', methods=['GET'])
+@conditional('days', 'habits')
+def get_analytics(view):
+    """Аналитика по истории: summary, rolling, ewma, cumulative, weekday, categories, habits
+
+    Параметры: start, end (YYYY-MM-DD), window (rolling, habits), span (ewma).
+    """
+    compute = analytics.VIEWS.get(view)
+    if compute is None:
+        return jsonify({'status': 'error', 'message': f'unknown view, expected one of {", ".join(analytics.VIEWS)}'}), 404
+    if not analytics.available():
+        return jsonify({'status': 'error', 'message': 'numpy is not installed'}), 501
+    try:
+        params = {}
+        for name, default in (('window', 30 if view == 'habits' else 7), ('span', 14)):
+            params[name] = max(1, min(3650, int(request.args.get(name, default))))
+        hist = analytics.get_history(get_db())
+        sl = hist.span(request.args.get('start'), request.args.get('end'))
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    try:
+        return jsonify({'status': 'success', 'view': view, **compute(hist, sl, **params)})
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
 @app.route('/api/export', methods=['POST'])
 def export_data():
     """Экспорт данных в формате TXT или CSV"""
@@ -935,17 +1243,90 @@ def export_data():
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+def _list_arg(name):
+    """Значения параметра: повтором (?x=1&x=2) или через запятую (?x=1,2)"""
+    values = []
+    for raw in request.args.getlist(name):
+        values.extend(v.strip() for v in raw.split(',') if v.strip())
+    return values
+
+
+def _export_response(kind, sql, params):
+    fmt = request.args.get('format', 'csv')
+    if fmt not in export.FORMATS:
+        return jsonify({'status': 'error', 'message': f'format must be one of {", ".join(export.FORMATS)}'}), 400
+    # генератор читается уже после завершения view, поэтому у выгрузки своё соединение
+    # (соединение потока к этому времени снова занято другими запросами); закрывается с ответом
+    conn = open_connection()
+    response = Response(export.stream(conn, sql, params, fmt), content_type=export.FORMATS[fmt])
+    response.call_on_close(conn.close)
+    response.headers['Content-Disposition'] = f'attachment; filename={kind}_{date.today()}.{fmt}'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+@app.route('/api/export/completions', methods=['GET'])
+def export_completions():
+    """Потоковая выгрузка выполнений привычек (csv, ndjson, json)
+
+    Параметры: start, end (YYYY-MM-DD), habit_id и category (повтором или через запятую), format.
+    """
+    try:
+        habit_ids = [int(v) for v in _list_arg('habit_id')]
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'habit_id must be integer'}), 400
+    sql, params = export.completions_query(request.args.get('start'), request.args.get('end'),
+                                           habit_ids, _list_arg('category'))
+    return _export_response('completions', sql, params)
+
+
+@app.route('/api/export/days', methods=['GET'])
+def export_days():
+    """Потоковая выгрузка итогов дней (csv, ndjson, json); параметры: start, end, format"""
+    sql, params = export.days_query(request.args.get('start'), request.args.get('end'))
+    return _export_response('days', sql, params)
+
+@app.route('/api/import', methods=['POST'])
+@bumps('days', 'habits')
+def import_history():
+    """Массовый импорт истории (CSV, NDJSON или файл habits.db) пачками транзакций
+
+    Файл — в поле формы `file` или телом запроса; формат — параметр `format`
+    или расширение имени файла. Дни из импорта заменяют существующие.
+    """
+    upload = request.files.get('file')
+    fmt = request.args.get('format') or (importer.detect_format(upload.filename) if upload else None)
+    if fmt not in importer.FORMATS:
+        return jsonify({'status': 'error', 'message': f'format must be one of {", ".join(importer.FORMATS)}'}), 400
+    stream = upload.stream if upload else request.stream
+    try:
+        if fmt == 'sqlite':
+            # SQLite читает только с диска
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, 'import.db')
+                with open(path, 'wb') as f:
+                    while True:
+                        chunk = stream.read(1 << 20)
+                        if not chunk:
+                            break
+                        f.write(chunk)
+                stats = importer.import_records(importer.read_records(path, fmt))
+        else:
+            stats = importer.import_records(importer.read_records(stream, fmt))
+        return jsonify({'status': 'success', **stats})
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
 # ============ Дополнительные эндпоинты ============
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Проверка работоспособности сервера и БД"""
     try:
-        conn = sqlite3.connect('habits.db')
+        conn = get_db()
         cursor = conn.cursor()
         cursor.execute('SELECT COUNT(*) FROM habits')
         habits_count = cursor.fetchone()[0]
-        conn.close()
         
         return jsonify({
             'status': 'healthy',
@@ -957,69 +1338,209 @@ def health_check():
         return jsonify({'status': 'unhealthy', 'error': str(e)}), 500
 
 
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Метрики маршрутов и SQL в текстовом формате Prometheus"""
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def _profiles_disabled():
+    """Ответ 404 для /api/admin/profiles*, если профилирование выключено (PROFILING)"""
+    if app.config['PROFILING']:
+        return None
+    return jsonify({'status': 'error', 'message': 'Not found'}), 404
+
+
+@app.route('/api/admin/profiles', methods=['GET'])
+def list_profiles():
+    """Последние сохранённые профили запросов (новые сверху); только при PROFILING"""
+    disabled = _profiles_disabled()
+    if disabled:
+        return disabled
+    try:
+        limit = int(request.args.get('limit', 50) or 50)
+        profiles = profiling.list_profiles(app.config['PROFILE_DIR'], limit)
+        return jsonify({'status': 'success', 'enabled': True, 'data': profiles})
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'limit must be an integer'}), 400
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
+@app.route('/api/admin/profiles/<name>', methods=['GET'])
+def get_profile(name):
+    """Сводка профиля (.txt) или дамп pstats (?format=prof); только при PROFILING"""
+    disabled = _profiles_disabled()
+    if disabled:
+        return disabled
+    ext = '.prof' if request.args.get('format') == 'prof' else '.txt'
+    root = os.path.normpath(app.config['PROFILE_DIR'])
+    fp = os.path.normpath(os.path.join(root, name + ext))
+    if not fp.startswith(root + os.sep) or not os.path.exists(fp):
+        return jsonify({'status': 'error', 'message': 'Profile not found'}), 404
+    if ext == '.prof':
+        return send_file(fp, mimetype='application/octet-stream', as_attachment=True,
+                         download_name=name + ext)
+    return send_file(fp, mimetype='text/plain')
+
+
+def _index_sync(method, *args):
+    """Обновить поисковый индекс дорожных карт; ошибка индекса не отменяет операцию с файлом"""
+    if roadmap_search is None:
+        return
+    try:
+        getattr(roadmap_search, method)(*args)
+    except Exception as e:
+        print(f'Error updating roadmap search index ({method}):', e)
+
+
 @app.route('/api/planner/projects', methods=['GET'])
 def planner_projects():
     """Список проектов (папок) в директории roadmaps/"""
     try:
-        root = os.path.join(BASE_DIR, 'roadmaps')
-        if not os.path.exists(root):
-            os.makedirs(root)
-
-        projects = []
-        for name in sorted(os.listdir(root)):
-            p = os.path.join(root, name)
-            if os.path.isdir(p):
-                projects.append(name)
-
-        return jsonify({'status': 'success', 'data': projects})
+        return jsonify({'status': 'success', 'data': roadmap_index.projects()})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 
 @app.route('/api/planner/project/<project_name>', methods=['GET'])
 def planner_project(project_name):
-    """Список задач в проекте и их содержимое"""
+    """Список задач в проекте из planner_tasks: id, имя файла, core, состояние, x, дата, порядок.
+
+    Содержимое — через /api/planner/project/<project>/content/<filename>
+    (или целиком здесь с ?include=content для старых клиентов).
+    """
     try:
-        root = os.path.join(BASE_DIR, 'roadmaps')
+        root = app.config['ROADMAPS_DIR']
         proj_path = os.path.normpath(os.path.join(root, project_name))
-        if not proj_path.startswith(os.path.normpath(root)) or not os.path.exists(proj_path):
+        if not proj_path.startswith(os.path.normpath(root)):
             return jsonify({'status': 'error', 'message': 'Project not found'}), 404
 
-        items = []
-        for fn in sorted(os.listdir(proj_path)):
-            fp = os.path.join(proj_path, fn)
-            if os.path.isfile(fp):
-                try:
-                    with open(fp, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                except Exception:
-                    content = ''
-                completed = 'выполнено' in fn.lower() or 'вypol' in fn.lower()
-                items.append({'filename': fn, 'content': content, 'completed': completed})
+        items = planner_tasks.list_tasks(get_db(), project_name)
+        # папка проверяется только для пустого списка (пустой проект или его нет)
+        if not items and not os.path.isdir(proj_path):
+            return jsonify({'status': 'error', 'message': 'Project not found'}), 404
+
+        if request.args.get('include') == 'content':
+            files = {t['filename']: t for t in roadmap_index.tasks(project_name, with_content=True)}
+            for item in items:
+                item['content'] = files.get(item['filename'], {}).get('content', '')
 
         return jsonify({'status': 'success', 'data': items})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 
+@app.route('/api/planner/project/<project_name>/content/<path:filename>', methods=['GET'])
+def planner_task_content(project_name, filename):
+    """Содержимое одной задачи: ETag по хешу, If-None-Match / If-Modified-Since и Range"""
+    try:
+        root = app.config['ROADMAPS_DIR']
+        proj_path = os.path.normpath(os.path.join(root, project_name))
+        if not proj_path.startswith(os.path.normpath(root)) or not os.path.exists(proj_path):
+            return jsonify({'status': 'error', 'message': 'Project not found'}), 404
+
+        fp = os.path.normpath(os.path.join(proj_path, filename))
+        if not fp.startswith(proj_path):
+            return jsonify({'status': 'error', 'message': 'invalid filename'}), 400
+
+        task = roadmap_index.task(project_name, filename, with_content=False)
+        if task is None:
+            return jsonify({'status': 'error', 'message': 'File not found'}), 404
+
+        response = send_file(fp, mimetype='text/plain', conditional=True,
+                             etag=task['hash'], max_age=0)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
+@app.route('/api/planner/search', methods=['GET'])
+def planner_search():
+    """Поиск по проектам, именам и тексту задач: ?q=текст&limit=N&project=...
+
+    Лучшие совпадения сначала; highlight — имя файла с <mark>, snippet —
+    фрагмент текста задачи с совпадением.
+    """
+    try:
+        try:
+            limit = int(request.args.get('limit', 20))
+        except ValueError:
+            return jsonify({'status': 'error', 'message': 'limit must be an integer'}), 400
+        if roadmap_search is None or not roadmap_search.available:
+            return jsonify({'status': 'error', 'message': 'full-text search (FTS5) is not available'}), 501
+        data = roadmap_search.search(request.args.get('q', ''), limit, request.args.get('project'))
+        # состояние задач — из planner_tasks (индекс поиска знает только файлы)
+        tasks = planner_tasks.lookup(get_db(), [(item['project'], item['filename']) for item in data])
+        for item in data:
+            task = tasks.get((item['project'], item['filename']))
+            if task is not None:
+                item.update(id=task['id'], core=task['core'], completed=task['completed'],
+                            x_count=task['x_count'], date=task['date'])
+        return jsonify({'status': 'success', 'data': data})
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
+def _due_date_arg():
+    value = request.args.get('date') or date.today().isoformat()
+    date.fromisoformat(value)
+    return value
+
+
+@app.route('/api/planner/due', methods=['GET'])
+def planner_due_list():
+    """Задачи обучающих проектов к повторению на дату: ?date=YYYY-MM-DD (сегодня)&project=&limit=
+
+    Самые просроченные сначала; счётчики — /api/planner/due/summary.
+    """
+    try:
+        try:
+            on_date = _due_date_arg()
+            limit = int(request.args.get('limit', 0) or 0)
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        data = planner_due.due(get_db(), on_date, request.args.get('project'), limit or None)
+        return jsonify({'status': 'success', 'date': on_date, 'data': data})
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
+@app.route('/api/planner/due/summary', methods=['GET'])
+def planner_due_summary():
+    """Счётчики повторений: просрочено, на дату, по проектам и по дням на неделю вперёд"""
+    try:
+        try:
+            on_date = _due_date_arg()
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        return jsonify({'status': 'success', **planner_due.summary(get_db(), on_date)})
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
 @app.route('/api/planner/create_project', methods=['POST'])
+@bumps('planner')
 def planner_create_project():
     try:
         data = request.json or {}
         name = data.get('name')
         if not name:
             return jsonify({'status':'error','message':'name required'}), 400
-        root = os.path.join(BASE_DIR, 'roadmaps')
+        root = app.config['ROADMAPS_DIR']
         proj = os.path.normpath(os.path.join(root, name))
         if not proj.startswith(os.path.normpath(root)):
             return jsonify({'status':'error','message':'invalid name'}), 400
         os.makedirs(proj, exist_ok=True)
+        roadmap_index.refresh_projects()
         return jsonify({'status':'success'})
     except Exception as e:
         return jsonify({'status':'error','message':str(e)}), 500
 
 
 @app.route('/api/planner/toggle_training', methods=['POST'])
+@bumps('planner')
 def planner_toggle_training():
     """Поставить/снять флаг обучающего проекта: добавляет/убирает префикс '!' у папки"""
     try:
@@ -1028,7 +1549,7 @@ def planner_toggle_training():
         if not project:
             return jsonify({'status':'error','message':'project required'}), 400
 
-        root = os.path.join(BASE_DIR, 'roadmaps')
+        root = app.config['ROADMAPS_DIR']
         src = os.path.normpath(os.path.join(root, project))
         if not src.startswith(os.path.normpath(root)) or not os.path.exists(src):
             return jsonify({'status':'error','message':'project not found'}), 404
@@ -1045,12 +1566,17 @@ def planner_toggle_training():
             return jsonify({'status':'error','message':'target name exists'}), 400
 
         os.replace(src, dst)
+        roadmap_index.rename_project(basename, new_basename)
+        _index_sync('rename_project', basename, new_basename)
+        # задачи переезжают одним UPDATE; файлы внутри папки не трогаются
+        write(planner_tasks.rename_project, basename, new_basename, app.config['PLANNER_REVIEW_INTERVALS'])
         return jsonify({'status':'success','new_name': new_basename})
     except Exception as e:
         return jsonify({'status':'error','message':str(e)}), 500
 
 
 @app.route('/api/planner/task', methods=['POST', 'PUT', 'DELETE'])
+@bumps('planner')
 def planner_task():
     try:
         data = request.json or {}
@@ -1059,7 +1585,7 @@ def planner_task():
         if not project or not filename:
             return jsonify({'status':'error','message':'project and filename required'}), 400
 
-        root = os.path.join(BASE_DIR, 'roadmaps')
+        root = app.config['ROADMAPS_DIR']
         proj_path = os.path.normpath(os.path.join(root, project))
         if not proj_path.startswith(os.path.normpath(root)) or not os.path.exists(proj_path):
             return jsonify({'status':'error','message':'project not found'}), 404
@@ -1068,38 +1594,38 @@ def planner_task():
         if not fp.startswith(proj_path):
             return jsonify({'status':'error','message':'invalid filename'}), 400
 
-        if request.method == 'POST':
-            # create new file (fail if exists)
-            # Для обучающих проектов: если в названии нет даты, добавим текущую дату
-            try:
-                is_training = project.startswith('!')
-            except Exception:
-                is_training = False
-
-            if is_training:
-                import re
-                if not re.search(r"\d{4}-\d{2}-\d{2}", filename):
-                    name, ext = os.path.splitext(filename)
-                    filename = f"{name} {date.today().isoformat()}{ext}"
-                    fp = os.path.normpath(os.path.join(proj_path, filename))
+        intervals = app.config['PLANNER_REVIEW_INTERVALS']
 
+        if request.method == 'POST':
+            # create new file (fail if exists); состояние и дата начала повторений
+            # обучающего проекта — в planner_tasks, имя файла остаётся как задано
             if os.path.exists(fp):
                 return jsonify({'status':'error','message':'file exists'}), 400
             content = data.get('content','') or ''
             with open(fp, 'w', encoding='utf-8') as f:
                 f.write(content)
-            return jsonify({'status':'success', 'filename': filename})
+            roadmap_index.write_task(project, filename, content)
+            _index_sync('put', project, filename, content)
+            task = write(planner_tasks.add_task, project, filename, intervals)
+            return jsonify({'status':'success', 'filename': filename, 'task': task})
 
         if request.method == 'PUT':
             # update content (must exist)
             content = data.get('content','') or ''
             with open(fp, 'w', encoding='utf-8') as f:
                 f.write(content)
+            roadmap_index.write_task(project, filename, content)
+            _index_sync('put', project, filename, content)
+            if planner_tasks.get_task(get_db(), project, filename) is None:
+                write(planner_tasks.add_task, project, filename, intervals)
             return jsonify({'status':'success'})
 
         if request.method == 'DELETE':
             if os.path.exists(fp):
                 os.remove(fp)
+                roadmap_index.remove_task(project, filename)
+                _index_sync('remove', project, filename)
+                write(planner_tasks.remove_task, project, filename)
                 return jsonify({'status':'success'})
             return jsonify({'status':'error','message':'file not found'}), 404
 
@@ -1107,9 +1633,95 @@ def planner_task():
         return jsonify({'status':'error','message':str(e)}), 500
 
 
+def _record_project_work(conn, project, filename, deltas):
+    """Строка «работа по проекту» за сегодня и счётчик дня (единица работы писателя)"""
+    cursor = conn.cursor()
+    today = date.today().isoformat()
+    rollup_before = snapshot_days(conn, [today])
+    core_name = os.path.splitext(filename)[0]
+    project_clean = project.lstrip('!')
+    habit_name = f'Работа по проекту ({project_clean} {core_name})'
+    category = 'Проекты'
+    hid = get_or_create_habits(conn, [(habit_name, category)])[(habit_name, category)]
+
+    def _f(k):
+        try:
+            return float(deltas.get(k, 0) or 0.0)
+        except Exception:
+            return 0.0
+
+    i_v = _f('I')
+    s_v = _f('S')
+    w_v = _f('W')
+    e_v = _f('E')
+    c_v = _f('C')
+    h_v = _f('H')
+    st_v = _f('ST')
+    money_v = _f('$')
+
+    cursor.execute('''INSERT OR REPLACE INTO completed_habits (habit_id, subtask_id, date, quantity, success, i, s, w, e, c, h, st, money, notes, day_number, state, emotion_morning, thoughts) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                   (hid, None, today, 1, 1, i_v, s_v, w_v, e_v, c_v, h_v, st_v, money_v, f'{project} {filename}', None, None, None, None))
+    sync_streaks_day(conn, today, [hid])
+
+    cursor.execute('SELECT id FROM discipline_days WHERE date = ?', (today,))
+    if not cursor.fetchone():
+        cursor.execute('INSERT INTO discipline_days (date, day_number, state, completed_count, total_count) VALUES (?, ?, ?, ?, ?)', (today, 1, None, 1, 0))
+    else:
+        cursor.execute('UPDATE discipline_days SET completed_count = COALESCE(completed_count,0) + 1 WHERE date = ?', (today,))
+
+    apply_day_changes(conn, rollup_before)
+
+
+def _apply_planner_deltas(conn, deltas, mark):
+    """Прибавить дельты характеристик из планировщика к сегодняшнему дню (единица работы писателя)"""
+    cursor = conn.cursor()
+    today = date.today().isoformat()
+    rollup_before = snapshot_days(conn, [today])
+
+    # Убедимся, что запись дисциплины существует
+    cursor.execute('SELECT id FROM discipline_days WHERE date = ?', (today,))
+    row = cursor.fetchone()
+    if not row:
+        # вставим запись с нулями
+        cursor.execute('INSERT INTO discipline_days (date, day_number, state, completed_count, total_count) VALUES (?, ?, ?, ?, ?)', (today, 1, None, 0, 0))
+
+    # Для каждого ключ прибавим к total_* поле
+    fields_map = {'I':'total_i','S':'total_s','W':'total_w','E':'total_e','C':'total_c','H':'total_h','ST':'total_st','$':'total_money'}
+    updates = {}
+    for k,v in deltas.items():
+        if k in fields_map:
+            try:
+                val = float(v)
+            except Exception:
+                val = 0.0
+            updates[fields_map[k]] = updates.get(fields_map[k], 0.0) + val
+
+    # Применяем обновления (агрегируем в SQL)
+    if updates:
+        # Построим SET часть
+        set_parts = []
+        params = []
+        for f,add in updates.items():
+            set_parts.append(f + ' = COALESCE(' + f + ', 0) + ?')
+            params.append(add)
+        params.append(today)
+        sql = 'UPDATE discipline_days SET ' + ', '.join(set_parts) + ' WHERE date = ?'
+        cursor.execute(sql, params)
+
+        # Увеличим completed_count если пометка выполнения
+        if mark:
+            cursor.execute('UPDATE discipline_days SET completed_count = COALESCE(completed_count,0) + 1 WHERE date = ?', (today,))
+
+    apply_day_changes(conn, rollup_before)
+
+
 @app.route('/api/planner/complete', methods=['POST'])
+@bumps('planner', 'habits', 'days')
 def planner_mark_complete():
-    """Отметить задачу выполненной/отменить отметку — переименовывает файл"""
+    """Отметить задачу выполненной/отменить отметку — меняет строку planner_tasks, файл не переименовывается
+
+    Обучающий проект ('!'): отметка — повторение (x + 1, дата — сегодня), после трёх — выполнено.
+    """
     try:
         data = request.json or {}
         project = data.get('project')
@@ -1119,246 +1731,85 @@ def planner_mark_complete():
         if not project or not filename:
             return jsonify({'status': 'error', 'message': 'project and filename required'}), 400
 
-        root = os.path.join(BASE_DIR, 'roadmaps')
+        root = app.config['ROADMAPS_DIR']
         proj_path = os.path.normpath(os.path.join(root, project))
-        if not proj_path.startswith(os.path.normpath(root)) or not os.path.exists(proj_path):
+        if not proj_path.startswith(os.path.normpath(root)):
             return jsonify({'status': 'error', 'message': 'Project not found'}), 404
 
-        src = os.path.join(proj_path, filename)
-        if not os.path.exists(src) or not os.path.isfile(src):
-            return jsonify({'status': 'error', 'message': 'File not found'}), 404
-
-        name, ext = os.path.splitext(filename)
-        done_suffix = ' выполнено'
-
-        try:
-            is_training = project.startswith('!')
-        except Exception:
-            is_training = False
-
-        if is_training:
-            # Ebbinghaus behavior: append one 'x' per completion; after 3 x -> mark done
-            # Also set/update the date of last completion in the filename when marking.
-            base = name
-            # remove existing done suffix if present
-            if base.endswith(done_suffix):
-                base = base[:-len(done_suffix)]
-
-            import re
-            # parse: core name, optional date YYYY-MM-DD, optional xs
-            m = re.match(r"^(.*?)(?:\s(\d{4}-\d{2}-\d{2}))?(?:\s([x]+))?$", base)
-            if m:
-                core = (m.group(1) or '').strip()
-                date_part = m.group(2)
-                xs = m.group(3) or ''
-                x_count = len(xs)
-            else:
-                core = base.strip()
-                date_part = None
-                x_count = 0
-
-            today_str = date.today().isoformat()
-
-            if mark:
-                # increment repetitions (cap at 3) and update last-date to today
-                x_count = min(3, x_count + 1)
-                date_part = today_str
-            else:
-                # unmark: if was done (had done_suffix) - remove done flag but keep 3 x
-                if name.endswith(done_suffix):
-                    x_count = 3
-                elif x_count > 0:
-                    x_count = max(0, x_count - 1)
-                # if no more repetitions, clear date
-                if x_count == 0:
-                    date_part = None
-
-            # build new name
-            parts = [core]
-            if date_part:
-                parts.append(date_part)
-            if x_count > 0:
-                parts.append('x' * x_count)
-
-            new_name_body = ' '.join(parts).strip()
-            if x_count >= 3:
-                new_name = new_name_body + done_suffix + ext
-            else:
-                new_name = new_name_body + ext
-
-            dst = os.path.join(proj_path, new_name)
-            os.replace(src, dst)
-            # add to completions as project work
+        intervals = app.config['PLANNER_REVIEW_INTERVALS']
+        if planner_tasks.get_task(get_db(), project, filename) is None:
+            # файл мог появиться мимо приложения после запуска
+            if not os.path.isfile(os.path.join(proj_path, filename)):
+                return jsonify({'status': 'error', 'message': 'File not found'}), 404
+            write(planner_tasks.add_task, project, filename, intervals)
+
+        # отметка, «работа по проекту» и дельты характеристик — единицы одной пачки писателя
+        deltas = data.get('deltas') or {}
+        state = submit_write(planner_tasks.set_mark, project, filename, mark, intervals)
+        pending = []
+        if mark:
+            pending.append(('Error adding project work to completions:',
+                            submit_write(_record_project_work, project, filename, deltas)))
+        if not project.startswith('!') and any(k in deltas for k in ('I','S','W','E','C','H','ST','$')):
+            pending.append(('Error applying deltas from planner:',
+                            submit_write(_apply_planner_deltas, deltas, mark)))
+        task = state.result()
+        for message, future in pending:
             try:
-                if mark:
-                    conn = sqlite3.connect('habits.db')
-                    cursor = conn.cursor()
-                    today = date.today().isoformat()
-                    core_name = os.path.splitext(new_name)[0]
-                    # remove leading training marker (!) from project for clearer habit name
-                    project_clean = project.lstrip('!')
-                    habit_name = f'Работа по проекту ({project_clean} {core_name})'
-                    category = 'Проекты'
-                    cursor.execute('SELECT id FROM habits WHERE name = ? AND category = ?', (habit_name, category))
-                    row = cursor.fetchone()
-                    if row:
-                        hid = row[0]
-                    else:
-                        cursor.execute('''INSERT INTO habits (name, category, description, i, s, w, e, c, h, st, money, is_composite, is_active) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                                       (habit_name, category, '', 0.0,0.0,0.0,0.0,0.0,0.0,0.0,0.0,0,1))
-                        hid = cursor.lastrowid
-
-                    # if planner provided deltas, use them for this completed_habits row
-                    deltas = data.get('deltas') or {}
-                    def _f(k):
-                        try:
-                            return float(deltas.get(k, 0) or 0.0)
-                        except Exception:
-                            return 0.0
-
-                    i_v = _f('I')
-                    s_v = _f('S')
-                    w_v = _f('W')
-                    e_v = _f('E')
-                    c_v = _f('C')
-                    h_v = _f('H')
-                    st_v = _f('ST')
-                    money_v = _f('$')
-
-                    cursor.execute('''INSERT OR REPLACE INTO completed_habits (habit_id, subtask_id, date, quantity, success, i, s, w, e, c, h, st, money, notes, day_number, state, emotion_morning, thoughts) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                                   (hid, None, today, 1, 1, i_v, s_v, w_v, e_v, c_v, h_v, st_v, money_v, f'{project} {new_name}', None, None, None, None))
-
-                    cursor.execute('SELECT id FROM discipline_days WHERE date = ?', (today,))
-                    if not cursor.fetchone():
-                        cursor.execute('INSERT INTO discipline_days (date, day_number, state, completed_count, total_count) VALUES (?, ?, ?, ?, ?)', (today, 1, None, 1, 0))
-                    else:
-                        cursor.execute('UPDATE discipline_days SET completed_count = COALESCE(completed_count,0) + 1 WHERE date = ?', (today,))
-
-                    conn.commit()
-                    conn.close()
+                future.result()
             except Exception as e:
-                print('Error adding project work to completions:', e)
+                print(message, e)
 
-            return jsonify({'status':'success','filename': new_name, 'x_count': x_count, 'date': date_part})
+        return jsonify({'status': 'success', 'filename': filename, 'completed': task['completed'],
+                        'x_count': task['x_count'], 'date': task['date'], 'task': task})
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
 
-        else:
-            # обычное поведение: добавляем дату выполнения при пометке
-            if mark and done_suffix not in name:
-                today_str = date.today().isoformat()
-                # вставляем дату перед суффиксом " выполнено"
-                new_name = f"{name} {today_str}{done_suffix}{ext}"
-            elif not mark and done_suffix in name:
-                # при снятии отметки убираем дату и суффикс
-                import re
-                # name может содержать дату перед словом "выполнено"
-                # удаляем дату и суффикс
-                base = re.sub(r"\s\d{4}-\d{2}-\d{2}(?=\sвыполнено)", '', name)
-                base = base.replace(done_suffix, '')
-                new_name = base + ext
-            else:
-                new_name = filename
 
-        dst = os.path.join(proj_path, new_name)
-        os.replace(src, dst)
+@app.route('/api/planner/export_names', methods=['POST'])
+@bumps('planner')
+def planner_export_names():
+    """Записать состояние задач в имена файлов (формат прежних версий): {"project": ...} или все проекты
 
-        # add to completions as project work for non-training projects
-        try:
-            if mark:
-                conn = sqlite3.connect('habits.db')
-                cursor = conn.cursor()
-                today = date.today().isoformat()
-                core_name = os.path.splitext(new_name)[0]
-                project_clean = project.lstrip('!')
-                habit_name = f'Работа по проекту ({project_clean} {core_name})'
-                category = 'Проекты'
-                cursor.execute('SELECT id FROM habits WHERE name = ? AND category = ?', (habit_name, category))
-                row = cursor.fetchone()
-                if row:
-                    hid = row[0]
-                else:
-                    cursor.execute('''INSERT INTO habits (name, category, description, i, s, w, e, c, h, st, money, is_composite, is_active) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                                   (habit_name, category, '', 0.0,0.0,0.0,0.0,0.0,0.0,0.0,0.0,0,1))
-                    hid = cursor.lastrowid
-
-                deltas = data.get('deltas') or {}
-                def _f(k):
-                    try:
-                        return float(deltas.get(k, 0) or 0.0)
-                    except Exception:
-                        return 0.0
-
-                i_v = _f('I')
-                s_v = _f('S')
-                w_v = _f('W')
-                e_v = _f('E')
-                c_v = _f('C')
-                h_v = _f('H')
-                st_v = _f('ST')
-                money_v = _f('$')
-
-                cursor.execute('''INSERT OR REPLACE INTO completed_habits (habit_id, subtask_id, date, quantity, success, i, s, w, e, c, h, st, money, notes, day_number, state, emotion_morning, thoughts) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                               (hid, None, today, 1, 1, i_v, s_v, w_v, e_v, c_v, h_v, st_v, money_v, f'{project} {new_name}', None, None, None, None))
-
-                cursor.execute('SELECT id FROM discipline_days WHERE date = ?', (today,))
-                if not cursor.fetchone():
-                    cursor.execute('INSERT INTO discipline_days (date, day_number, state, completed_count, total_count) VALUES (?, ?, ?, ?, ?)', (today, 1, None, 1, 0))
-                else:
-                    cursor.execute('UPDATE discipline_days SET completed_count = COALESCE(completed_count,0) + 1 WHERE date = ?', (today,))
+    Для совместимости: после выгрузки папку можно открыть старой версией планировщика.
+    """
+    try:
+        data = request.json or {}
+        root = app.config['ROADMAPS_DIR']
+        projects = [data['project']] if data.get('project') else roadmap_index.projects()
+        renamed = []
+        for project in projects:
+            proj_path = os.path.normpath(os.path.join(root, project))
+            if not proj_path.startswith(os.path.normpath(root)) or not os.path.isdir(proj_path):
+                return jsonify({'status': 'error', 'message': f'project not found: {project}'}), 404
+            renames = []
+            for task in planner_tasks.list_tasks(get_db(), project):
+                new_name = planner_tasks.legacy_name(project, task, task['filename'])
+                dst = os.path.join(proj_path, new_name)
+                if new_name == task['filename'] or os.path.exists(dst):
+                    continue
+                os.replace(os.path.join(proj_path, task['filename']), dst)
+                roadmap_index.rename_task(project, task['filename'], new_name)
+                _index_sync('rename', project, task['filename'], new_name)
+                renames.append((task['filename'], new_name))
+            write(planner_tasks.rename_files, project, renames)
+            renamed += [{'project': project, 'from': old, 'to': new} for old, new in renames]
+        return jsonify({'status': 'success', 'renamed': renamed})
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
 
-                conn.commit()
-                conn.close()
-        except Exception as e:
-            print('Error adding project work to completions:', e)
 
-        # Если пришли дельты характеристик — применим их к сегодняшнему дню
-        try:
-            deltas = data.get('deltas') or {}
-            apply_deltas = any(k in deltas for k in ('I','S','W','E','C','H','ST','$'))
-            if apply_deltas:
-                conn = sqlite3.connect('habits.db')
-                cursor = conn.cursor()
-                today = date.today().isoformat()
-
-                # Убедимся, что запись дисциплины существует
-                cursor.execute('SELECT id FROM discipline_days WHERE date = ?', (today,))
-                row = cursor.fetchone()
-                if not row:
-                    # вставим запись с нулями
-                    cursor.execute('INSERT INTO discipline_days (date, day_number, state, completed_count, total_count) VALUES (?, ?, ?, ?, ?)', (today, 1, None, 0, 0))
-
-                # Для каждого ключ прибавим к total_* поле
-                fields_map = {'I':'total_i','S':'total_s','W':'total_w','E':'total_e','C':'total_c','H':'total_h','ST':'total_st','$':'total_money'}
-                updates = {}
-                for k,v in deltas.items():
-                    if k in fields_map:
-                        try:
-                            val = float(v)
-                        except Exception:
-                            val = 0.0
-                        updates[fields_map[k]] = updates.get(fields_map[k], 0.0) + val
-
-                # Применяем обновления (агрегируем в SQL)
-                if updates:
-                    # Построим SET часть
-                    set_parts = []
-                    params = []
-                    for f,add in updates.items():
-                        set_parts.append(f + ' = COALESCE(' + f + ', 0) + ?')
-                        params.append(add)
-                    params.append(today)
-                    sql = 'UPDATE discipline_days SET ' + ', '.join(set_parts) + ' WHERE date = ?'
-                    cursor.execute(sql, params)
-
-                    # Увеличим completed_count если пометка выполнения
-                    if mark:
-                        cursor.execute('UPDATE discipline_days SET completed_count = COALESCE(completed_count,0) + 1 WHERE date = ?', (today,))
-
-                conn.commit()
-                conn.close()
-        except Exception as e:
-            print('Error applying deltas from planner:', e)
-
-        return jsonify({'status': 'success', 'filename': new_name})
+@app.route('/api/planner/sync', methods=['POST'])
+@bumps('planner')
+def planner_sync():
+    """Подхватить файлы, добавленные или удалённые мимо приложения (planner_tasks и поисковый индекс)"""
+    try:
+        added, removed = write(planner_tasks.reconcile, app.config['ROADMAPS_DIR'],
+                               app.config['PLANNER_REVIEW_INTERVALS'])
+        if roadmap_search is not None:
+            roadmap_search.reconcile()
+        roadmap_index.refresh_projects()
+        return jsonify({'status': 'success', 'added': added, 'removed': removed})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
@@ -1385,5 +1836,6 @@ if __name__ == '__main__':
     print("   GET  /api/stats/total_days- общее количество дней")
     print("=" * 80)
     
-    # Запускаем сервер
+    # Запускаем сервер разработки (для работы — serve.py: несколько процессов и потоков)
+    create_app()
     app.run(debug=True, host='127.0.0.1', port=5000)
\ No newline at end of file
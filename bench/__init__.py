@@ -0,0 +1,5 @@
+"""Нагрузочные замеры: синтетические базы (`bench.dataset`) и прогон маршрутов (`bench.run`).
+
+    python -m bench.run --years 3 --habits 80 --out bench/results/base.json
+    python -m bench.run --years 3 --habits 80 --baseline bench/results/base.json
+"""
@@ -0,0 +1,176 @@
+"""Генератор синтетических данных для замеров.
+
+Строит в каталоге `workdir` файл habits.db (схема — server.db.init_db) и
+дерево roadmaps/. Все значения берутся из random.Random(seed), поэтому при
+одинаковых параметрах база получается одинаковой; даты отсчитываются назад
+от `end` (по умолчанию сегодня), чтобы недельная/месячная статистика
+попадала в данные.
+"""
+
+import os
+import random
+from datetime import date, timedelta
+
+from server import rollups
+from server.combinations import ATTR_COLUMNS
+from server.connection import connect
+from server.db import init_db
+from server.streaks import rebuild_all as rebuild_all_streaks
+
+CATEGORIES = ('Здоровье', 'Спорт', 'Учёба', 'Работа', 'Быт', 'Финансы', 'Отдых', 'Развитие')
+STATES = ('отлично', 'хорошо', 'нормально', 'устал', 'плохо')
+
+DEFAULTS = {
+    'habits': 80,
+    'subtasks': 200,
+    'years': 3,
+    'combinations': 60,
+    'groups': 10,
+    'projects': 10,
+    'tasks': 40,
+    'seed': 42,
+}
+
+
+def _attrs(rng, scale=1.0):
+    return tuple(round(rng.uniform(-0.5, 2.0) * scale, 2) for _ in ATTR_COLUMNS)
+
+
+def _insert_habits(cursor, rng, count, subtasks):
+    habits = []
+    for n in range(count):
+        category = CATEGORIES[n % len(CATEGORIES)]
+        values = _attrs(rng)
+        cursor.execute(
+            'INSERT INTO habits (name, category, description, default_quantity, unit, '
+            + ', '.join(ATTR_COLUMNS) + ', is_composite, is_active)'
+            ' VALUES (?, ?, ?, ?, ?, ' + ', '.join('?' * len(ATTR_COLUMNS)) + ', 0, ?)',
+            (f'Привычка {n + 1}', category, f'Синтетическая привычка #{n + 1}',
+             rng.choice((None, 1, 10, 30)), rng.choice((None, 'раз', 'мин', 'стр')))
+            + values + (int(rng.random() > 0.05),))
+        # вероятность выполнения и «инерция» (шанс повторить вчерашний исход)
+        habits.append({'id': cursor.lastrowid, 'values': values,
+                       'p': rng.uniform(0.2, 0.95), 'stick': rng.uniform(0.5, 0.9)})
+
+    composite = rng.sample(habits, min(len(habits), max(1, subtasks // 4))) if subtasks else []
+    for k in range(subtasks):
+        habit = composite[k % len(composite)]
+        cursor.execute(
+            'INSERT INTO habit_subtasks (habit_id, name, default_quantity, unit, '
+            + ', '.join(ATTR_COLUMNS) + ', order_index)'
+            ' VALUES (?, ?, ?, ?, ' + ', '.join('?' * len(ATTR_COLUMNS)) + ', ?)',
+            (habit['id'], f'Подзадача {k + 1}', 1, 'раз') + _attrs(rng, 0.5) + (k // len(composite),))
+    cursor.executemany('UPDATE habits SET is_composite = 1 WHERE id = ?', [(h['id'],) for h in composite])
+    return habits
+
+
+def _insert_combinations(cursor, rng, habits, pairs, groups):
+    ids = [h['id'] for h in habits]
+    seen = set()
+    attempts = 0
+    while len(seen) < pairs and attempts < pairs * 20 and len(ids) > 1:
+        attempts += 1
+        a, b = sorted(rng.sample(ids, 2))
+        if (a, b) in seen:
+            continue
+        seen.add((a, b))
+        cursor.execute(
+            'INSERT INTO combinations (name, habit_a, habit_b, ' + ', '.join(ATTR_COLUMNS) + ')'
+            ' VALUES (?, ?, ?, ' + ', '.join('?' * len(ATTR_COLUMNS)) + ')',
+            (f'Сочетание {len(seen)}', a, b) + _attrs(rng, 0.3))
+    for g in range(groups if len(ids) > 2 else 0):
+        cursor.execute(
+            'INSERT INTO combo_groups (name, ' + ', '.join(ATTR_COLUMNS) + ')'
+            ' VALUES (?, ' + ', '.join('?' * len(ATTR_COLUMNS)) + ')',
+            (f'Группа {g + 1}',) + _attrs(rng, 0.5))
+        group_id = cursor.lastrowid
+        members = rng.sample(ids, rng.randint(3, min(5, len(ids))))
+        cursor.executemany('INSERT INTO combo_group_members (group_id, habit_id) VALUES (?, ?)',
+                           [(group_id, habit_id) for habit_id in members])
+
+
+def _insert_days(cursor, rng, habits, days, end):
+    done_yesterday = {h['id']: False for h in habits}
+    start = end - timedelta(days=days - 1)
+    for n in range(days):
+        day = (start + timedelta(days=n)).isoformat()
+        if rng.random() < 0.03:
+            # пропущенные дни — без отчёта
+            continue
+        state = rng.choice(STATES)
+        thoughts = f'Заметка за {day}' if rng.random() < 0.3 else None
+        rows = []
+        totals = [0.0] * len(ATTR_COLUMNS)
+        completed = 0
+        for habit in habits:
+            prev = done_yesterday[habit['id']]
+            success = prev if rng.random() < habit['stick'] else rng.random() < habit['p']
+            done_yesterday[habit['id']] = success
+            if not success and rng.random() < 0.7:
+                continue
+            if success:
+                completed += 1
+                for i, v in enumerate(habit['values']):
+                    totals[i] += v
+            rows.append((habit['id'], day, rng.choice((None, 1, 5, 20)), int(success))
+                        + (habit['values'] if success else (0.0,) * len(ATTR_COLUMNS))
+                        + (n + 1, state, None, thoughts))
+        cursor.executemany(
+            'INSERT INTO completed_habits (habit_id, date, quantity, success, '
+            + ', '.join(ATTR_COLUMNS) + ', day_number, state, emotion_morning, thoughts)'
+            ' VALUES (?, ?, ?, ?, ' + ', '.join('?' * len(ATTR_COLUMNS)) + ', ?, ?, ?, ?)', rows)
+        cursor.execute(
+            'INSERT INTO discipline_days (date, day_number, state, emotion_morning, thoughts, '
+            + ', '.join(rollups.TOTAL_COLUMNS) + ', completed_count, total_count, friction_index)'
+            ' VALUES (?, ?, ?, ?, ?, ' + ', '.join('?' * len(rollups.TOTAL_COLUMNS)) + ', ?, ?, ?)',
+            (day, n + 1, state, None, thoughts) + tuple(round(t, 2) for t in totals)
+            + (completed, len(rows), rng.randint(1, 10)))
+
+
+def _write_roadmaps(root, rng, projects, tasks, end):
+    os.makedirs(root, exist_ok=True)
+    for p in range(projects):
+        training = p % 2 == 0
+        project = ('!' if training else '') + f'Проект {p + 1}'
+        path = os.path.join(root, project)
+        os.makedirs(path, exist_ok=True)
+        for t in range(tasks):
+            name = f'{t + 1}Тема {t + 1}'
+            if training and rng.random() < 0.7:
+                name += ' ' + (end - timedelta(days=rng.randint(0, 60))).isoformat()
+                xs = rng.randint(0, 3)
+                if xs:
+                    name += ' ' + 'x' * xs
+            if rng.random() < 0.25:
+                name += ' выполнено'
+            lines = [f'- пункт {k + 1}: ' + 'текст ' * rng.randint(1, 12) for k in range(rng.randint(0, 40))]
+            with open(os.path.join(path, name + '.txt'), 'w', encoding='utf-8') as f:
+                f.write('\n'.join(lines))
+
+
+def generate(workdir, habits=DEFAULTS['habits'], subtasks=DEFAULTS['subtasks'], years=DEFAULTS['years'],
+             combinations=DEFAULTS['combinations'], groups=DEFAULTS['groups'], projects=DEFAULTS['projects'],
+             tasks=DEFAULTS['tasks'], seed=DEFAULTS['seed'], end=None):
+    """Создать workdir/habits.db и workdir/roadmaps; вернуть путь к БД."""
+    os.makedirs(workdir, exist_ok=True)
+    db_path = os.path.join(workdir, 'habits.db')
+    for suffix in ('', '-wal', '-shm', '-stamps'):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+    end = end or date.today()
+    rng = random.Random(seed)
+
+    init_db(db_path)
+    conn = connect(db_path)
+    cursor = conn.cursor()
+    habit_rows = _insert_habits(cursor, rng, habits, subtasks)
+    _insert_combinations(cursor, rng, habit_rows, combinations, groups)
+    _insert_days(cursor, rng, habit_rows, int(years * 365), end)
+    rebuild_all_streaks(conn)
+    rollups.rebuild(conn)
+    conn.commit()
+    cursor.execute('ANALYZE')
+    conn.commit()
+
+    _write_roadmaps(os.path.join(workdir, 'roadmaps'), rng, projects, tasks, end)
+    return db_path
@@ -0,0 +1,318 @@
+"""Прогон замеров: маршруты API через тестовый клиент Flask и функции server.db напрямую.
+
+Для каждого случая — p50/p95/p99, среднее, максимум (мс) и число SQL-запросов
+за вызов (по счётчикам запросов server.metrics). Результат сохраняется в JSON;
+с `--baseline` новый прогон сравнивается со старым, и при регрессии по p50
+(или росте числа запросов) код выхода — 1.
+
+    python -m bench.run [--years 3] [--habits 80] [--repeat 30] [--out FILE] [--baseline FILE]
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from urllib.parse import quote
+
+from bench import dataset
+from server import metrics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values, p):
+    """Перцентиль по ближайшему рангу."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = max(1, math.ceil(p / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class QueryCounter:
+    """Счётчик SQL-операторов за вызов по счётчикам запросов server.metrics.
+
+    Запросы к маршрутам учитываются через metrics.record (туда же попадают
+    операторы, выполненные писателем от имени запроса), прямые вызовы
+    функций — через собственный привязанный счётчик.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._stats = None
+        original = metrics.record
+
+        def record(method, endpoint, status, duration, stats):
+            self.count += stats.statements
+            original(method, endpoint, status, duration, stats)
+
+        metrics.record = record
+
+    def start(self):
+        self.count = 0
+        self._stats = metrics.RequestStats()
+        metrics.bind(self._stats)
+
+    def stop(self):
+        metrics.bind(None)
+        return self.count + self._stats.statements
+
+
+def measure(fn, counter, repeat, warmup):
+    for _ in range(warmup):
+        fn()
+    timings, queries = [], []
+    for _ in range(repeat):
+        counter.start()
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000.0)
+        queries.append(counter.stop())
+    return {
+        'n': repeat,
+        'mean_ms': round(sum(timings) / len(timings), 3),
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'max_ms': round(max(timings), 3),
+        'queries': percentile(queries, 50),
+    }
+
+
+def _load_app(workdir):
+    """Настроить app2 на синтетическую базу и дерево roadmaps/."""
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    import app2
+
+    app2.create_app({'DATABASE': os.path.join(workdir, 'habits.db'),
+                     'ROADMAPS_DIR': os.path.join(workdir, 'roadmaps')})
+    return app2
+
+
+def _check(response):
+    if response.status_code >= 400:
+        raise RuntimeError(f'{response.request.method} {response.request.path}: '
+                           f'{response.status_code} {response.get_data(as_text=True)[:200]}')
+    return response
+
+
+def _day_payload(habit_rows, day):
+    """Тело POST /api/completions для дня `day`, как его собирает клиент."""
+    habits = []
+    for row in habit_rows:
+        success = (row[0] + day.toordinal()) % 3 != 0
+        habits.append({'habit_id': row[0], 'quantity': 1, 'success': success,
+                       'attributes': dict(zip(('I', 'S', 'W', 'E', 'C', 'H', 'ST', '$'), row[1:]))})
+    return {'date': day.isoformat(), 'day_number': 1, 'state': 'хорошо', 'habits': habits,
+            'totals': {'I': 1.0, 'S': 1.0}, 'completed_count': len(habits), 'total_count': len(habits),
+            'friction_index': 3}
+
+
+def route_cases(app2, conn):
+    client = app2.app.test_client()
+    today = date.today()
+    cursor = conn.cursor()
+    cursor.execute('SELECT date FROM discipline_days ORDER BY date DESC LIMIT 1')
+    last_day = cursor.fetchone()[0]
+    cursor.execute('SELECT id, i, s, w, e, c, h, st, money FROM habits WHERE is_active = 1 ORDER BY id')
+    habit_rows = cursor.fetchall()
+    projects = app2.roadmap_index.projects()
+    project = projects[0] if projects else ''
+    tasks = app2.roadmap_index.tasks(project, with_content=False) if project else []
+    task_name = tasks[0]['filename'] if tasks else ''
+
+    # дни для записи выбираются по кругу в последнем месяце
+    write_days = [today - timedelta(days=k) for k in range(1, 29)]
+    state = {'n': 0}
+
+    def next_day():
+        state['n'] += 1
+        return write_days[state['n'] % len(write_days)]
+
+    def save_day():
+        _check(client.post('/api/completions', json=_day_payload(habit_rows, next_day())))
+
+    def patch_day():
+        day = next_day()
+        payload = _day_payload(habit_rows, day)
+        payload['habits'] = payload['habits'][state['n'] % 7:]
+        _check(client.patch(f'/api/completions/{day.isoformat()}', json=payload))
+
+    def put_task():
+        _check(client.put('/api/planner/task', json={'project': project, 'filename': task_name,
+                                                     'content': f'обновление {state["n"]}'}))
+        state['n'] += 1
+
+    get = lambda url: (lambda: _check(client.get(url)))
+    cases = [
+        ('GET /api/habits', get('/api/habits')),
+        ('GET /api/habits/categories', get('/api/habits/categories')),
+        ('GET /api/combinations', get('/api/combinations')),
+        ('GET /api/combinations/bonuses', get(f'/api/combinations/bonuses?start={today - timedelta(days=30)}&end={today}')),
+        ('GET /api/completions/<date>', get(f'/api/completions/{last_day}')),
+        ('GET /api/stats/period?period=week', get('/api/stats/period?period=week')),
+        ('GET /api/stats/period?period=month', get('/api/stats/period?period=month')),
+        ('GET /api/stats/period?period=all', get('/api/stats/period?period=all')),
+        ('GET /api/stats/totals', get('/api/stats/totals')),
+        ('GET /api/stats/streaks', get('/api/stats/streaks')),
+        ('GET /api/stats/total_days', get('/api/stats/total_days')),
+        ('GET /api/stats/daily_comparison', get(f'/api/stats/daily_comparison?date={last_day}')),
+        ('GET /api/days/index', get('/api/days/index?limit=366')),
+        ('GET /api/health', get('/api/health')),
+        ('GET /api/planner/projects', get('/api/planner/projects')),
+        ('GET /api/planner/project/<name>', get('/api/planner/project/' + quote(project))),
+        ('GET /api/planner/project/<name>?include=content',
+         get('/api/planner/project/' + quote(project) + '?include=content')),
+        ('GET /api/planner/project/<name>/content/<file>',
+         get('/api/planner/project/' + quote(project) + '/content/' + quote(task_name))),
+        ('POST /api/completions', save_day),
+        ('PATCH /api/completions/<date>', patch_day),
+        ('PUT /api/planner/task', put_task),
+    ]
+    return [case for case in cases if project or 'planner/project' not in case[0]]
+
+
+def function_cases(conn):
+    from server import db, rollups, streaks
+    from server.combinations import CombinationEngine
+
+    cursor = conn.cursor()
+    cursor.execute('SELECT MIN(date), MAX(date) FROM discipline_days')
+    first, last = cursor.fetchone()
+    cursor.execute('SELECT id FROM habits ORDER BY id LIMIT 1')
+    habit_id = cursor.fetchone()[0]
+    first_day, last_day = date.fromisoformat(first), date.fromisoformat(last)
+
+    def rolled_back(fn):
+        # функции записи меряем в транзакции, которую потом откатываем
+        def run():
+            try:
+                fn()
+            finally:
+                conn.rollback()
+        return run
+
+    return [
+        ('server.db.init_db', lambda: db.init_db(conn.execute('PRAGMA database_list').fetchone()[2])),
+        ('server.streaks.rebuild_all', rolled_back(lambda: streaks.rebuild_all(conn))),
+        ('server.streaks.sync_day', rolled_back(lambda: streaks.sync_day(conn, last, {habit_id}))),
+        ('server.rollups.rebuild', rolled_back(lambda: rollups.rebuild(conn))),
+        ('server.rollups.range_totals(all)', lambda: rollups.range_totals(conn, first_day, last_day)),
+        ('CombinationEngine.load', lambda: CombinationEngine.load(conn)),
+    ]
+
+
+def run(args):
+    workdir = args.workdir or tempfile.mkdtemp(prefix='bench-')
+    try:
+        return _run(args, workdir)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _run(args, workdir):
+    params = {key: getattr(args, key) for key in dataset.DEFAULTS}
+    started = time.perf_counter()
+    dataset.generate(workdir, **params)
+    generate_s = time.perf_counter() - started
+
+    app2 = _load_app(workdir)
+    from server.connection import connect
+    conn = connect()
+    counter = QueryCounter()
+
+    cursor = conn.cursor()
+    sizes = {}
+    for table in ('habits', 'habit_subtasks', 'completed_habits', 'discipline_days', 'combinations'):
+        cursor.execute(f'SELECT COUNT(*) FROM {table}')
+        sizes[table] = cursor.fetchone()[0]
+
+    results = {}
+    for name, fn in route_cases(app2, conn) + function_cases(conn):
+        if args.only and args.only not in name:
+            continue
+        results[name] = measure(fn, counter, args.repeat, args.warmup)
+        r = results[name]
+        print(f"{name:<55} p50 {r['p50_ms']:>9.2f}  p95 {r['p95_ms']:>9.2f}  "
+              f"p99 {r['p99_ms']:>9.2f} ms  q {r['queries']}")
+
+    return {
+        'meta': {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'dataset': params,
+            'rows': sizes,
+            'generate_s': round(generate_s, 2),
+            'repeat': args.repeat,
+            'warmup': args.warmup,
+        },
+        'results': results,
+    }
+
+
+def compare(baseline, current, threshold, min_delta_ms=0.5):
+    """Сравнить прогоны; вернуть список регрессий (строки для вывода)."""
+    regressions = []
+    print(f"\n{'случай':<55} {'p50 было':>10} {'стало':>10} {'изм.':>8}  запросы")
+    for name, new in current['results'].items():
+        old = baseline['results'].get(name)
+        if old is None:
+            continue
+        change = (new['p50_ms'] - old['p50_ms']) / old['p50_ms'] if old['p50_ms'] else 0.0
+        mark = ''
+        slower = change > threshold and new['p50_ms'] - old['p50_ms'] > min_delta_ms
+        if slower or new['queries'] > old['queries']:
+            mark = '  <-- регрессия'
+            regressions.append(name)
+        print(f"{name:<55} {old['p50_ms']:>10.2f} {new['p50_ms']:>10.2f} {change * 100:>7.1f}%  "
+              f"{old['queries']} -> {new['queries']}{mark}")
+    if baseline['meta'].get('dataset') != current['meta'].get('dataset'):
+        print('\n⚠️ параметры набора данных различаются — сравнение ориентировочное')
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Замеры маршрутов и функций на синтетической базе')
+    for key, value in dataset.DEFAULTS.items():
+        parser.add_argument('--' + key, type=type(value), default=value)
+    parser.add_argument('--repeat', type=int, default=30, help='замеров на случай')
+    parser.add_argument('--warmup', type=int, default=3, help='прогревочных вызовов на случай')
+    parser.add_argument('--only', help='только случаи, содержащие подстроку')
+    parser.add_argument('--workdir', help='каталог для базы и roadmaps/ (по умолчанию временный)')
+    parser.add_argument('--out', help='файл JSON с результатами (по умолчанию bench/results/<время>.json)')
+    parser.add_argument('--baseline', help='JSON прошлого прогона для сравнения')
+    parser.add_argument('--threshold', type=float, default=0.2, help='допустимый рост p50 (доля)')
+    parser.add_argument('--min-delta-ms', type=float, default=0.5,
+                        help='рост p50 меньше этого (мс) регрессией не считается')
+    args = parser.parse_args(argv)
+
+    report = run(args)
+
+    out = args.out or os.path.join(ROOT, 'bench', 'results',
+                                   datetime.now().strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f'\nрезультаты: {out}')
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare(baseline, report, args.threshold, args.min_delta_ms):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
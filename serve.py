@@ -0,0 +1,190 @@
+"""Рабочий запуск сервера: несколько процессов-воркеров и пул потоков в каждом.
+
+    python serve.py [--host 127.0.0.1] [--port 5000] [--workers N] [--threads M] [--db habits.db]
+
+Схема БД создаётся один раз в родительском процессе (create_app), после чего
+родитель закрывает свои соединения, открывает слушающий сокет и делает fork
+воркеров; воркеры принимают соединения с общего сокета и открывают свои
+соединения SQLite (WAL + busy_timeout, см. server.connection). Упавший воркер
+перезапускается с растущей паузой; если воркеры падают сразу после старта
+MAX_CRASHES раз подряд (например, ошибка при импорте), сервер останавливается
+с кодом 1. Где нет fork (Windows), работает один процесс с пулом потоков.
+Сервер — werkzeug без режима отладки и перезагрузчика.
+"""
+
+import argparse
+import os
+import signal
+import socket
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+from server.connection import close_thread_connections
+
+# пауза перед перезапуском: RESTART_DELAY * 2**(падений подряд - 1), не больше RESTART_DELAY_MAX
+RESTART_DELAY = 0.5
+RESTART_DELAY_MAX = 30.0
+# воркер, проработавший столько секунд, считается запустившимся: счётчик падений сбрасывается
+STABLE_AFTER = 60.0
+MAX_CRASHES = 5
+
+
+class RequestHandler(WSGIRequestHandler):
+    # keep-alive соединение без запросов не должно занимать поток пула вечно
+    timeout = 15
+    access_log = False
+
+    def log_request(self, code='-', size='-'):
+        if self.access_log:
+            super().log_request(code, size)
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """WSGI-сервер werkzeug с ограниченным пулом потоков обработки."""
+
+    multithread = True
+
+    def __init__(self, host, port, app, threads, fd=None, multiprocess=False):
+        self.multiprocess = multiprocess
+        self._pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='wsgi')
+        super().__init__(host, port, app, handler=RequestHandler, fd=fd)
+
+    def process_request(self, request, client_address):
+        self._pool.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def shutdown_pool(self):
+        self._pool.shutdown(wait=False)
+
+
+def _listen(host, port, backlog=128):
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(app, sock, host, port, threads, multiprocess):
+    server = PooledWSGIServer(host, port, app, threads, fd=sock.fileno(), multiprocess=multiprocess)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        server.shutdown_pool()
+        close_thread_connections()
+
+
+def _spawn(app, sock, host, port, threads):
+    pid = os.fork()
+    if pid == 0:
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        code = 0
+        try:
+            _run_worker(app, sock, host, port, threads, multiprocess=True)
+        except BaseException:
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+def serve(app, host, port, workers, threads):
+    sock = _listen(host, port)
+    print(f'📍 http://{host}:{port}  воркеров: {workers}, потоков на воркер: {threads}')
+
+    if workers <= 1 or not hasattr(os, 'fork'):
+        if workers > 1:
+            print('⚠️ fork недоступен — работает один процесс')
+        try:
+            _run_worker(app, sock, host, port, threads, multiprocess=False)
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    # соединения родителя (после init_db) не должны наследоваться воркерами
+    close_thread_connections()
+    children = {}  # pid -> время запуска
+    stopping = False
+    crashes = 0
+    exit_code = 0
+
+    def _stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, _stop)
+    signal.signal(signal.SIGTERM, _stop)
+
+    for _ in range(workers):
+        children[_spawn(app, sock, host, port, threads)] = time.monotonic()
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        started = children.pop(pid, None)
+        if started is None or stopping:
+            continue
+        crashes = 1 if time.monotonic() - started >= STABLE_AFTER else crashes + 1
+        if crashes >= MAX_CRASHES:
+            print(f'❌ воркер {pid} завершился (статус {status}) {crashes} раз подряд сразу после запуска, остановка')
+            _stop(None, None)
+            exit_code = 1
+            continue
+        delay = min(RESTART_DELAY_MAX, RESTART_DELAY * 2 ** (crashes - 1))
+        print(f'⚠️ воркер {pid} завершился (статус {status}), перезапуск через {delay:g} с')
+        time.sleep(delay)
+        if not stopping:
+            children[_spawn(app, sock, host, port, threads)] = time.monotonic()
+    sock.close()
+    return exit_code
+
+
+def main(argv=None):
+    default_workers = min(4, os.cpu_count() or 1) if hasattr(os, 'fork') else 1
+    parser = argparse.ArgumentParser(description='Сервер генератора отчётов дисциплины')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=default_workers, help='процессов-воркеров')
+    parser.add_argument('--threads', type=int, default=8, help='потоков обработки в воркере')
+    parser.add_argument('--db', help='файл базы (по умолчанию habits.db в текущей папке)')
+    parser.add_argument('--roadmaps', help='папка дорожных карт (по умолчанию roadmaps/ рядом с app2.py)')
+    parser.add_argument('--access-log', action='store_true', help='писать строку лога на каждый запрос')
+    args = parser.parse_args(argv)
+
+    from app2 import create_app
+
+    config = {}
+    if args.db:
+        config['DATABASE'] = args.db
+    if args.roadmaps:
+        config['ROADMAPS_DIR'] = os.path.abspath(args.roadmaps)
+    app = create_app(config)
+    RequestHandler.access_log = args.access_log
+    return serve(app, args.host, args.port, max(1, args.workers), max(1, args.threads))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,5 +1,7 @@
 """Пакет server: вспомогательные модули сервера."""
 
-from .db import init_db, recalc_all_streaks, update_streak
+from .connection import get_db, init_app as init_db_app
+from .db import init_db
+from .streaks import rebuild_all as rebuild_all_streaks, sync_day as sync_streaks_day
 
-__all__ = ["init_db", "recalc_all_streaks", "update_streak"]
+__all__ = ["get_db", "init_db", "init_db_app", "rebuild_all_streaks", "sync_streaks_day"]
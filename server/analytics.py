@@ -0,0 +1,247 @@
+"""Аналитика по истории на NumPy: ряды итогов дней и матрица выполнений.
+
+История загружается одним проходом в массивы:
+- `dates` — даты дней из discipline_days (datetime64[D], по возрастанию);
+- `totals` — дни × 8 характеристик (I,S,W,E,C,H,ST,$);
+- `done` — привычки × дни, bool: привычка успешно выполнена в этот день;
+- `attr_sums` — привычки × 8: суммы характеристик успешных выполнений.
+Выполнения за даты, которых нет в discipline_days, в матрицу не попадают.
+
+Набор массивов кешируется на процесс и перестраивается по меткам изменений
+'days' и 'habits' (server.versioning), так что запись в любом воркере
+делает кеш устаревшим во всех. Скользящие средние, EWMA, накопительные
+кривые, перцентили, профили по дням недели и разбивка по категориям
+считаются векторными операциями над срезом по датам.
+"""
+
+import math
+import threading
+
+try:
+    import numpy as np
+except ImportError:  # аналитика недоступна, остальное приложение работает
+    np = None
+
+from . import versioning
+from .combinations import ATTR_COLUMNS, ATTR_KEYS
+
+PERCENTILES = (10, 25, 50, 75, 90)
+WEEKDAYS = ('Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс')
+
+
+def available():
+    return np is not None
+
+
+class History:
+    """Массивы истории одной БД."""
+
+    def __init__(self, dates, totals, habit_ids, names, categories, done, attr_sums):
+        self.dates = dates
+        self.totals = totals
+        self.habit_ids = habit_ids
+        self.names = names
+        self.categories = categories
+        self.done = done
+        self.attr_sums = attr_sums
+
+    @classmethod
+    def load(cls, conn):
+        cursor = conn.cursor()
+        cursor.execute('SELECT date, ' + ', '.join('total_' + c for c in ATTR_COLUMNS) +
+                       ' FROM discipline_days ORDER BY date')
+        rows = cursor.fetchall()
+        dates = np.array([row[0] for row in rows], dtype='datetime64[D]')
+        totals = np.array([row[1:] for row in rows], dtype=float).reshape(len(rows), len(ATTR_COLUMNS))
+        np.nan_to_num(totals, copy=False)
+
+        cursor.execute('SELECT id, name, category FROM habits ORDER BY id')
+        habits = cursor.fetchall()
+        habit_ids = np.array([h[0] for h in habits], dtype=np.int64)
+        names = [h[1] for h in habits]
+        categories = [h[2] for h in habits]
+
+        cursor.execute('SELECT habit_id, date, ' + ', '.join(ATTR_COLUMNS) +
+                       ' FROM completed_habits WHERE success = 1')
+        comp = cursor.fetchall()
+        done = np.zeros((len(habits), len(dates)), dtype=bool)
+        attr_sums = np.zeros((len(habits), len(ATTR_COLUMNS)))
+        if comp and len(habits):
+            ids = np.array([c[0] for c in comp], dtype=np.int64)
+            comp_dates = np.array([c[1] for c in comp], dtype='datetime64[D]')
+            attrs = np.nan_to_num(np.array([c[2:] for c in comp], dtype=float))
+            h_idx = np.searchsorted(habit_ids, ids)
+            known = (h_idx < len(habit_ids)) & (habit_ids[np.minimum(h_idx, len(habit_ids) - 1)] == ids)
+            np.add.at(attr_sums, h_idx[known], attrs[known])
+            if len(dates):
+                d_idx = np.searchsorted(dates, comp_dates)
+                on_day = known & (d_idx < len(dates)) & (dates[np.minimum(d_idx, len(dates) - 1)] == comp_dates)
+                done[h_idx[on_day], d_idx[on_day]] = True
+        return cls(dates, totals, habit_ids, names, categories, done, attr_sums)
+
+    def span(self, start=None, end=None):
+        """Срез индексов дней [lo, hi) по датам start..end включительно."""
+        lo = int(np.searchsorted(self.dates, np.datetime64(start, 'D'))) if start else 0
+        hi = int(np.searchsorted(self.dates, np.datetime64(end, 'D'), side='right')) if end else len(self.dates)
+        return slice(lo, max(lo, hi))
+
+
+_cache = {}
+_lock = threading.Lock()
+
+
+def get_history(conn):
+    """Массивы истории для файла БД соединения (перестраиваются после записей)."""
+    key = conn.execute('PRAGMA database_list').fetchone()[2]
+    version = (versioning.stamp('days'), versioning.stamp('habits'))
+    cached = _cache.get(key)
+    if cached is None or cached[0] != version:
+        with _lock:
+            cached = _cache.get(key)
+            if cached is None or cached[0] != version:
+                cached = _cache[key] = (version, History.load(conn))
+    return cached[1]
+
+
+# ---- вычисления ----
+
+def _series(matrix):
+    """Матрица дни × 8 -> {'I': [...], ...} (округлено для JSON)."""
+    matrix = np.round(matrix, 4)
+    return {key: matrix[:, i].tolist() for i, key in enumerate(ATTR_KEYS)}
+
+
+def _dates(hist, sl):
+    return np.datetime_as_string(hist.dates[sl]).tolist()
+
+
+def rolling_mean(values, window):
+    """Скользящее среднее по `window` последним дням (в начале ряда — по имеющимся)."""
+    csum = np.cumsum(values, axis=0)
+    out = csum.copy()
+    out[window:] = csum[window:] - csum[:-window]
+    counts = np.minimum(np.arange(1, len(values) + 1), window)
+    return out / counts[:, None]
+
+
+def ewma(values, alpha):
+    """Экспоненциальное сглаживание y_t = a·x_t + (1−a)·y_{t−1}, y_0 = x_0, поколонно.
+
+    Внутри блока рекурсия разворачивается в cumsum со степенями (1−a)^−k;
+    длина блока ограничена так, чтобы степени не переполняли float64.
+    """
+    out = np.empty_like(values)
+    if not len(values):
+        return out
+    decay = 1.0 - alpha
+    if decay <= 0.0:
+        out[:] = values
+        return out
+    block = max(1, min(512, int(300.0 / -math.log(decay)))) if decay < 1.0 else len(values)
+    state = values[0]
+    for start in range(0, len(values), block):
+        chunk = values[start:start + block]
+        k = np.arange(len(chunk))[:, None]
+        grow = decay ** -k
+        acc = alpha * np.cumsum(chunk * grow, axis=0) / grow
+        out[start:start + len(chunk)] = decay ** (k + 1) * state + acc
+        state = out[start + len(chunk) - 1]
+    return out
+
+
+def summary(hist, sl, **_):
+    values = hist.totals[sl]
+    result = {'days_count': int(len(values))}
+    if not len(values):
+        return result
+    result['from'], result['to'] = str(hist.dates[sl][0]), str(hist.dates[sl][-1])
+    result['sum'] = dict(zip(ATTR_KEYS, np.round(values.sum(axis=0), 4).tolist()))
+    result['mean'] = dict(zip(ATTR_KEYS, np.round(values.mean(axis=0), 4).tolist()))
+    result['std'] = dict(zip(ATTR_KEYS, np.round(values.std(axis=0), 4).tolist()))
+    pct = np.round(np.percentile(values, PERCENTILES, axis=0), 4)
+    result['percentiles'] = {f'p{p}': dict(zip(ATTR_KEYS, row.tolist())) for p, row in zip(PERCENTILES, pct)}
+    done = hist.done[:, sl]
+    # доля (привычка, день), в которых привычка выполнена
+    result['completion_rate'] = round(float(done.mean()), 4) if done.size else 0.0
+    return result
+
+
+def rolling(hist, sl, window=7, **_):
+    # считаем по всему ряду, чтобы окно в начале периода захватывало дни до него
+    return {'window': window, 'dates': _dates(hist, sl),
+            'series': _series(rolling_mean(hist.totals[:sl.stop], window)[sl])}
+
+
+def ewm(hist, sl, span=14, **_):
+    alpha = 2.0 / (span + 1.0)
+    return {'span': span, 'alpha': round(alpha, 6), 'dates': _dates(hist, sl),
+            'series': _series(ewma(hist.totals[:sl.stop], alpha)[sl])}
+
+
+def cumulative(hist, sl, **_):
+    return {'dates': _dates(hist, sl), 'series': _series(np.cumsum(hist.totals[sl], axis=0))}
+
+
+def weekday(hist, sl, **_):
+    dates = hist.dates[sl]
+    # 1970-01-01 — четверг: (дни + 3) % 7 даёт 0 = понедельник
+    wd = (dates.astype(np.int64) + 3) % 7
+    counts = np.bincount(wd, minlength=7)
+    sums = np.zeros((7, len(ATTR_KEYS)))
+    np.add.at(sums, wd, hist.totals[sl])
+    means = sums / np.maximum(counts, 1)[:, None]
+    done_per_day = hist.done[:, sl].sum(axis=0)
+    completions = np.bincount(wd, weights=done_per_day, minlength=7)
+    return {'weekdays': [
+        {'weekday': i, 'name': WEEKDAYS[i], 'days_count': int(counts[i]),
+         'mean': dict(zip(ATTR_KEYS, np.round(means[i], 4).tolist())),
+         'completions_per_day': round(float(completions[i] / counts[i]), 4) if counts[i] else 0.0}
+        for i in range(7)]}
+
+
+def categories(hist, sl, **_):
+    if not hist.categories:
+        return {'categories': []}
+    names, cat_idx = np.unique(np.array(hist.categories, dtype=object).astype(str), return_inverse=True)
+    done = hist.done[:, sl]
+    per_habit = done.sum(axis=1)
+    active = per_habit > 0
+    habits = np.bincount(cat_idx, minlength=len(names))
+    active_habits = np.bincount(cat_idx, weights=active, minlength=len(names))
+    completions = np.bincount(cat_idx, weights=per_habit, minlength=len(names))
+    days = max(1, done.shape[1])
+    # суммы характеристик — за весь период (по строкам выполнений, без среза дат)
+    attr = np.zeros((len(names), len(ATTR_KEYS)))
+    np.add.at(attr, cat_idx, hist.attr_sums)
+    order = np.argsort(-completions, kind='stable')
+    return {'categories': [
+        {'category': str(names[i]), 'habits': int(habits[i]), 'active_habits': int(active_habits[i]),
+         'completions': int(completions[i]),
+         'completion_rate': round(float(completions[i] / (habits[i] * days)), 4),
+         'attributes_all_time': dict(zip(ATTR_KEYS, np.round(attr[i], 4).tolist()))}
+        for i in order]}
+
+
+def habits(hist, sl, window=30, **_):
+    done = hist.done[:, sl]
+    days = done.shape[1]
+    totals = done.sum(axis=1)
+    recent = done[:, max(0, days - window):].mean(axis=1) if days else np.zeros(len(totals))
+    order = np.argsort(-totals, kind='stable')
+    return {'days_count': days, 'window': window, 'habits': [
+        {'habit_id': int(hist.habit_ids[i]), 'name': hist.names[i], 'category': hist.categories[i],
+         'completions': int(totals[i]),
+         'completion_rate': round(float(totals[i] / days), 4) if days else 0.0,
+         'recent_rate': round(float(recent[i]), 4)}
+        for i in order if totals[i]]}
+
+
+VIEWS = {
+    'summary': summary,
+    'rolling': rolling,
+    'ewma': ewm,
+    'cumulative': cumulative,
+    'weekday': weekday,
+    'categories': categories,
+    'habits': habits,
+}
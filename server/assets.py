@@ -0,0 +1,193 @@
+"""Кеш страниц и статических файлов: готовые байты, gzip-вариант и ETag.
+
+Страницы (report_generator.html, planner.html, ...) собираются один раз:
+шаблон проходит через Jinja приложения, ссылки на /static получают
+параметр ?v=<хеш содержимого файла>, результат хранится байтами вместе с
+заранее сжатым gzip-вариантом и ETag по хешу содержимого. Запрос страницы
+— выбор варианта по Accept-Encoding и проверка If-None-Match.
+
+Файлы /static отдаются из того же кеша; запрос с актуальным ?v=<хеш>
+получает Cache-Control на год (immutable), без него — no-cache с ETag.
+
+В режиме отладки (app.debug) или при app.config['ASSETS_RELOAD'] запись
+кеша проверяется по mtime/размеру исходных файлов на каждом запросе и
+пересобирается при изменении.
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+
+from werkzeug.security import safe_join
+
+# ссылки на статику в страницах: href="static/x.css", src="/static/x.js"
+_STATIC_REF = re.compile(r'''((?:href|src)=["'])/?static/([^"'?#]+)(["'])''')
+_COMPRESSIBLE = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+MIN_GZIP_SIZE = 512
+STATIC_MAX_AGE = 365 * 24 * 3600
+
+
+def _stat(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _mimetype(path):
+    mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    if mimetype.startswith('text/') or mimetype in ('application/javascript', 'application/json'):
+        return mimetype + '; charset=utf-8'
+    return mimetype
+
+
+class Asset:
+    """Готовый ответ: байты, gzip-вариант (или None), ETag и исходные файлы."""
+
+    __slots__ = ('body', 'gzipped', 'etag', 'mimetype', 'sources')
+
+    def __init__(self, body, mimetype, sources):
+        self.body = body
+        self.mimetype = mimetype
+        self.sources = sources          # {путь: (mtime_ns, size)}
+        self.etag = hashlib.sha1(body).hexdigest()[:20]
+        self.gzipped = None
+        if len(body) >= MIN_GZIP_SIZE and mimetype.startswith(_COMPRESSIBLE):
+            packed = gzip.compress(body, compresslevel=9, mtime=0)
+            if len(packed) < len(body):
+                self.gzipped = packed
+
+    def fresh(self):
+        return all(_stat(path) == stamp for path, stamp in self.sources.items())
+
+
+class AssetCache:
+    """Страницы и статические файлы приложения, собранные в байты."""
+
+    def __init__(self, app, static_dir):
+        self.app = app
+        self.static_dir = static_dir
+        self._pages = {}                # имя -> путь к шаблону
+        self._cache = {}                # ключ -> Asset
+        self._lock = threading.RLock()      # сборка страницы собирает и её статику
+
+    @property
+    def reload(self):
+        return self.app.debug or self.app.config.get('ASSETS_RELOAD', False)
+
+    def add_page(self, name, path):
+        """Зарегистрировать страницу и сразу собрать её (если файл есть)."""
+        self._pages[name] = path
+        self._cache.pop(('page', name), None)
+        return self.page(name)
+
+    def page(self, name):
+        """Собранная страница или None, если её файла нет."""
+        return self._get(('page', name), lambda: self._build_page(self._pages[name]))
+
+    def static(self, filename):
+        """Статический файл или None, если его нет."""
+        path = safe_join(self.static_dir, filename)
+        if path is None or not os.path.isfile(path):
+            return None
+        return self._get(('static', path), lambda: self._build_static(path))
+
+    def static_url(self, filename):
+        asset = self.static(filename)
+        if asset is None:
+            return f'/static/{filename}'
+        return f'/static/{filename}?v={asset.etag}'
+
+    def _get(self, key, build):
+        asset = self._cache.get(key)
+        if asset is not None and (not self.reload or asset.fresh()):
+            return asset
+        with self._lock:
+            asset = self._cache.get(key)
+            if asset is None or not asset.fresh():
+                asset = build()
+                if asset is None:
+                    self._cache.pop(key, None)
+                else:
+                    self._cache[key] = asset
+        return asset
+
+    def _build_static(self, path):
+        stamp = _stat(path)
+        if stamp is None:
+            return None
+        with open(path, 'rb') as f:
+            body = f.read()
+        return Asset(body, _mimetype(path), {path: stamp})
+
+    def _build_page(self, path):
+        stamp = _stat(path)
+        if stamp is None:
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            text = f.read()
+        sources = {path: stamp}
+
+        def versioned(match):
+            filename = match.group(2)
+            asset = self.static(filename)
+            if asset is None:
+                return match.group(0)
+            sources.update(asset.sources)
+            return f'{match.group(1)}/static/{filename}?v={asset.etag}{match.group(3)}'
+
+        # шаблоны без переменных запроса: рендерим один раз тем же Jinja, что и render_template_string
+        with self.app.app_context():
+            html = self.app.jinja_env.from_string(text).render()
+        html = _STATIC_REF.sub(versioned, html)
+        return Asset(html.encode('utf-8'), 'text/html; charset=utf-8', sources)
+
+
+def respond(asset, cache_control='no-cache'):
+    """Ответ Flask из собранного ресурса с учётом Accept-Encoding и If-None-Match."""
+    from flask import Response, request
+
+    use_gzip = asset.gzipped is not None and request.accept_encodings['gzip'] > 0
+    etag = asset.etag + ('-gz' if use_gzip else '')
+
+    if etag in request.if_none_match or asset.etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = Response(asset.gzipped if use_gzip else asset.body, content_type=asset.mimetype)
+        if use_gzip:
+            response.headers['Content-Encoding'] = 'gzip'
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    if asset.gzipped is not None:
+        response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+
+def init_app(app, static_dir):
+    """Подключить кеш к приложению: маршрут /static и функция static_url в шаблонах.
+
+    Приложение должно быть создано с static_folder=None.
+    """
+    app.config.setdefault('ASSETS_RELOAD', False)
+    cache = AssetCache(app, static_dir)
+    app.extensions['assets'] = cache
+    app.jinja_env.globals['static_url'] = cache.static_url
+
+    @app.route('/static/<path:filename>')
+    def static(filename):
+        from flask import abort, request
+
+        asset = cache.static(filename)
+        if asset is None:
+            abort(404)
+        if request.args.get('v') == asset.etag:
+            cache_control = f'public, max-age={STATIC_MAX_AGE}, immutable'
+        else:
+            cache_control = 'no-cache'
+        return respond(asset, cache_control)
+
+    return cache
@@ -0,0 +1,156 @@
+"""Движок бонусов за сочетания привычек.
+
+Парные сочетания живут в таблице `combinations` (habit_a, habit_b), сочетания
+из трёх и более привычек — в `combo_groups` / `combo_group_members`.
+Движок строится один раз на процесс и держит индекс habit_id -> сочетания с
+заранее посчитанными векторами бонусов (I,S,W,E,C,H,ST,$). Каждое сочетание
+привязано к своему наименьшему habit_id, поэтому бонус дня стоит
+O(выполненные привычки × степень) и ни одно сочетание не считается дважды.
+
+Кеш сбрасывается через `invalidate()` при создании сочетаний и деактивации
+привычек, а в других процессах — по меткам изменений 'combinations' и
+'habits' (server.versioning). Сочетания с неактивными привычками бонусов не дают.
+"""
+
+import threading
+from collections import defaultdict
+
+from . import versioning
+
+ATTR_KEYS = ('I', 'S', 'W', 'E', 'C', 'H', 'ST', '$')
+ATTR_COLUMNS = ('i', 's', 'w', 'e', 'c', 'h', 'st', 'money')
+
+
+def create_tables(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS combo_groups (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            i REAL DEFAULT 0.0,
+            s REAL DEFAULT 0.0,
+            w REAL DEFAULT 0.0,
+            e REAL DEFAULT 0.0,
+            c REAL DEFAULT 0.0,
+            h REAL DEFAULT 0.0,
+            st REAL DEFAULT 0.0,
+            money REAL DEFAULT 0.0,
+            is_active BOOLEAN DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS combo_group_members (
+            group_id INTEGER NOT NULL,
+            habit_id INTEGER NOT NULL,
+            PRIMARY KEY (group_id, habit_id),
+            FOREIGN KEY (group_id) REFERENCES combo_groups (id) ON DELETE CASCADE,
+            FOREIGN KEY (habit_id) REFERENCES habits (id) ON DELETE CASCADE
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_combo_group_members_habit ON combo_group_members(habit_id)')
+
+
+class CombinationEngine:
+    """Индекс сочетаний: habit_id -> (партнёры, вектор бонуса)."""
+
+    def __init__(self, pairs, groups):
+        # pairs: [(habit_a, habit_b, vector)], groups: [(members, vector)]
+        self._pairs = defaultdict(list)    # min(habit) -> [(partner, vector)]
+        self._groups = defaultdict(list)   # min(habit) -> [(other_members, vector)]
+        for a, b, vector in pairs:
+            lo, hi = min(a, b), max(a, b)
+            self._pairs[lo].append((hi, vector))
+        for members, vector in groups:
+            members = sorted(set(members))
+            if len(members) < 2:
+                continue
+            self._groups[members[0]].append((tuple(members[1:]), vector))
+
+    @classmethod
+    def load(cls, conn):
+        cursor = conn.cursor()
+        cols = ', '.join('c.' + col for col in ATTR_COLUMNS)
+        cursor.execute(f'''
+            SELECT c.habit_a, c.habit_b, {cols}
+            FROM combinations c
+            JOIN habits ha ON ha.id = c.habit_a AND ha.is_active = 1
+            JOIN habits hb ON hb.id = c.habit_b AND hb.is_active = 1
+            WHERE c.is_active = 1
+        ''')
+        pairs = [(row[0], row[1], tuple(float(v or 0.0) for v in row[2:])) for row in cursor.fetchall()]
+
+        cols = ', '.join('g.' + col for col in ATTR_COLUMNS)
+        cursor.execute(f'''
+            SELECT g.id, {cols}, group_concat(m.habit_id)
+            FROM combo_groups g
+            JOIN combo_group_members m ON m.group_id = g.id
+            JOIN habits h ON h.id = m.habit_id
+            WHERE g.is_active = 1
+            GROUP BY g.id
+            HAVING MIN(h.is_active) = 1
+        ''')
+        groups = []
+        for row in cursor.fetchall():
+            members = [int(x) for x in row[-1].split(',')]
+            groups.append((members, tuple(float(v or 0.0) for v in row[1:-1])))
+        return cls(pairs, groups)
+
+    def vector(self, done_ids):
+        """Суммарный вектор бонусов (кортеж из 8 чисел) для набора выполненных привычек."""
+        done = done_ids if isinstance(done_ids, (set, frozenset)) else set(done_ids)
+        total = [0.0] * len(ATTR_KEYS)
+        for habit_id in done:
+            for partner, vector in self._pairs.get(habit_id, ()):
+                if partner in done:
+                    for i, v in enumerate(vector):
+                        total[i] += v
+            for others, vector in self._groups.get(habit_id, ()):
+                if all(m in done for m in others):
+                    for i, v in enumerate(vector):
+                        total[i] += v
+        return tuple(total)
+
+    def bonus(self, done_ids):
+        """Бонус дня в виде словаря {'I': ..., ..., '$': ...}."""
+        return dict(zip(ATTR_KEYS, self.vector(done_ids)))
+
+    def rescore(self, conn, start_date, end_date):
+        """Бонусы за диапазон дней одним запросом: {date: {'I': ..., ...}}."""
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT date, habit_id FROM completed_habits
+            WHERE date BETWEEN ? AND ? AND success = 1
+            ORDER BY date
+        ''', (start_date, end_date))
+        done_by_day = defaultdict(set)
+        for day, habit_id in cursor.fetchall():
+            done_by_day[day].add(habit_id)
+        return {day: self.bonus(done) for day, done in done_by_day.items()}
+
+
+_cache = {}
+_lock = threading.Lock()
+
+
+def _version():
+    # метки меняет любой процесс-воркер, поэтому устаревший движок виден и в остальных
+    return versioning.stamp('combinations'), versioning.stamp('habits')
+
+
+def get_engine(conn):
+    """Движок для файла БД соединения (строится при первом обращении и после изменений)."""
+    key = conn.execute('PRAGMA database_list').fetchone()[2]
+    version = _version()
+    cached = _cache.get(key)
+    if cached is None or cached[0] != version:
+        with _lock:
+            cached = _cache.get(key)
+            if cached is None or cached[0] != version:
+                cached = _cache[key] = (version, CombinationEngine.load(conn))
+    return cached[1]
+
+
+def invalidate():
+    """Сбросить кеш движков (после изменения сочетаний или привычек)."""
+    with _lock:
+        _cache.clear()
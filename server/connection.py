@@ -0,0 +1,124 @@
+"""Общий слой подключения к SQLite.
+
+Одно соединение на рабочий поток (и на файл БД), переиспользуется между
+запросами. Внутри Flask соединение выдаётся через контекст приложения
+(`get_db`), вне его — через `connect`; `open_connection` — отдельное
+соединение вне кеша потока (для чтения, которое переживает запрос). При открытии включаются WAL,
+synchronous=NORMAL, foreign_keys и настраиваемые cache_size / mmap_size.
+Соединения учитываются в метриках запроса (server.metrics).
+"""
+
+import sqlite3
+import threading
+
+from . import metrics
+
+DEFAULT_DB_PATH = 'habits.db'
+
+# Значения по умолчанию; переопределяются через configure() или app.config
+_settings = {
+    'path': DEFAULT_DB_PATH,
+    'cache_size_kb': 16384,          # PRAGMA cache_size = -N (в КиБ)
+    'mmap_size': 64 * 1024 * 1024,   # PRAGMA mmap_size (в байтах)
+    'busy_timeout_ms': 5000,
+}
+
+_local = threading.local()
+
+
+def configure(db_path=None, cache_size_kb=None, mmap_size=None, busy_timeout_ms=None):
+    """Изменить параметры подключения (действуют для новых соединений)."""
+    if db_path is not None:
+        _settings['path'] = db_path
+    if cache_size_kb is not None:
+        _settings['cache_size_kb'] = int(cache_size_kb)
+    if mmap_size is not None:
+        _settings['mmap_size'] = int(mmap_size)
+    if busy_timeout_ms is not None:
+        _settings['busy_timeout_ms'] = int(busy_timeout_ms)
+
+
+def db_path():
+    """Путь к файлу БД по умолчанию."""
+    return _settings['path']
+
+
+def _apply_pragmas(conn):
+    cursor = conn.cursor()
+    cursor.execute('PRAGMA journal_mode = WAL')
+    cursor.execute('PRAGMA synchronous = NORMAL')
+    cursor.execute('PRAGMA foreign_keys = ON')
+    cursor.execute('PRAGMA temp_store = MEMORY')
+    cursor.execute(f"PRAGMA cache_size = -{int(_settings['cache_size_kb'])}")
+    cursor.execute(f"PRAGMA mmap_size = {int(_settings['mmap_size'])}")
+    cursor.execute(f"PRAGMA busy_timeout = {int(_settings['busy_timeout_ms'])}")
+    cursor.close()
+
+
+def open_connection(path=None):
+    """Новое соединение с файлом `path` с теми же прагмами; закрывает вызывающий."""
+    conn = sqlite3.connect(path or _settings['path'], timeout=_settings['busy_timeout_ms'] / 1000.0,
+                           factory=metrics.InstrumentedConnection)
+    _apply_pragmas(conn)
+    conn.set_trace_callback(metrics.trace_statement)
+    return conn
+
+
+def connect(path=None):
+    """Соединение текущего потока с файлом `path` (создаётся при первом вызове)."""
+    path = path or _settings['path']
+    conns = getattr(_local, 'conns', None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(path)
+    if conn is None:
+        conn = conns[path] = open_connection(path)
+    return conn
+
+
+def get_db():
+    """Соединение для текущего запроса Flask (или потока, если контекста нет)."""
+    try:
+        from flask import g, has_app_context
+    except ImportError:
+        return connect()
+    if not has_app_context():
+        return connect()
+    conn = g.get('_db_conn')
+    if conn is None:
+        conn = g._db_conn = connect()
+    return conn
+
+
+def release(conn):
+    """Вернуть соединение: незавершённая транзакция откатывается, само соединение остаётся открытым."""
+    if conn is not None and conn.in_transaction:
+        conn.rollback()
+
+
+def close_thread_connections():
+    """Закрыть все соединения текущего потока (например, при остановке воркера)."""
+    conns = getattr(_local, 'conns', None) or {}
+    for conn in conns.values():
+        try:
+            conn.close()
+        except Exception:
+            pass
+    conns.clear()
+
+
+def init_app(app):
+    """Подключить слой к приложению Flask: настройки из app.config и teardown."""
+    app.config.setdefault('DATABASE', _settings['path'])
+    app.config.setdefault('SQLITE_CACHE_SIZE_KB', _settings['cache_size_kb'])
+    app.config.setdefault('SQLITE_MMAP_SIZE', _settings['mmap_size'])
+    configure(
+        db_path=app.config['DATABASE'],
+        cache_size_kb=app.config['SQLITE_CACHE_SIZE_KB'],
+        mmap_size=app.config['SQLITE_MMAP_SIZE'],
+    )
+
+    @app.teardown_appcontext
+    def _release_db(exc):
+        from flask import g
+        release(g.pop('_db_conn', None))
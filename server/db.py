@@ -1,11 +1,11 @@
-import os
-import sqlite3
-from datetime import datetime
+from . import combinations, habit_search, planner_tasks, rollups
+from .connection import connect
+from .streaks import rebuild_all as rebuild_all_streaks
 
 
-def init_db(db_path: str = 'habits.db'):
+def init_db(db_path: str = None):
     """Инициализация базы данных при первом запуске."""
-    conn = sqlite3.connect(db_path)
+    conn = connect(db_path)
     cursor = conn.cursor()
 
     cursor.execute('''
@@ -107,6 +107,8 @@ def init_db(db_path: str = 'habits.db'):
             current_streak INTEGER DEFAULT 0,
             longest_streak INTEGER DEFAULT 0,
             last_date DATE,
+            success_days INTEGER DEFAULT 0,
+            first_date DATE,
             FOREIGN KEY (habit_id) REFERENCES habits (id)
         )
     ''')
@@ -133,133 +135,68 @@ def init_db(db_path: str = 'habits.db'):
         )
     ''')
 
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS streak_runs (
+            habit_id INTEGER NOT NULL,
+            start_date DATE NOT NULL,
+            end_date DATE NOT NULL,
+            length INTEGER NOT NULL,
+            PRIMARY KEY (habit_id, start_date)
+        )
+    ''')
+
+    combinations.create_tables(cursor)
+    rollup_counts_added = rollups.create_tables(cursor)
+    habit_search.create_tables(cursor)
+    planner_tasks.create_tables(cursor)
+
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_combinations_habits ON combinations(habit_a, habit_b)')
     cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_streaks_habit ON streaks(habit_id)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_completed_date ON completed_habits(date)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_completed_habit ON completed_habits(habit_id)')
+    # история привычки (/api/habits/<id>/history) читается только из этого индекса;
+    # одностолбцовый idx_completed_habit он заменяет полностью
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_completed_habit_history '
+                   'ON completed_habits(habit_id, date, success, quantity)')
+    cursor.execute('DROP INDEX IF EXISTS idx_completed_habit')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_habits_category ON habits(category)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_streak_runs_end ON streak_runs(habit_id, end_date)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_streak_runs_length ON streak_runs(habit_id, length)')
     # ensure old databases have the friction_index column as well
     cursor.execute("PRAGMA table_info(discipline_days)")
     cols = [row[1] for row in cursor.fetchall()]
     if 'friction_index' not in cols:
         cursor.execute('ALTER TABLE discipline_days ADD COLUMN friction_index INTEGER DEFAULT 1')
 
+    # число успешных дней и первая дата в строке стрика (для старых баз — пересчёт ниже)
+    cursor.execute("PRAGMA table_info(streaks)")
+    cols = [row[1] for row in cursor.fetchall()]
+    streak_columns_added = 'success_days' not in cols
+    if streak_columns_added:
+        cursor.execute('ALTER TABLE streaks ADD COLUMN success_days INTEGER DEFAULT 0')
+        cursor.execute('ALTER TABLE streaks ADD COLUMN first_date DATE')
+
+    # серии стриков для старых баз строим один раз по всей истории
+    cursor.execute('SELECT 1 FROM streak_runs LIMIT 1')
+    if not cursor.fetchone() or streak_columns_added:
+        cursor.execute('SELECT 1 FROM completed_habits WHERE success = 1 LIMIT 1')
+        if cursor.fetchone():
+            rebuild_all_streaks(conn)
+
+    # недельные/месячные итоги для старых баз (и для итогов без счётчиков cnt_*)
+    cursor.execute('SELECT 1 FROM period_rollups LIMIT 1')
+    if not cursor.fetchone() or rollup_counts_added:
+        rollups.rebuild(conn)
+
     conn.commit()
-    conn.close()
 
 
-def update_streak(habit_id, date_str, success, db_path: str = 'habits.db'):
-    """Обновление/создание стрика для привычки."""
+def friction_multiplier(value):
+    """Индекс трения 1..10 и множитель итогов дня (1 -> 1.0, 10 -> 2.0)."""
     try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-
-        cursor.execute('SELECT habit_id, current_streak, longest_streak, last_date FROM streaks WHERE habit_id = ?', (habit_id,))
-        streak = cursor.fetchone()
-
-        current_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-
-        if not streak:
-            if success:
-                cursor.execute('''
-                    INSERT OR REPLACE INTO streaks (habit_id, current_streak, longest_streak, last_date)
-                    VALUES (?, ?, ?, ?)
-                ''', (habit_id, 1, 1, date_str))
-            else:
-                cursor.execute('''
-                    INSERT OR REPLACE INTO streaks (habit_id, current_streak, longest_streak, last_date)
-                    VALUES (?, ?, ?, ?)
-                ''', (habit_id, 0, 0, None))
-        else:
-            last_date = None
-            try:
-                last_date = datetime.strptime(streak[3], '%Y-%m-%d').date() if streak[3] else None
-            except Exception:
-                last_date = None
-
-            current_streak = int(streak[1] or 0)
-            longest_streak = int(streak[2] or 0)
-
-            if success:
-                if last_date and (current_date - last_date).days == 1:
-                    current_streak = current_streak + 1
-                else:
-                    current_streak = 1
-
-                if current_streak > longest_streak:
-                    longest_streak = current_streak
-
-                cursor.execute('''
-                    UPDATE streaks SET 
-                        current_streak = ?,
-                        longest_streak = ?,
-                        last_date = ?
-                    WHERE habit_id = ?
-                ''', (current_streak, longest_streak, date_str, habit_id))
-            else:
-                cursor.execute('''
-                    UPDATE streaks SET
-                        current_streak = ? 
-                    WHERE habit_id = ?
-                ''', (0, habit_id))
-
-        conn.commit()
-        conn.close()
-    except Exception as e:
-        print(f"Error updating streak: {e}")
-
-
-def recalc_all_streaks(db_path: str = 'habits.db'):
-    """
-    Пересчитать стрики для всех активных привычек по истории completed_habits.
-    """
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
-    cursor.execute('SELECT id FROM habits WHERE is_active = 1')
-    habit_rows = cursor.fetchall()
-
-    for (habit_id,) in habit_rows:
-        cursor.execute('''
-            SELECT DISTINCT date FROM completed_habits
-            WHERE habit_id = ? AND success = 1
-            ORDER BY date
-        ''', (habit_id,))
-        date_rows = [row[0] for row in cursor.fetchall()]
-
-        if not date_rows:
-            cursor.execute('''
-                INSERT OR REPLACE INTO streaks (habit_id, current_streak, longest_streak, last_date)
-                VALUES (?, ?, ?, ?)
-            ''', (habit_id, 0, 0, None))
-            continue
-
-        parsed_dates = [datetime.strptime(d, '%Y-%m-%d').date() for d in date_rows]
-
-        longest = 1
-        current_run = 1
-        for i in range(1, len(parsed_dates)):
-            if (parsed_dates[i] - parsed_dates[i-1]).days == 1:
-                current_run += 1
-            else:
-                if current_run > longest:
-                    longest = current_run
-                current_run = 1
-        if current_run > longest:
-            longest = current_run
-
-        last_run_length = 1
-        for i in range(len(parsed_dates)-1, 0, -1):
-            if (parsed_dates[i] - parsed_dates[i-1]).days == 1:
-                last_run_length += 1
-            else:
-                break
-
-        last_date_str = parsed_dates[-1].isoformat()
-        cursor.execute('''
-            INSERT OR REPLACE INTO streaks (habit_id, current_streak, longest_streak, last_date)
-            VALUES (?, ?, ?, ?)
-        ''', (habit_id, last_run_length, longest, last_date_str))
-
-    conn.commit()
-    conn.close()
+        friction = int(value or 1)
+    except Exception:
+        friction = 1
+    # Ограничим 1..10
+    friction = max(1, min(10, friction))
+    # Линейная шкала: 1 -> 1.0, 10 -> 2.0 (нерфим мультипликатор)
+    return friction, 1.0 + (friction - 1) * (1.0 / 9.0)
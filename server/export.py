@@ -0,0 +1,121 @@
+"""Потоковая выгрузка истории: выполнения привычек и итоги дней.
+
+Строки читаются курсором SQLite порциями (fetchmany) и сразу кодируются
+в CSV, NDJSON или JSON-массив — ответ начинается до того, как прочитана
+вся выборка, а память сервера не зависит от длины периода.
+"""
+
+import csv
+import io
+import json
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+    'json': 'application/json; charset=utf-8',
+}
+CHUNK_ROWS = 500
+
+COMPLETION_COLUMNS = (
+    'ch.date', 'ch.day_number', 'ch.habit_id', 'h.name AS habit_name', 'h.category',
+    'ch.subtask_id', 'st.name AS subtask_name', 'ch.quantity', 'ch.success',
+    'ch.i', 'ch.s', 'ch.w', 'ch.e', 'ch.c', 'ch.h', 'ch.st', 'ch.money', 'ch.notes',
+)
+DAY_COLUMNS = (
+    'date', 'day_number', 'state', 'emotion_morning', 'thoughts',
+    'total_i', 'total_s', 'total_w', 'total_e', 'total_c', 'total_h', 'total_st', 'total_money',
+    'completed_count', 'total_count', 'friction_index',
+)
+
+
+def completions_query(date_from=None, date_to=None, habit_ids=None, categories=None):
+    """SQL и параметры выборки выполнений по периоду, привычкам и категориям."""
+    where, params = [], []
+    if date_from:
+        where.append('ch.date >= ?')
+        params.append(date_from)
+    if date_to:
+        where.append('ch.date <= ?')
+        params.append(date_to)
+    if habit_ids:
+        where.append(f"ch.habit_id IN ({','.join('?' * len(habit_ids))})")
+        params.extend(habit_ids)
+    if categories:
+        where.append(f"h.category IN ({','.join('?' * len(categories))})")
+        params.extend(categories)
+    sql = f'''
+        SELECT {', '.join(COMPLETION_COLUMNS)}
+        FROM completed_habits ch
+        JOIN habits h ON h.id = ch.habit_id
+        LEFT JOIN habit_subtasks st ON st.id = ch.subtask_id
+        {'WHERE ' + ' AND '.join(where) if where else ''}
+        ORDER BY ch.date, ch.habit_id, ch.id
+    '''
+    return sql, params
+
+
+def days_query(date_from=None, date_to=None):
+    """SQL и параметры выборки итогов дней за период."""
+    where, params = [], []
+    if date_from:
+        where.append('date >= ?')
+        params.append(date_from)
+    if date_to:
+        where.append('date <= ?')
+        params.append(date_to)
+    sql = f'''
+        SELECT {', '.join(DAY_COLUMNS)}
+        FROM discipline_days
+        {'WHERE ' + ' AND '.join(where) if where else ''}
+        ORDER BY date
+    '''
+    return sql, params
+
+
+def _chunks(conn, sql, params, size):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(sql, params)
+        names = [d[0] for d in cursor.description]
+        yield names
+        while True:
+            rows = cursor.fetchmany(size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        # закрытие курсора завершает чтение (и снимок WAL), даже если клиент оборвал загрузку
+        cursor.close()
+
+
+def stream(conn, sql, params, fmt, chunk_rows=CHUNK_ROWS):
+    """Генератор байтов выгрузки в формате `fmt` (csv, ndjson, json)."""
+    chunks = _chunks(conn, sql, params, chunk_rows)
+    try:
+        names = next(chunks)
+        if fmt == 'csv':
+            buf = io.StringIO()
+            writer = csv.writer(buf, lineterminator='\n')
+            # BOM — чтобы Excel открывал кириллицу без настройки кодировки
+            buf.write('﻿')
+            writer.writerow(names)
+            for rows in chunks:
+                writer.writerows(rows)
+                yield buf.getvalue().encode('utf-8')
+                buf.seek(0)
+                buf.truncate()
+            yield buf.getvalue().encode('utf-8')
+        elif fmt == 'ndjson':
+            for rows in chunks:
+                yield ''.join(json.dumps(dict(zip(names, row)), ensure_ascii=False) + '\n'
+                              for row in rows).encode('utf-8')
+        else:
+            first = True
+            yield b'['
+            for rows in chunks:
+                parts = [json.dumps(dict(zip(names, row)), ensure_ascii=False) for row in rows]
+                yield (('' if first else ',') + ','.join(parts)).encode('utf-8')
+                first = False
+            yield b']'
+    finally:
+        chunks.close()
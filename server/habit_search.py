@@ -0,0 +1,145 @@
+"""Полнотекстовый поиск по справочнику привычек (SQLite FTS5).
+
+Виртуальная таблица `habits_fts` (rowid = habits.id) хранит название,
+категорию, описание и названия подзадач привычки. Её поддерживают
+триггеры на `habits` и `habit_subtasks`, поэтому любая запись — из
+маршрутов, импорта или восстановления копии — сразу видна в поиске.
+
+Запрос пользователя разбивается на слова, каждое ищется как префикс
+(«бег» находит «бегать»), слова объединяются через AND. Результаты
+упорядочены по bm25 с весом названия выше описания; для подсветки
+возвращаются highlight по названию и snippet по всем столбцам — как
+экранированный HTML, где разметка только `<mark>`.
+
+Если SQLite собран без FTS5, таблица не создаётся, а `available`
+возвращает False — поиск тогда работает через LIKE.
+"""
+
+import html
+import re
+import sqlite3
+
+HIGHLIGHT = ('<mark>', '</mark>')
+# FTS5 обрамляет совпадения этими символами; на HIGHLIGHT они заменяются после экранирования
+MARKERS = ('\x02', '\x03')
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+# веса bm25 по столбцам: name, category, description, subtasks
+WEIGHTS = (10.0, 4.0, 1.0, 2.0)
+
+_WORD = re.compile(r'\w+')
+_SUBTASK_NAMES = "(SELECT group_concat(name, ' ') FROM habit_subtasks WHERE habit_id = {0})"
+
+_TRIGGERS = (
+    f'''CREATE TRIGGER IF NOT EXISTS habits_fts_ai AFTER INSERT ON habits BEGIN
+        INSERT INTO habits_fts (rowid, name, category, description, subtasks)
+        VALUES (NEW.id, NEW.name, NEW.category, NEW.description, {_SUBTASK_NAMES.format('NEW.id')});
+    END''',
+    f'''CREATE TRIGGER IF NOT EXISTS habits_fts_au AFTER UPDATE OF name, category, description ON habits BEGIN
+        DELETE FROM habits_fts WHERE rowid = OLD.id;
+        INSERT INTO habits_fts (rowid, name, category, description, subtasks)
+        VALUES (NEW.id, NEW.name, NEW.category, NEW.description, {_SUBTASK_NAMES.format('NEW.id')});
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS habits_fts_ad AFTER DELETE ON habits BEGIN
+        DELETE FROM habits_fts WHERE rowid = OLD.id;
+    END''',
+    f'''CREATE TRIGGER IF NOT EXISTS habit_subtasks_fts_ai AFTER INSERT ON habit_subtasks BEGIN
+        UPDATE habits_fts SET subtasks = {_SUBTASK_NAMES.format('NEW.habit_id')} WHERE rowid = NEW.habit_id;
+    END''',
+    f'''CREATE TRIGGER IF NOT EXISTS habit_subtasks_fts_au AFTER UPDATE OF name, habit_id ON habit_subtasks BEGIN
+        UPDATE habits_fts SET subtasks = {_SUBTASK_NAMES.format('OLD.habit_id')} WHERE rowid = OLD.habit_id;
+        UPDATE habits_fts SET subtasks = {_SUBTASK_NAMES.format('NEW.habit_id')} WHERE rowid = NEW.habit_id;
+    END''',
+    f'''CREATE TRIGGER IF NOT EXISTS habit_subtasks_fts_ad AFTER DELETE ON habit_subtasks BEGIN
+        UPDATE habits_fts SET subtasks = {_SUBTASK_NAMES.format('OLD.habit_id')} WHERE rowid = OLD.habit_id;
+    END''',
+)
+
+
+def create_tables(cursor):
+    """Создать habits_fts и триггеры; при первом создании — заполнить по справочнику.
+
+    Возвращает False, если FTS5 в этой сборке SQLite нет.
+    """
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'habits_fts'")
+    existed = cursor.fetchone() is not None
+    try:
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS habits_fts USING fts5(
+                name, category, description, subtasks,
+                tokenize = 'unicode61 remove_diacritics 2',
+                prefix = '2 3'
+            )
+        ''')
+    except sqlite3.OperationalError:
+        return False
+    for sql in _TRIGGERS:
+        cursor.execute(sql)
+    if not existed:
+        rebuild(cursor)
+    return True
+
+
+def rebuild(cursor):
+    """Перезаполнить habits_fts по habits и habit_subtasks."""
+    cursor.execute('DELETE FROM habits_fts')
+    cursor.execute(f'''
+        INSERT INTO habits_fts (rowid, name, category, description, subtasks)
+        SELECT id, name, category, description, {_SUBTASK_NAMES.format('habits.id')} FROM habits
+    ''')
+
+
+def available(conn):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'habits_fts'").fetchone() is not None
+
+
+def match_query(text):
+    """Строка поиска -> выражение MATCH ('"бег"* "утро"*') или None, если слов нет."""
+    words = _WORD.findall(text or '')
+    if not words:
+        return None
+    return ' '.join('"{}"*'.format(word.replace('"', '""')) for word in words)
+
+
+def mark_up(text):
+    """Результат highlight()/snippet() с MARKERS -> экранированный HTML с <mark>."""
+    if text is None:
+        return None
+    return html.escape(text).replace(MARKERS[0], HIGHLIGHT[0]).replace(MARKERS[1], HIGHLIGHT[1])
+
+
+def search(conn, text, limit=DEFAULT_LIMIT, category=None):
+    """Активные привычки по запросу, лучшие сначала.
+
+    Каждая — dict со столбцами habits и полями highlight (название с
+    разметкой совпадений), snippet (фрагмент поля с совпадением) и rank;
+    highlight и snippet — экранированный HTML.
+    """
+    query = match_query(text)
+    if query is None:
+        return []
+    params = [query]
+    where = ''
+    if category:
+        where = 'AND h.category = ?'
+        params.append(category)
+    cursor = conn.cursor()
+    cursor.row_factory = sqlite3.Row
+    cursor.execute(f'''
+        SELECT h.*,
+               highlight(habits_fts, 0, ?, ?) AS highlight,
+               snippet(habits_fts, -1, ?, ?, '…', 10) AS snippet,
+               bm25(habits_fts, {', '.join(map(str, WEIGHTS))}) AS rank
+        FROM habits_fts
+        JOIN habits h ON h.id = habits_fts.rowid
+        WHERE habits_fts MATCH ? AND h.is_active = 1 {where}
+        ORDER BY rank
+        LIMIT ?
+    ''', list(MARKERS) * 2 + params + [limit])
+    results = []
+    for row in cursor.fetchall():
+        item = dict(row)
+        item['highlight'] = mark_up(item['highlight'])
+        item['snippet'] = mark_up(item['snippet'])
+        results.append(item)
+    return results
@@ -0,0 +1,75 @@
+"""История выполнений одной привычки: постранично и по неделям/месяцам.
+
+Оба запроса читают только индекс idx_completed_habit_history
+(habit_id, date, success, quantity; id — rowid, есть в любом индексе),
+без обращения к строкам таблицы. Страницы — keyset по паре (date, id):
+курсор `'<date>:<id>'` последней строки, следующая страница начинается
+строго после него, так что стоимость не зависит от глубины листания.
+"""
+
+from .rollups import PERIOD_KEY_SQL
+
+GROUPS = tuple(PERIOD_KEY_SQL)
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+
+def parse_cursor(value):
+    """'YYYY-MM-DD:id' -> (date, id); ValueError при неверном формате."""
+    day, _, row_id = value.rpartition(':')
+    if not day:
+        raise ValueError('cursor must look like YYYY-MM-DD:id')
+    return day, int(row_id)
+
+
+def _range(habit_id, date_from, date_to):
+    where, params = ['habit_id = ?'], [habit_id]
+    if date_from:
+        where.append('date >= ?')
+        params.append(date_from)
+    if date_to:
+        where.append('date <= ?')
+        params.append(date_to)
+    return where, params
+
+
+def page(conn, habit_id, date_from=None, date_to=None, after=None, limit=DEFAULT_LIMIT, descending=False):
+    """Страница выполнений и курсор следующей (None — страниц больше нет).
+
+    Порядок — по (date, id), по возрастанию или по убыванию (`descending`);
+    `after` — курсор (date, id), после которого начинается страница.
+    """
+    where, params = _range(habit_id, date_from, date_to)
+    if after is not None:
+        where.append('(date, id) < (?, ?)' if descending else '(date, id) > (?, ?)')
+        params.extend(after)
+    order = 'DESC' if descending else 'ASC'
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT id, date, success, quantity FROM completed_habits
+        WHERE {' AND '.join(where)}
+        ORDER BY date {order}, id {order}
+        LIMIT ?
+    ''', params + [limit + 1])
+    rows = cursor.fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = f'{rows[-1][1]}:{rows[-1][0]}'
+    items = [{'id': r[0], 'date': r[1], 'success': bool(r[2]), 'quantity': r[3]} for r in rows]
+    return items, next_cursor
+
+
+def grouped(conn, habit_id, group, date_from=None, date_to=None):
+    """Итоги по периодам `group` ('week' — ключ понедельник, 'month' — 'YYYY-MM')."""
+    where, params = _range(habit_id, date_from, date_to)
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT {PERIOD_KEY_SQL[group]} AS period, COUNT(DISTINCT date), COUNT(*),
+               COALESCE(SUM(success), 0), COALESCE(SUM(quantity), 0.0)
+        FROM completed_habits
+        WHERE {' AND '.join(where)}
+        GROUP BY period ORDER BY period
+    ''', params)
+    return [{'period': r[0], 'days': r[1], 'completions': r[2], 'successes': r[3], 'quantity': r[4]}
+            for r in cursor.fetchall()]
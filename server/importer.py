@@ -0,0 +1,458 @@
+"""Массовый импорт истории: CSV, NDJSON или чужой файл habits.db.
+
+    python -m server.importer FILE [--format csv|ndjson|sqlite] [--db habits.db] [--batch 5000]
+
+Принимаются те же строки, что отдаёт выгрузка (server.export): строки
+выполнений (date, habit_name, category, subtask_name, quantity, success,
+i..money, notes, day_number, ...) и строки дней (date, day_number, state,
+..., total_i..total_money, completed_count, total_count, friction_index).
+В NDJSON строкой может быть и день целиком в формате POST /api/completions
+(date, ..., friction_index, habits: [...]).
+
+Привычки сопоставляются по (название, категория) через словарь в памяти,
+недостающие создаются пачкой. Строки выполнений пишутся пачками executemany
+— каждая пачка отдельной единицей работы писателя (server.writer), так что
+обычные записи между ними не ждут весь импорт. Дни из импорта заменяют
+существующие. Итоги дней, у которых их нет в источнике, считаются в конце
+по накопленным суммам (бонусы сочетаний + множитель трения), после чего
+один раз перестраиваются стрики и недельные/месячные итоги.
+
+Дата и числа каждой строки проверяются до записи: строка с неверной датой
+или числом пропускается (счётчик skipped). Если импорт оборвался, у уже
+записанных пачек всё равно досчитываются дни, стрики и итоги.
+"""
+
+import argparse
+import csv
+import io
+import json
+import math
+import os
+import sqlite3
+import sys
+import time
+from collections import ChainMap
+from datetime import date
+
+from . import rollups
+from .combinations import ATTR_COLUMNS, get_engine
+from .db import friction_multiplier
+from .loaders import get_or_create_habits
+from .streaks import rebuild_all as rebuild_all_streaks
+from .writer import write
+
+FORMATS = ('csv', 'ndjson', 'sqlite')
+DAY_FIELDS = ('day_number', 'state', 'emotion_morning', 'thoughts')
+TOTAL_COLUMNS = tuple('total_' + c for c in ATTR_COLUMNS)
+BATCH_ROWS = 5000
+INT_FIELDS = ('day_number', 'completed_count', 'total_count')
+REAL_FIELDS = ('quantity', 'friction_index') + ATTR_COLUMNS + TOTAL_COLUMNS
+
+
+def _flag(value):
+    if value is None or value == '':
+        return True
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'да')
+    return bool(value)
+
+
+def _is_completion(record):
+    return any(record.get(k) not in (None, '') for k in ('habit_id', 'habit_name', 'name'))
+
+
+def _clean(record):
+    """Запись с датой YYYY-MM-DD и числами нужных типов; None — строку импортировать нельзя.
+
+    Проверка идёт до записи в БД: строка с испорченной датой или числом
+    пропускается целиком, а не роняет пачку посреди импорта.
+    """
+    try:
+        day_date = date.fromisoformat(str(record.get('date') or '').strip()[:10]).isoformat()
+    except ValueError:
+        return None
+    clean = dict(record, date=day_date)
+    try:
+        for key in REAL_FIELDS + INT_FIELDS:
+            value = clean.get(key)
+            if value is None or value == '':
+                clean[key] = None
+                continue
+            value = float(value)
+            if not math.isfinite(value) or (key in INT_FIELDS and not value.is_integer()):
+                return None
+            clean[key] = int(value) if key in INT_FIELDS else value
+    except (TypeError, ValueError):
+        return None
+    return clean
+
+
+# ---- чтение источников ----
+
+def read_csv(stream):
+    """Записи из CSV (заголовок — имена колонок выгрузки)."""
+    if isinstance(stream, (bytes, bytearray)):
+        stream = io.BytesIO(stream)
+    if not isinstance(stream, io.TextIOBase):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    yield from csv.DictReader(stream)
+
+
+def read_ndjson(stream):
+    """Записи из NDJSON; день с вложенным списком habits разворачивается в строки."""
+    if isinstance(stream, (bytes, bytearray)):
+        stream = io.BytesIO(stream)
+    if not isinstance(stream, io.TextIOBase):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig')
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        record = json.loads(line)
+        habits = record.pop('habits', None)
+        if habits is None:
+            yield record
+            continue
+        # totals из тела POST — клиентские суммы до бонусов и трения; итоги дня считаются заново
+        yield {k: v for k, v in record.items() if k != 'totals'}
+        for habit in habits:
+            row = {k: record.get(k) for k in ('date',) + DAY_FIELDS}
+            row.update(habit)
+            yield row
+
+
+def _columns(conn, table):
+    return {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+
+
+def read_sqlite(path):
+    """Записи из чужого habits.db (старые схемы без части колонок тоже читаются)."""
+    src = sqlite3.connect(f'file:{os.path.abspath(path)}?mode=ro', uri=True)
+    try:
+        cols = _columns(src, 'discipline_days')
+        wanted = ('date',) + DAY_FIELDS + TOTAL_COLUMNS + ('completed_count', 'total_count', 'friction_index')
+        select = ', '.join(c if c in cols else f'NULL AS {c}' for c in wanted)
+        cursor = src.execute(f'SELECT {select} FROM discipline_days ORDER BY date')
+        names = [d[0] for d in cursor.description]
+        for row in cursor:
+            yield dict(zip(names, row))
+
+        cols = _columns(src, 'completed_habits')
+        fields = ('quantity', 'success') + ATTR_COLUMNS + ('notes',) + DAY_FIELDS
+        select = ', '.join(f'ch.{c}' if c in cols else f'NULL AS {c}' for c in fields)
+        subtask = ('st.name AS subtask_name', 'LEFT JOIN habit_subtasks st ON st.id = ch.subtask_id') \
+            if 'subtask_id' in cols else ('NULL AS subtask_name', '')
+        cursor = src.execute(f'''
+            SELECT ch.date, h.name AS habit_name, h.category, {subtask[0]}, {select}
+            FROM completed_habits ch
+            JOIN habits h ON h.id = ch.habit_id
+            {subtask[1]}
+            ORDER BY ch.date
+        ''')
+        names = [d[0] for d in cursor.description]
+        for row in cursor:
+            yield dict(zip(names, row))
+    finally:
+        src.close()
+
+
+def read_records(source, fmt):
+    """Записи источника: `source` — путь или поток (для sqlite — только путь)."""
+    if fmt == 'sqlite':
+        return read_sqlite(source)
+    if isinstance(source, str):
+        return _read_file(source, fmt)
+    return read_csv(source) if fmt == 'csv' else read_ndjson(source)
+
+
+def _read_file(path, fmt):
+    with open(path, 'rb') as f:
+        yield from (read_csv(f) if fmt == 'csv' else read_ndjson(f))
+
+
+def detect_format(name):
+    ext = os.path.splitext(name or '')[1].lower()
+    if ext in ('.db', '.sqlite', '.sqlite3'):
+        return 'sqlite'
+    if ext in ('.ndjson', '.jsonl'):
+        return 'ndjson'
+    if ext == '.csv':
+        return 'csv'
+    return None
+
+
+# ---- импорт ----
+
+class _Day:
+    __slots__ = ('fields', 'totals', 'counts', 'sums', 'done', 'rows', 'successes')
+
+    def __init__(self):
+        self.fields = {}           # day_number, state, ... , friction_index
+        self.totals = None         # итоги из источника (уже с бонусами и трением)
+        self.counts = None         # (completed_count, total_count) из источника
+        self.sums = [0.0] * len(ATTR_COLUMNS)
+        self.done = set()
+        self.rows = 0
+        self.successes = 0
+
+
+class _Batch:
+    """Что пачка меняет в состоянии импорта; применяется, только когда пачка записана."""
+    __slots__ = ('habits', 'subtasks', 'dates', 'seen', 'days', 'stats')
+
+    def __init__(self):
+        self.habits = {}           # созданные привычки: (name, category) -> id
+        self.subtasks = {}         # (habit_id, name) -> id
+        self.dates = []            # даты, чьи прежние строки удалены
+        self.seen = set()
+        self.days = {}             # date -> _Day с накоплениями только этой пачки
+        self.stats = dict.fromkeys(('completions', 'habits_created', 'subtasks_created', 'skipped', 'batches'), 0)
+
+
+class Importer:
+    """Импорт потока записей пачками через писателя БД."""
+
+    def __init__(self, batch_rows=BATCH_ROWS):
+        self.batch_rows = batch_rows
+        self.habits = None         # (name, category) -> id
+        self.habit_ids = None
+        self.subtasks = None       # (habit_id, name) -> id
+        self.days = {}             # date -> _Day
+        self.cleared = set()       # даты, чьи прежние строки уже удалены
+        self.seen = set()          # (habit_id, subtask_id, date) вставленных строк с подзадачей
+        self.stats = {'completions': 0, 'days': 0, 'habits_created': 0, 'subtasks_created': 0,
+                      'skipped': 0, 'batches': 0}
+
+    def run(self, records):
+        write(self._prepare)
+        try:
+            self._load(records)
+            self.stats['days'] = write(self._finish)
+        except BaseException:
+            # записанные пачки уже в БД: их дни, стрики и итоги досчитываются и при ошибке
+            if self.stats['batches']:
+                write(self._finish, self.cleared)
+            raise
+        return self.stats
+
+    def _load(self, records):
+        pending = []
+        for record in records:
+            record = _clean(record)
+            if record is None:
+                self.stats['skipped'] += 1
+                continue
+            if _is_completion(record):
+                pending.append((record['date'], record))
+                if len(pending) >= self.batch_rows:
+                    self._apply(write(self._insert_batch, pending))
+                    pending = []
+            else:
+                self._day_record(record['date'], record)
+        if pending:
+            self._apply(write(self._insert_batch, pending))
+
+    def _prepare(self, conn):
+        self.habits = {(name, category): hid for hid, name, category
+                       in conn.execute('SELECT id, name, category FROM habits')}
+        self.habit_ids = set(self.habits.values())
+        self.subtasks = {(hid, name): sid for sid, hid, name
+                         in conn.execute('SELECT id, habit_id, name FROM habit_subtasks')}
+
+    def _day(self, day_date):
+        day = self.days.get(day_date)
+        if day is None:
+            day = self.days[day_date] = _Day()
+        return day
+
+    def _day_record(self, day_date, record):
+        day = self._day(day_date)
+        for key in DAY_FIELDS + ('friction_index',):
+            if record.get(key) not in (None, ''):
+                day.fields[key] = record[key]
+        if any(record.get(c) is not None for c in TOTAL_COLUMNS):
+            day.totals = [record.get(c) or 0.0 for c in TOTAL_COLUMNS]
+        if record.get('completed_count') is not None and record.get('total_count') is not None:
+            day.counts = (record['completed_count'], record['total_count'])
+
+    @staticmethod
+    def _habit_id(record, habits, habit_ids):
+        name = record.get('habit_name') or record.get('name')
+        if name:
+            return habits.get((name, record.get('category') or ''))
+        try:
+            hid = int(record.get('habit_id'))
+        except (TypeError, ValueError):
+            return None
+        return hid if hid in habit_ids else None
+
+    def _insert_batch(self, conn, pending):
+        """Единица работы: пачка строк выполнений одним executemany.
+
+        Состояние импорта не трогает — возвращает _Batch, который применяется
+        после записи: откат единицы не оставляет в памяти несуществующих строк.
+        """
+        batch = _Batch()
+        missing = {(r.get('habit_name') or r.get('name'), r.get('category') or '')
+                   for _, r in pending if r.get('habit_name') or r.get('name')}
+        missing -= self.habits.keys()
+        if missing:
+            batch.habits = get_or_create_habits(conn, sorted(missing), 'Импортировано')
+            batch.stats['habits_created'] = len(batch.habits)
+        habits = ChainMap(batch.habits, self.habits)
+        habit_ids = self.habit_ids.union(batch.habits.values())
+
+        rows, new_subtasks = [], set()
+        for day_date, record in pending:
+            hid = self._habit_id(record, habits, habit_ids)
+            if hid is None:
+                batch.stats['skipped'] += 1
+                continue
+            subtask = record.get('subtask_name') or None
+            if subtask and (hid, subtask) not in self.subtasks:
+                new_subtasks.add((hid, subtask))
+            rows.append((day_date, hid, subtask, record))
+        if new_subtasks:
+            conn.executemany('INSERT INTO habit_subtasks (habit_id, name) VALUES (?, ?)', sorted(new_subtasks))
+            batch.subtasks = {(hid, name): sid for sid, hid, name in conn.execute(
+                'SELECT id, habit_id, name FROM habit_subtasks')}
+            batch.stats['subtasks_created'] = len(new_subtasks)
+        subtasks = ChainMap(batch.subtasks, self.subtasks)
+
+        batch.dates = sorted({day_date for day_date, _, _, _ in rows} - self.cleared)
+        if batch.dates:
+            # день из импорта заменяет существующий целиком
+            conn.execute('DELETE FROM completed_habits WHERE date IN (SELECT value FROM json_each(?))',
+                         (json.dumps(batch.dates),))
+
+        values = []
+        for day_date, hid, subtask, record in rows:
+            sid = subtasks.get((hid, subtask)) if subtask else None
+            if sid is not None:
+                # UNIQUE(habit_id, subtask_id, date): повтор подзадачи за день — оставляем первую строку
+                key = (hid, sid, day_date)
+                if key in self.seen or key in batch.seen:
+                    batch.stats['skipped'] += 1
+                    continue
+                batch.seen.add(key)
+            day = batch.days.get(day_date)
+            if day is None:
+                day = batch.days[day_date] = _Day()
+            known = ChainMap(self.days[day_date].fields, day.fields) if day_date in self.days else day.fields
+            attrs = [record.get(c) or 0.0 for c in ATTR_COLUMNS]
+            success = _flag(record.get('success'))
+            fields = [record.get(k) if record.get(k) not in (None, '') else known.get(k) for k in DAY_FIELDS]
+            for key, value in zip(DAY_FIELDS, fields):
+                if value is not None:
+                    day.fields.setdefault(key, value)
+            day.rows += 1
+            if success:
+                day.successes += 1
+                day.done.add(hid)
+                day.sums = [a + b for a, b in zip(day.sums, attrs)]
+            values.append((hid, sid, day_date,
+                           record.get('quantity'), 1 if success else 0, *attrs,
+                           record.get('notes') or None, *fields))
+        # OR REPLACE внутри SAVEPOINT писателя требует журнала оператора на каждую строку
+        # и на больших пачках деградирует нелинейно; дубли уже отсеяны выше
+        conn.executemany(
+            'INSERT OR IGNORE INTO completed_habits (habit_id, subtask_id, date, quantity, success, '
+            + ', '.join(ATTR_COLUMNS) + ', notes, ' + ', '.join(DAY_FIELDS) + ') '
+            'VALUES (' + ', '.join('?' * (6 + len(ATTR_COLUMNS) + len(DAY_FIELDS))) + ')',
+            values)
+        batch.stats['completions'] = len(values)
+        batch.stats['batches'] = 1
+        return batch
+
+    def _apply(self, batch):
+        """Перенести записанную пачку в состояние импорта."""
+        self.habits.update(batch.habits)
+        self.habit_ids.update(batch.habits.values())
+        self.subtasks.update(batch.subtasks)
+        self.cleared.update(batch.dates)
+        self.seen |= batch.seen
+        for day_date, part in batch.days.items():
+            day = self._day(day_date)
+            for key, value in part.fields.items():
+                day.fields.setdefault(key, value)
+            day.rows += part.rows
+            day.successes += part.successes
+            day.done |= part.done
+            day.sums = [a + b for a, b in zip(day.sums, part.sums)]
+        for key, value in batch.stats.items():
+            self.stats[key] += value
+
+    def _finish(self, conn, dates=None):
+        """Единица работы: итоги дней пачкой, затем стрики и недельные/месячные итоги.
+
+        `dates` — только эти дни (досчёт записанного после ошибки); возвращает число дней.
+        """
+        engine = get_engine(conn)
+        days = self.days if dates is None else {d: self.days[d] for d in dates if d in self.days}
+        # у дней без своей строки в импорте сохраняются поля уже записанного дня (state, трение, ...)
+        stored = {}
+        bare = [d for d, day in days.items() if day.totals is None and 'friction_index' not in day.fields]
+        if bare:
+            for row in conn.execute(
+                    'SELECT date, ' + ', '.join(DAY_FIELDS) + ', friction_index FROM discipline_days '
+                    'WHERE date IN (SELECT value FROM json_each(?))', (json.dumps(bare),)):
+                stored[row[0]] = {key: value for key, value in zip(DAY_FIELDS + ('friction_index',), row[1:])
+                                  if value is not None}
+        rows = []
+        for day_date, day in sorted(days.items()):
+            fields = ChainMap(day.fields, stored.get(day_date, {}))
+            friction, multiplier = friction_multiplier(fields.get('friction_index', 1))
+            if day.totals is not None:
+                totals = day.totals
+            else:
+                bonus = engine.vector(day.done) if day.done else (0.0,) * len(ATTR_COLUMNS)
+                totals = [(s + b) * multiplier for s, b in zip(day.sums, bonus)]
+            completed, total = day.counts or (day.successes, day.rows)
+            day_number = fields.get('day_number')
+            rows.append((day_date, int(day_number) if day_number is not None else 0,
+                         fields.get('state'), fields.get('emotion_morning'), fields.get('thoughts'),
+                         *totals, completed, total, friction))
+        conn.executemany(
+            'INSERT OR REPLACE INTO discipline_days (date, ' + ', '.join(DAY_FIELDS) + ', '
+            + ', '.join(TOTAL_COLUMNS) + ', completed_count, total_count, friction_index) '
+            'VALUES (' + ', '.join('?' * (1 + len(DAY_FIELDS) + len(TOTAL_COLUMNS) + 3)) + ')',
+            rows)
+        rebuild_all_streaks(conn)
+        rollups.rebuild(conn)
+        return len(rows)
+
+
+def import_records(records, batch_rows=BATCH_ROWS):
+    """Импортировать записи; возвращает счётчики (строки, дни, созданные привычки, ...)."""
+    return Importer(batch_rows).run(records)
+
+
+def main(argv=None):
+    from . import versioning
+    from .connection import configure
+    from .db import init_db
+
+    parser = argparse.ArgumentParser(description='Массовый импорт истории привычек')
+    parser.add_argument('file', help='CSV, NDJSON или файл habits.db')
+    parser.add_argument('--format', choices=FORMATS, help='по умолчанию — по расширению файла')
+    parser.add_argument('--db', default='habits.db', help='база, в которую импортировать')
+    parser.add_argument('--batch', type=int, default=BATCH_ROWS, help='строк выполнений в транзакции')
+    args = parser.parse_args(argv)
+
+    fmt = args.format or detect_format(args.file)
+    if fmt is None:
+        parser.error('не удалось определить формат по расширению, укажите --format')
+    configure(db_path=args.db)
+    init_db()
+
+    started = time.perf_counter()
+    stats = import_records(read_records(args.file, fmt), max(1, args.batch))
+    # метки изменений — чтобы запущенный сервер не отдал закешированные ответы
+    versioning.bump('days', 'habits')
+    print(json.dumps(stats, ensure_ascii=False))
+    print(f'✅ импорт {args.file} за {time.perf_counter() - started:.2f} с')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
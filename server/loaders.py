@@ -0,0 +1,75 @@
+"""Пакетные загрузчики: подзадачи, стрики и привычки по (name, category).
+
+Каждый загрузчик получает целый набор ключей и делает один запрос: набор
+передаётся одним JSON-параметром и разворачивается через json_each, поэтому
+число запросов не зависит ни от размера набора, ни от лимита переменных SQLite.
+"""
+
+import json
+import sqlite3
+
+
+def _dict_cursor(conn):
+    cursor = conn.cursor()
+    cursor.row_factory = sqlite3.Row
+    return cursor
+
+
+def subtasks_by_habit(conn, habit_ids):
+    """Подзадачи привычек: {habit_id: [dict, ...]} в порядке order_index."""
+    result = {habit_id: [] for habit_id in habit_ids}
+    if not result:
+        return result
+    cursor = _dict_cursor(conn)
+    cursor.execute('''
+        SELECT * FROM habit_subtasks
+        WHERE habit_id IN (SELECT value FROM json_each(?))
+        ORDER BY habit_id, order_index
+    ''', (json.dumps(list(result)),))
+    for row in cursor.fetchall():
+        result[row['habit_id']].append(dict(row))
+    return result
+
+
+def streaks_by_habit(conn, habit_ids):
+    """Стрики привычек: {habit_id: {'current': ..., 'longest': ...}} (только существующие)."""
+    ids = list(dict.fromkeys(habit_ids))
+    if not ids:
+        return {}
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT habit_id, current_streak, longest_streak FROM streaks
+        WHERE habit_id IN (SELECT value FROM json_each(?))
+    ''', (json.dumps(ids),))
+    return {row[0]: {'current': row[1], 'longest': row[2]} for row in cursor.fetchall()}
+
+
+def habits_by_name(conn, pairs):
+    """id привычек по парам (name, category): {(name, category): id}."""
+    pairs = list(dict.fromkeys((name, category) for name, category in pairs))
+    if not pairs:
+        return {}
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT h.id, h.name, h.category
+        FROM json_each(?) j
+        JOIN habits h ON h.name = json_extract(j.value, '$[0]')
+                     AND h.category = json_extract(j.value, '$[1]')
+    ''', (json.dumps(pairs, ensure_ascii=False),))
+    return {(row[1], row[2]): row[0] for row in cursor.fetchall()}
+
+
+def get_or_create_habits(conn, pairs, description=''):
+    """id привычек по (name, category); отсутствующие создаются одной пачкой.
+
+    Работает в транзакции вызывающего (commit не делает).
+    """
+    found = habits_by_name(conn, pairs)
+    missing = [p for p in dict.fromkeys(pairs) if p not in found]
+    if missing:
+        conn.cursor().executemany('''
+            INSERT INTO habits (name, category, description, i, s, w, e, c, h, st, money, is_composite, is_active)
+            VALUES (?, ?, ?, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0, 1)
+        ''', [(name, category, description) for name, category in missing])
+        found.update(habits_by_name(conn, missing))
+    return found
@@ -0,0 +1,238 @@
+"""Метрики запросов и SQL: /api/metrics (формат Prometheus) и заголовок Server-Timing.
+
+На каждый запрос Flask заводится счётчик (в потоке обработчика): число
+SQL-операторов и commit-ов — через trace callback соединения, время SQL и
+число возвращённых строк — через классы соединения/курсора, которые
+выдаёт server.connection (строки из fetch*; итерация по курсору не учитывается). По завершении запроса счётчик добавляется в
+агрегаты процесса по (метод, маршрут): число запросов по статусам,
+гистограммы длительности и числа операторов, суммы SQL-времени, строк и
+commit-ов.
+
+Под WAL с synchronous=NORMAL commit не вызывает fsync (синхронизация идёт
+только при checkpoint), поэтому отдельно считаются commit-ы.
+"""
+
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+_local = threading.local()
+_lock = threading.Lock()
+
+
+class RequestStats:
+    """Счётчики одного запроса."""
+
+    __slots__ = ('started', 'statements', 'sql_time', 'rows', 'commits', 'log', 'profiling')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements = 0
+        self.sql_time = 0.0
+        self.rows = 0
+        self.commits = 0
+        self.log = None            # список текстов операторов (при профилировании)
+        self.profiling = False     # запрос под cProfile: записи идут в его потоке
+
+
+def current():
+    """Счётчики текущего запроса потока (или None вне запроса)."""
+    return getattr(_local, 'stats', None)
+
+
+def bind(stats):
+    """Учитывать SQL текущего потока в счётчиках `stats` (или отвязать при None)."""
+    _local.stats = stats
+
+
+def trace_statement(statement):
+    """Trace callback соединения: считает операторы и commit-ы."""
+    stats = getattr(_local, 'stats', None)
+    if stats is not None:
+        stats.statements += 1
+        if statement[:6].upper() == 'COMMIT':
+            stats.commits += 1
+        if stats.log is not None:
+            stats.log.append(statement)
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Курсор, учитывающий время выполнения и число строк.
+
+    Учитываются execute* и fetchone/fetchmany/fetchall — по вызову, а не по
+    строке. Итерация по курсору (`for row in cursor`) не перехватывается:
+    таймер на каждой строке заметно замедлял бы большие выборки (выгрузка,
+    аналитика, импорт), поэтому такие строки в метрики не попадают.
+    """
+
+    def execute(self, *args):
+        started = time.perf_counter()
+        try:
+            return super().execute(*args)
+        finally:
+            _add_time(started)
+
+    def executemany(self, *args):
+        started = time.perf_counter()
+        try:
+            return super().executemany(*args)
+        finally:
+            _add_time(started)
+
+    def executescript(self, *args):
+        started = time.perf_counter()
+        try:
+            return super().executescript(*args)
+        finally:
+            _add_time(started)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        _add_time(started, 0 if row is None else 1)
+        return row
+
+    def fetchmany(self, *args):
+        started = time.perf_counter()
+        rows = super().fetchmany(*args)
+        _add_time(started, len(rows))
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        _add_time(started, len(rows))
+        return rows
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Соединение, чьи курсоры (включая conn.execute) учитываются в метриках."""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, parameters):
+        return self.cursor().executemany(sql, parameters)
+
+    def executescript(self, script):
+        return self.cursor().executescript(script)
+
+
+def _add_time(started, rows=0):
+    stats = getattr(_local, 'stats', None)
+    if stats is not None:
+        stats.sql_time += time.perf_counter() - started
+        stats.rows += rows
+
+
+# ---- агрегаты процесса ----
+
+def _histogram(buckets):
+    return {'buckets': [0] * len(buckets), 'count': 0, 'sum': 0.0}
+
+
+def _observe(hist, buckets, value):
+    for i, bound in enumerate(buckets):
+        if value <= bound:
+            hist['buckets'][i] += 1
+    hist['count'] += 1
+    hist['sum'] += value
+
+
+_requests = defaultdict(int)                  # (method, endpoint, status) -> count
+_durations = {}                               # (method, endpoint) -> histogram
+_statements = {}                              # (method, endpoint) -> histogram
+_sql = defaultdict(lambda: [0.0, 0, 0])       # (method, endpoint) -> [sql_time, rows, commits]
+
+
+def record(method, endpoint, status, duration, stats):
+    key = (method, endpoint)
+    with _lock:
+        _requests[(method, endpoint, str(status))] += 1
+        _observe(_durations.setdefault(key, _histogram(DURATION_BUCKETS)), DURATION_BUCKETS, duration)
+        _observe(_statements.setdefault(key, _histogram(STATEMENT_BUCKETS)), STATEMENT_BUCKETS, stats.statements)
+        totals = _sql[key]
+        totals[0] += stats.sql_time
+        totals[1] += stats.rows
+        totals[2] += stats.commits
+
+
+def reset():
+    with _lock:
+        _requests.clear()
+        _durations.clear()
+        _statements.clear()
+        _sql.clear()
+
+
+def _labels(**labels):
+    return '{' + ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+                          for k, v in labels.items()) + '}'
+
+
+def _render_histogram(lines, name, help_text, buckets, hists):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} histogram')
+    for (method, endpoint), hist in sorted(hists.items()):
+        for bound, count in zip(buckets, hist['buckets']):
+            lines.append(f'{name}_bucket{_labels(method=method, endpoint=endpoint, le=bound)} {count}')
+        lines.append(f'{name}_bucket{_labels(method=method, endpoint=endpoint, le="+Inf")} {hist["count"]}')
+        lines.append(f'{name}_sum{_labels(method=method, endpoint=endpoint)} {hist["sum"]}')
+        lines.append(f'{name}_count{_labels(method=method, endpoint=endpoint)} {hist["count"]}')
+
+
+def render():
+    """Все метрики в текстовом формате Prometheus."""
+    lines = []
+    with _lock:
+        lines.append('# HELP http_requests_total Число запросов по маршруту и статусу.')
+        lines.append('# TYPE http_requests_total counter')
+        for (method, endpoint, status), count in sorted(_requests.items()):
+            lines.append(f'http_requests_total{_labels(method=method, endpoint=endpoint, status=status)} {count}')
+        _render_histogram(lines, 'http_request_duration_seconds', 'Длительность обработки запроса.',
+                          DURATION_BUCKETS, _durations)
+        _render_histogram(lines, 'sqlite_statements_per_request', 'Число SQL-операторов за запрос.',
+                          STATEMENT_BUCKETS, _statements)
+        for index, (name, help_text) in enumerate((
+                ('sqlite_query_seconds_total', 'Суммарное время SQL (выполнение и выборка).'),
+                ('sqlite_rows_total', 'Число строк, возвращённых запросами.'),
+                ('sqlite_commits_total', 'Число commit-ов.'))):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} counter')
+            for (method, endpoint), totals in sorted(_sql.items()):
+                lines.append(f'{name}{_labels(method=method, endpoint=endpoint)} {totals[index]}')
+    return '\n'.join(lines) + '\n'
+
+
+def init_app(app):
+    """Подключить учёт к приложению Flask: счётчик на запрос, агрегаты и Server-Timing."""
+    from flask import request
+
+    @app.before_request
+    def _start_request_stats():
+        _local.stats = RequestStats()
+
+    @app.after_request
+    def _finish_request_stats(response):
+        stats = getattr(_local, 'stats', None)
+        if stats is None:
+            return response
+        duration = time.perf_counter() - stats.started
+        endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        record(request.method, endpoint, response.status_code, duration, stats)
+        response.headers.add(
+            'Server-Timing',
+            f'app;dur={duration * 1000:.2f}, '
+            f'sql;dur={stats.sql_time * 1000:.2f};desc="{stats.statements} statements, {stats.rows} rows"')
+        return response
+
+    @app.teardown_request
+    def _clear_request_stats(exc):
+        _local.stats = None
@@ -0,0 +1,78 @@
+"""Расписание повторений задач обучающих проектов ('!' в начале имени папки).
+
+Дата следующего повторения хранится в столбце `next_due` таблицы
+`planner_tasks` (server.planner_tasks) с частичным индексом по нему; она
+пересчитывается при каждой отметке, снятии отметки и смене флага
+обучения. Список «что повторить сегодня» — диапазонный запрос по индексу,
+без обхода папок и разбора имён файлов.
+
+Интервал задаётся списком `intervals` по числу уже сделанных повторений:
+при x = k следующее повторение через intervals[k] дней после даты
+последней отметки; если k >= len(intervals) или задача выполнена, она
+не планируется.
+"""
+
+from datetime import date, timedelta
+
+# дни до следующего повторения при x = 0, 1, 2 (после третьего задача выполнена)
+DEFAULT_INTERVALS = (0, 1, 3)
+
+
+def is_training(project):
+    return project.startswith('!')
+
+
+def next_due(project, state, x_count, last_date, intervals=DEFAULT_INTERVALS):
+    """Дата следующего повторения (YYYY-MM-DD) или None, если повторять не нужно."""
+    if not is_training(project) or state == 'done' or not last_date or x_count >= len(intervals):
+        return None
+    try:
+        base = date.fromisoformat(last_date)
+    except ValueError:
+        return None
+    return (base + timedelta(days=int(intervals[x_count]))).isoformat()
+
+
+def due(conn, on_date, project=None, limit=None):
+    """Задачи с next_due <= on_date, самые просроченные сначала."""
+    where, params = 'next_due <= ?', [on_date]
+    if project:
+        where += ' AND project = ?'
+        params.append(project)
+    sql = f'''
+        SELECT id, project, filename, core, x_count, last_date, next_due FROM planner_tasks
+        WHERE next_due IS NOT NULL AND {where} ORDER BY next_due, project, order_index
+    '''
+    if limit:
+        sql += ' LIMIT ?'
+        params.append(int(limit))
+    day = date.fromisoformat(on_date)
+    cursor = conn.cursor()
+    cursor.execute(sql, params)
+    return [{'id': r[0], 'project': r[1], 'filename': r[2], 'core': r[3], 'x_count': r[4], 'last_date': r[5],
+             'next_due': r[6], 'overdue_days': (day - date.fromisoformat(r[6])).days}
+            for r in cursor.fetchall()]
+
+
+def summary(conn, on_date, days_ahead=7):
+    """Сколько задач просрочено, к повторению в день on_date и по дням на неделю вперёд."""
+    day = date.fromisoformat(on_date)
+    horizon = (day + timedelta(days=days_ahead)).isoformat()
+    cursor = conn.cursor()
+    cursor.execute('SELECT COUNT(*) FROM planner_tasks WHERE next_due IS NOT NULL AND next_due < ?', (on_date,))
+    overdue = cursor.fetchone()[0]
+    cursor.execute('''
+        SELECT next_due, COUNT(*) FROM planner_tasks
+        WHERE next_due IS NOT NULL AND next_due >= ? AND next_due <= ? GROUP BY next_due
+    ''', (on_date, horizon))
+    by_day = dict(cursor.fetchall())
+    cursor.execute('''
+        SELECT project, COUNT(*) FROM planner_tasks WHERE next_due IS NOT NULL AND next_due <= ?
+        GROUP BY project ORDER BY project
+    ''', (on_date,))
+    by_project = dict(cursor.fetchall())
+    upcoming = [{'date': (day + timedelta(days=i)).isoformat(),
+                 'count': by_day.get((day + timedelta(days=i)).isoformat(), 0)}
+                for i in range(1, days_ahead + 1)]
+    return {'date': on_date, 'overdue': overdue, 'due_today': by_day.get(on_date, 0),
+            'due_total': overdue + by_day.get(on_date, 0), 'by_project': by_project, 'upcoming': upcoming}
@@ -0,0 +1,246 @@
+"""Метаданные задач планировщика в SQLite (таблица `planner_tasks` в habits.db).
+
+Состояние задачи — выполнена ли она, дата последней отметки, число
+повторений x, порядок в проекте — хранится строкой таблицы, а не в имени
+файла: отметка и снятие отметки меняют строку, файл не переименовывается.
+Файл задачи хранит только содержимое. Список задач проекта — индексный
+запрос по (project, order_index), без обхода папки.
+
+Файлы, появившиеся мимо приложения (и дорожные карты старого формата,
+где состояние записано в имени), подхватывает `reconcile`: новая строка
+получает состояние, разобранное из имени файла (`parse_task_name`),
+строки исчезнувших файлов удаляются. `legacy_name` строит имя старого
+формата — для выгрузки, совместимой с прежними версиями.
+
+Функции с `conn` первым аргументом — единицы работы писателя
+(server.writer): commit не делают.
+"""
+
+import os
+from datetime import date
+
+from .planner_due import DEFAULT_INTERVALS, is_training, next_due
+from .roadmap import DONE_SUFFIX, parse_task_name
+
+STATE_OPEN = 'open'
+STATE_DONE = 'done'
+# после стольких повторений задача обучающего проекта выполнена
+TRAINING_REPEATS = 3
+
+COLUMNS = ('id', 'project', 'filename', 'core', 'state', 'x_count', 'last_date', 'order_index', 'next_due')
+
+
+def create_tables(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS planner_tasks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            project TEXT NOT NULL,
+            filename TEXT NOT NULL,
+            core TEXT NOT NULL,
+            state TEXT NOT NULL DEFAULT 'open',
+            x_count INTEGER NOT NULL DEFAULT 0,
+            last_date TEXT,
+            order_index INTEGER NOT NULL DEFAULT 0,
+            next_due TEXT,
+            UNIQUE (project, filename)
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_planner_tasks_order '
+                   'ON planner_tasks(project, order_index, filename)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_planner_tasks_due ON planner_tasks(next_due) '
+                   'WHERE next_due IS NOT NULL')
+
+
+def as_item(row):
+    """Строка planner_tasks -> элемент списка задач (поля прежнего ответа + id, state, order)."""
+    task = dict(zip(COLUMNS, row))
+    return {
+        'id': task['id'],
+        'filename': task['filename'],
+        'core': task['core'],
+        'state': task['state'],
+        'completed': task['state'] == STATE_DONE,
+        'x_count': task['x_count'],
+        'date': task['last_date'],
+        'order': task['order_index'],
+        'next_due': task['next_due'],
+    }
+
+
+def list_tasks(conn, project):
+    """Задачи проекта в порядке order_index."""
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT {', '.join(COLUMNS)} FROM planner_tasks
+        WHERE project = ? ORDER BY order_index, filename
+    ''', (project,))
+    return [as_item(row) for row in cursor.fetchall()]
+
+
+def get_task(conn, project, filename):
+    cursor = conn.cursor()
+    cursor.execute(f'SELECT {", ".join(COLUMNS)} FROM planner_tasks WHERE project = ? AND filename = ?',
+                   (project, filename))
+    row = cursor.fetchone()
+    return as_item(row) if row else None
+
+
+def lookup(conn, pairs):
+    """{(project, filename): item} для набора пар (одним запросом)."""
+    pairs = list(pairs)
+    if not pairs:
+        return {}
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT {', '.join(COLUMNS)} FROM planner_tasks
+        WHERE (project, filename) IN (VALUES {', '.join(['(?, ?)'] * len(pairs))})
+    ''', [value for pair in pairs for value in pair])
+    return {(row[1], row[2]): as_item(row) for row in cursor.fetchall()}
+
+
+def _state_from_name(project, filename, default_date):
+    """(core, state, x_count, last_date) по имени файла (старый формат тоже понимается)."""
+    meta = parse_task_name(filename)
+    done = meta['completed'] or (is_training(project) and meta['x_count'] >= TRAINING_REPEATS)
+    last_date = meta['date']
+    if last_date is None and is_training(project):
+        last_date = default_date
+    core = meta['core'] or os.path.splitext(filename)[0]
+    return core, STATE_DONE if done else STATE_OPEN, meta['x_count'], last_date
+
+
+def _insert(cursor, project, filename, default_date, order_index, intervals):
+    core, state, x_count, last_date = _state_from_name(project, filename, default_date)
+    cursor.execute('''
+        INSERT OR IGNORE INTO planner_tasks
+            (project, filename, core, state, x_count, last_date, order_index, next_due)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (project, filename, core, state, x_count, last_date, order_index,
+          next_due(project, state, x_count, last_date, intervals)))
+
+
+def add_task(conn, project, filename, intervals=DEFAULT_INTERVALS, today=None):
+    """Новая задача в конце проекта; у обучающего проекта отсчёт повторений — с сегодняшнего дня."""
+    cursor = conn.cursor()
+    cursor.execute('SELECT COALESCE(MAX(order_index) + 1, 0) FROM planner_tasks WHERE project = ?', (project,))
+    order_index = cursor.fetchone()[0]
+    _insert(cursor, project, filename, today or date.today().isoformat(), order_index, intervals)
+    return get_task(conn, project, filename)
+
+
+def remove_task(conn, project, filename):
+    conn.execute('DELETE FROM planner_tasks WHERE project = ? AND filename = ?', (project, filename))
+
+
+def set_mark(conn, project, filename, mark, intervals=DEFAULT_INTERVALS, today=None):
+    """Отметить задачу выполненной (mark=True) или снять отметку; вернуть обновлённую задачу.
+
+    Обучающий проект: отметка — ещё одно повторение (x + 1, дата — сегодня),
+    после TRAINING_REPEATS повторений задача выполнена; снятие отметки
+    убирает последнее повторение (у выполненной задачи остаётся не больше
+    TRAINING_REPEATS - 1, иначе по имени старого формата она снова читалась бы
+    выполненной). Обычный проект: выполнена/не выполнена с датой отметки.
+    """
+    task = get_task(conn, project, filename)
+    if task is None:
+        return None
+    today = today or date.today().isoformat()
+    x_count, last_date = task['x_count'], task['date']
+    if is_training(project):
+        if mark:
+            x_count = min(TRAINING_REPEATS, x_count + 1)
+            last_date = today
+            state = STATE_DONE if x_count >= TRAINING_REPEATS else STATE_OPEN
+        else:
+            if task['state'] == STATE_DONE:
+                x_count = min(x_count, TRAINING_REPEATS - 1)
+            else:
+                x_count = max(0, x_count - 1)
+            state = STATE_OPEN
+    elif mark:
+        state, last_date = STATE_DONE, today
+    else:
+        state, last_date = STATE_OPEN, None
+    conn.execute('''
+        UPDATE planner_tasks SET state = ?, x_count = ?, last_date = ?, next_due = ? WHERE id = ?
+    ''', (state, x_count, last_date, next_due(project, state, x_count, last_date, intervals), task['id']))
+    return get_task(conn, project, filename)
+
+
+def _refresh_due(cursor, project, intervals):
+    cursor.execute('SELECT id, state, x_count, last_date FROM planner_tasks WHERE project = ?', (project,))
+    cursor.executemany('UPDATE planner_tasks SET next_due = ? WHERE id = ?', [
+        (next_due(project, state, x_count, last_date, intervals), task_id)
+        for task_id, state, x_count, last_date in cursor.fetchall()])
+
+
+def rename_project(conn, old, new, intervals=DEFAULT_INTERVALS, today=None):
+    """Папка проекта переименована (в том числе флаг обучения '!'): перенести задачи.
+
+    Проект стал обучающим — задачи без даты начинают повторения с сегодняшнего дня,
+    а задачи с TRAINING_REPEATS повторениями считаются выполненными (как в `set_mark`).
+    """
+    cursor = conn.cursor()
+    cursor.execute('UPDATE planner_tasks SET project = ? WHERE project = ?', (new, old))
+    if is_training(old) != is_training(new):
+        if is_training(new):
+            cursor.execute('UPDATE planner_tasks SET last_date = ? WHERE project = ? AND last_date IS NULL',
+                           (today or date.today().isoformat(), new))
+            cursor.execute('UPDATE planner_tasks SET state = ? WHERE project = ? AND x_count >= ?',
+                           (STATE_DONE, new, TRAINING_REPEATS))
+        _refresh_due(cursor, new, intervals)
+
+
+def rename_files(conn, project, renames):
+    """Файлы переименованы (выгрузка имён): [(старое, новое), ...]."""
+    conn.executemany('UPDATE planner_tasks SET filename = ? WHERE project = ? AND filename = ?',
+                     [(new, project, old) for old, new in renames])
+
+
+def legacy_name(project, task, filename):
+    """Имя файла старого формата, в котором записано состояние задачи."""
+    ext = os.path.splitext(filename)[1]
+    parts = [task['core']]
+    if is_training(project):
+        if task['date']:
+            parts.append(task['date'])
+        if task['x_count']:
+            parts.append('x' * task['x_count'])
+    elif task['completed'] and task['date']:
+        parts.append(task['date'])
+    name = ' '.join(parts).strip()
+    if task['completed']:
+        name += DONE_SUFFIX
+    return name + ext
+
+
+def reconcile(conn, root, intervals=DEFAULT_INTERVALS):
+    """Сверить таблицу с папками: строки для новых файлов, удаление строк исчезнувших,
+    пересчёт next_due (интервалы могли поменяться). Возвращает (добавлено, удалено)."""
+    on_disk = {}
+    if os.path.isdir(root):
+        for proj in os.scandir(root):
+            if proj.is_dir():
+                on_disk[proj.name] = {de.name: de for de in os.scandir(proj.path) if de.is_file()}
+    cursor = conn.cursor()
+    cursor.execute('SELECT project, filename, order_index FROM planner_tasks')
+    known = {}
+    for project, filename, order_index in cursor.fetchall():
+        known.setdefault(project, {})[filename] = order_index
+
+    gone = [(project, filename) for project, files in known.items() for filename in files
+            if filename not in on_disk.get(project, {})]
+    cursor.executemany('DELETE FROM planner_tasks WHERE project = ? AND filename = ?', gone)
+
+    added = 0
+    for project, files in on_disk.items():
+        present = known.get(project, {})
+        order_index = max(present.values(), default=-1) + 1
+        # новые файлы — в конец проекта, между собой по имени (как прежде сортировался список)
+        for filename in sorted(set(files) - set(present)):
+            mtime_date = date.fromtimestamp(files[filename].stat().st_mtime).isoformat()
+            _insert(cursor, project, filename, mtime_date, order_index, intervals)
+            order_index += 1
+            added += 1
+        _refresh_due(cursor, project, intervals)
+    return added, len(gone)
@@ -0,0 +1,169 @@
+"""Профилирование отдельных запросов (cProfile) по требованию.
+
+Включается флагом app.config['PROFILING'] (по умолчанию — переменная
+окружения PROFILING=1); профилируется только запрос с заголовком
+`X-Profile: 1` или параметром `?_profile=1`. Для такого запроса в каталог
+app.config['PROFILE_DIR'] пишутся дамп pstats (.prof), текстовая сводка
+(.txt: функции по cumulative time и выполненные SQL-операторы) и
+метаданные (.json); имя профиля возвращается в заголовке X-Profile.
+Хранится не больше app.config['PROFILE_KEEP'] последних профилей.
+
+Записи такого запроса выполняются в его же потоке (см. server.writer),
+поэтому в профиль попадают и единицы работы, а не только ожидание писателя.
+"""
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from . import metrics
+
+TOP_FUNCTIONS = 40
+
+# cProfile не рассчитан на несколько одновременно активных профилировщиков
+_busy = threading.Lock()
+_local = threading.local()
+
+
+def _requested(request):
+    return request.headers.get('X-Profile') == '1' or request.args.get('_profile') == '1'
+
+
+def _slug(text):
+    return re.sub(r'[^A-Za-z0-9_.-]+', '_', text).strip('_')[:60] or 'root'
+
+
+def list_profiles(profile_dir, limit=50):
+    """Последние профили (новые сверху) по файлам метаданных."""
+    if not os.path.isdir(profile_dir):
+        return []
+    items = []
+    for name in sorted(os.listdir(profile_dir), reverse=True):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(profile_dir, name), 'r', encoding='utf-8') as f:
+                items.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+        if len(items) >= limit:
+            break
+    return items
+
+
+def _prune(profile_dir, keep):
+    names = sorted(n[:-5] for n in os.listdir(profile_dir) if n.endswith('.json'))
+    for name in names[:max(0, len(names) - keep)]:
+        for ext in ('.json', '.prof', '.txt'):
+            try:
+                os.remove(os.path.join(profile_dir, name + ext))
+            except OSError:
+                pass
+
+
+def _summary(meta, profiler, statements):
+    out = io.StringIO()
+    out.write(f"{meta['method']} {meta['path']} -> {meta['status']}  {meta['duration_ms']:.2f} ms\n")
+    out.write(f"{meta['created_at']}  SQL: {len(statements)} операторов\n\n")
+    stats = pstats.Stats(profiler, stream=out)
+    stats.sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+    out.write('\nSQL-операторы (по числу выполнений):\n')
+    for statement, count in Counter(' '.join(s.split()) for s in statements).most_common():
+        out.write(f'{count:>6}  {statement[:300]}\n')
+    return out.getvalue()
+
+
+def _save(app, request, response, profiler, duration, statements):
+    profile_dir = app.config['PROFILE_DIR']
+    os.makedirs(profile_dir, exist_ok=True)
+    now = datetime.now()
+    endpoint = request.url_rule.rule if request.url_rule is not None else request.path
+    name = f"{now.strftime('%Y%m%d-%H%M%S-%f')}-{request.method}-{_slug(endpoint)}"
+    meta = {
+        'name': name,
+        'created_at': now.isoformat(timespec='seconds'),
+        'method': request.method,
+        'path': request.full_path.rstrip('?'),
+        'endpoint': endpoint,
+        'status': response.status_code,
+        'duration_ms': round(duration * 1000, 3),
+        'sql_statements': len(statements),
+    }
+    base = os.path.join(profile_dir, name)
+    profiler.dump_stats(base + '.prof')
+    with open(base + '.txt', 'w', encoding='utf-8') as f:
+        f.write(_summary(meta, profiler, statements))
+    with open(base + '.json', 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    _prune(profile_dir, int(app.config['PROFILE_KEEP']))
+    return name
+
+
+def init_app(app, profile_dir):
+    """Подключить профилирование к приложению Flask."""
+    from flask import request
+
+    app.config.setdefault('PROFILING', os.environ.get('PROFILING') == '1')
+    app.config.setdefault('PROFILE_DIR', profile_dir)
+    app.config.setdefault('PROFILE_KEEP', 50)
+
+    @app.before_request
+    def _start_profile():
+        if not app.config['PROFILING'] or not _requested(request):
+            return
+        if not _busy.acquire(blocking=False):
+            _local.skipped = True
+            return
+        stats = metrics.current()
+        if stats is not None:
+            stats.log = []
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # уже активен другой профилировщик
+            _busy.release()
+            _local.skipped = True
+            return
+        if stats is not None:
+            stats.profiling = True
+        _local.profile = (profiler, time.perf_counter())
+
+    @app.after_request
+    def _finish_profile(response):
+        if getattr(_local, 'skipped', False):
+            _local.skipped = False
+            response.headers['X-Profile'] = 'busy'
+            return response
+        current = getattr(_local, 'profile', None)
+        if current is None:
+            return response
+        profiler, started = current
+        _local.profile = None
+        profiler.disable()
+        try:
+            stats = metrics.current()
+            statements = (stats.log or []) if stats is not None else []
+            name = _save(app, request, response, profiler, time.perf_counter() - started, statements)
+            response.headers['X-Profile'] = name
+        except OSError as e:
+            print('Error saving profile:', e)
+        finally:
+            _busy.release()
+        return response
+
+    @app.teardown_request
+    def _drop_profile(exc):
+        # запрос оборвался до after_request
+        current = getattr(_local, 'profile', None)
+        if current is not None:
+            _local.profile = None
+            current[0].disable()
+            _busy.release()
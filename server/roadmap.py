@@ -0,0 +1,191 @@
+"""Индекс дорожных карт планировщика (папка roadmaps/).
+
+На каждый проект хранится список файлов с размером, mtime, разобранными
+метаданными имени (core, дата, число x, выполнено) и закешированным
+содержимым с хешем. Актуальность проверяется только stat-вызовами: mtime папки —
+для списка файлов, (size, mtime) файла — для содержимого, поэтому
+неизменённые файлы повторно не читаются. Маршруты планировщика после своих
+операций обновляют индекс на месте (`write_task`, `remove_task`,
+`rename_task`, `rename_project`, `refresh_projects`).
+"""
+
+import hashlib
+import os
+import re
+import threading
+
+DONE_SUFFIX = ' выполнено'
+MAX_CACHED_CONTENT = 256 * 1024
+
+_NAME_RE = re.compile(r"^(.*?)(?:\s(\d{4}-\d{2}-\d{2}))?(?:\s([x]+))?$")
+
+
+def parse_task_name(filename):
+    """Разобрать имя файла задачи: core, date, x_count, completed."""
+    name, _ = os.path.splitext(filename)
+    base = name[:-len(DONE_SUFFIX)] if name.endswith(DONE_SUFFIX) else name
+    m = _NAME_RE.match(base)
+    if m:
+        core = (m.group(1) or '').strip()
+        date_part = m.group(2)
+        x_count = len(m.group(3) or '')
+    else:
+        core, date_part, x_count = base.strip(), None, 0
+    completed = 'выполнено' in filename.lower() or 'вypol' in filename.lower()
+    return {'core': core, 'date': date_part, 'x_count': x_count, 'completed': completed}
+
+
+def _stat_key(st):
+    return st.st_size, st.st_mtime_ns
+
+
+class RoadmapIndex:
+    """Кеш проектов и задач в каталоге `root`."""
+
+    def __init__(self, root, max_cached_content=MAX_CACHED_CONTENT):
+        self.root = root
+        self.max_cached_content = max_cached_content
+        self._lock = threading.RLock()
+        self._projects = None          # (mtime_ns корня, [имена папок])
+        self._entries = {}             # project -> {'mtime': ns, 'files': {filename: entry}}
+
+    # ---- проекты ----
+
+    def projects(self):
+        """Отсортированный список папок-проектов."""
+        with self._lock:
+            if not os.path.exists(self.root):
+                os.makedirs(self.root)
+            mtime = os.stat(self.root).st_mtime_ns
+            if self._projects is None or self._projects[0] != mtime:
+                names = sorted(e.name for e in os.scandir(self.root) if e.is_dir())
+                self._projects = (mtime, names)
+            return list(self._projects[1])
+
+    def refresh_projects(self):
+        """Сбросить список проектов (после создания папки)."""
+        with self._lock:
+            self._projects = None
+
+    def rename_project(self, old, new):
+        with self._lock:
+            self._projects = None
+            entry = self._entries.pop(old, None)
+            if entry is not None:
+                entry['mtime'] = os.stat(os.path.join(self.root, new)).st_mtime_ns
+                self._entries[new] = entry
+
+    # ---- задачи ----
+
+    def _make_entry(self, filename, st, content=None, digest=None):
+        entry = {'filename': filename, 'size': st.st_size, 'mtime': st.st_mtime_ns}
+        entry.update(parse_task_name(filename))
+        entry['hash'] = digest
+        entry['_stat'] = _stat_key(st)
+        entry['_content'] = content if content is not None and st.st_size <= self.max_cached_content else None
+        return entry
+
+    def _project(self, project):
+        """Запись проекта с актуальным списком файлов (пересканирование только при смене mtime папки)."""
+        proj_path = os.path.join(self.root, project)
+        mtime = os.stat(proj_path).st_mtime_ns
+        cached = self._entries.get(project)
+        if cached is not None and cached['mtime'] == mtime:
+            return cached
+        old_files = cached['files'] if cached else {}
+        files = {}
+        for de in os.scandir(proj_path):
+            if not de.is_file():
+                continue
+            st = de.stat()
+            prev = old_files.get(de.name)
+            if prev is not None and prev['_stat'] == _stat_key(st):
+                files[de.name] = prev
+            else:
+                files[de.name] = self._make_entry(de.name, st)
+        cached = {'mtime': mtime, 'files': files}
+        self._entries[project] = cached
+        return cached
+
+    def _load(self, project, entry, force=False):
+        """Прочитать файл, если он изменился или ещё не читался: хеш и (для небольших файлов) содержимое."""
+        path = os.path.join(self.root, project, entry['filename'])
+        st = os.stat(path)
+        if not force and entry['hash'] is not None and entry['_stat'] == _stat_key(st) and (
+                entry['_content'] is not None or st.st_size > self.max_cached_content):
+            return entry['_content']
+        with open(path, 'rb') as f:
+            data = f.read()
+        try:
+            # как при чтении в текстовом режиме: универсальные переводы строк
+            content = data.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+        except UnicodeDecodeError:
+            content = ''
+        entry.update(self._make_entry(entry['filename'], st, content, hashlib.sha1(data).hexdigest()[:16]))
+        return content
+
+    def _content(self, project, entry):
+        content = self._load(project, entry)
+        if content is None:
+            # большой файл: содержимое не кешируется, читаем заново
+            content = self._load(project, entry, force=True)
+        return content
+
+    def _item(self, project, entry, with_content):
+        if with_content:
+            content = self._content(project, entry)
+        elif entry['hash'] is None:
+            self._load(project, entry)
+        item = {k: v for k, v in entry.items() if not k.startswith('_')}
+        if with_content:
+            item['content'] = content
+        return item
+
+    def tasks(self, project, with_content=True):
+        """Задачи проекта по имени файла; файл читается, только если изменился."""
+        with self._lock:
+            files = self._project(project)['files']
+            return [self._item(project, files[filename], with_content) for filename in sorted(files)]
+
+    def task(self, project, filename, with_content=True):
+        """Одна задача (или None); хеш всегда актуален."""
+        with self._lock:
+            entry = self._project(project)['files'].get(filename)
+            if entry is None:
+                return None
+            self._load(project, entry)
+            return self._item(project, entry, with_content)
+
+    def _sync_dir_mtime(self, project):
+        cached = self._entries.get(project)
+        if cached is not None:
+            cached['mtime'] = os.stat(os.path.join(self.root, project)).st_mtime_ns
+
+    def write_task(self, project, filename, content):
+        """Файл создан или перезаписан маршрутом — обновить запись на месте."""
+        with self._lock:
+            cached = self._entries.get(project)
+            if cached is None:
+                return
+            path = os.path.join(self.root, project, filename)
+            cached['files'][filename] = self._make_entry(filename, os.stat(path), content)
+            self._sync_dir_mtime(project)
+
+    def remove_task(self, project, filename):
+        with self._lock:
+            cached = self._entries.get(project)
+            if cached is None:
+                return
+            cached['files'].pop(filename, None)
+            self._sync_dir_mtime(project)
+
+    def rename_task(self, project, old, new):
+        with self._lock:
+            cached = self._entries.get(project)
+            if cached is None:
+                return
+            prev = cached['files'].pop(old, None)
+            path = os.path.join(self.root, project, new)
+            content, digest = (prev['_content'], prev['hash']) if prev else (None, None)
+            cached['files'][new] = self._make_entry(new, os.stat(path), content, digest)
+            self._sync_dir_mtime(project)
@@ -0,0 +1,229 @@
+"""Полнотекстовый поиск по дорожным картам планировщика (SQLite FTS5).
+
+Индекс живёт в отдельной БД рядом с папкой дорожных карт
+(`roadmaps.index.db`), а не в habits.db: его всегда можно удалить и
+собрать заново из файлов. Таблица `roadmap_files` хранит (project,
+filename, size, mtime_ns) каждого проиндексированного файла, виртуальная
+таблица `roadmap_fts` с тем же rowid — название проекта, имя файла и
+содержимое.
+
+Маршруты планировщика обновляют индекс сразу после своих операций
+(`put`, `remove`, `rename`, `rename_project`); изменения, сделанные мимо
+приложения, подхватывает `reconcile` — при старте сравнивает размер и
+mtime файлов с сохранёнными и перечитывает только изменившиеся.
+
+Подсвеченное имя и фрагмент текста в результатах — экранированный HTML
+с разметкой только `<mark>` (см. habit_search.mark_up).
+"""
+
+import os
+import re
+import threading
+
+from .connection import connect
+from .habit_search import MARKERS, mark_up
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+# веса bm25 по столбцам: project, filename, content
+WEIGHTS = (2.0, 5.0, 1.0)
+
+_WORD = re.compile(r'\w+')
+
+
+def default_path(root):
+    """Файл индекса рядом с папкой дорожных карт: roadmaps -> roadmaps.index.db."""
+    return os.path.abspath(root).rstrip(os.sep) + '.index.db'
+
+
+def match_query(text):
+    """Строка поиска -> выражение MATCH (слова по префиксу, через AND) или None."""
+    words = _WORD.findall(text or '')
+    if not words:
+        return None
+    return ' '.join('"{}"*'.format(word.replace('"', '""')) for word in words)
+
+
+def _read(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    try:
+        return data.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+    except UnicodeDecodeError:
+        return ''
+
+
+class RoadmapSearch:
+    """Индекс FTS5 по файлам задач в каталоге `root`."""
+
+    def __init__(self, root, path=None):
+        self.root = root
+        self.path = path or default_path(root)
+        self._lock = threading.Lock()
+        self.available = self._create_tables()
+
+    def _conn(self):
+        return connect(self.path)
+
+    def _create_tables(self):
+        conn = self._conn()
+        cursor = conn.cursor()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS roadmap_files (
+                id INTEGER PRIMARY KEY,
+                project TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                size INTEGER,
+                mtime_ns INTEGER,
+                UNIQUE (project, filename)
+            )
+        ''')
+        try:
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS roadmap_fts USING fts5(
+                    project, filename, content,
+                    tokenize = 'unicode61 remove_diacritics 2',
+                    prefix = '2 3'
+                )
+            ''')
+        except Exception:
+            conn.rollback()
+            return False
+        conn.commit()
+        return True
+
+    # ---- обновление ----
+
+    def _put(self, cursor, project, filename, content, st):
+        cursor.execute('SELECT id FROM roadmap_files WHERE project = ? AND filename = ?', (project, filename))
+        row = cursor.fetchone()
+        if row is None:
+            cursor.execute('INSERT INTO roadmap_files (project, filename, size, mtime_ns) VALUES (?, ?, ?, ?)',
+                           (project, filename, st.st_size, st.st_mtime_ns))
+            file_id = cursor.lastrowid
+        else:
+            file_id = row[0]
+            cursor.execute('UPDATE roadmap_files SET size = ?, mtime_ns = ? WHERE id = ?',
+                           (st.st_size, st.st_mtime_ns, file_id))
+            cursor.execute('DELETE FROM roadmap_fts WHERE rowid = ?', (file_id,))
+        cursor.execute('INSERT INTO roadmap_fts (rowid, project, filename, content) VALUES (?, ?, ?, ?)',
+                       (file_id, project, os.path.splitext(filename)[0], content))
+
+    def _remove(self, cursor, file_ids):
+        for file_id in file_ids:
+            cursor.execute('DELETE FROM roadmap_fts WHERE rowid = ?', (file_id,))
+            cursor.execute('DELETE FROM roadmap_files WHERE id = ?', (file_id,))
+
+    def put(self, project, filename, content=None):
+        """Файл создан или перезаписан (content=None — прочитать с диска)."""
+        if not self.available:
+            return
+        path = os.path.join(self.root, project, filename)
+        st = os.stat(path)
+        if content is None:
+            content = _read(path)
+        with self._lock:
+            conn = self._conn()
+            with conn:
+                self._put(conn.cursor(), project, filename, content, st)
+
+    def remove(self, project, filename):
+        if not self.available:
+            return
+        with self._lock:
+            conn = self._conn()
+            with conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT id FROM roadmap_files WHERE project = ? AND filename = ?', (project, filename))
+                self._remove(cursor, [row[0] for row in cursor.fetchall()])
+
+    def rename(self, project, old, new):
+        """Файл переименован: содержимое не перечитывается."""
+        if not self.available:
+            return
+        st = os.stat(os.path.join(self.root, project, new))
+        with self._lock:
+            conn = self._conn()
+            with conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT id FROM roadmap_files WHERE project = ? AND filename = ?', (project, old))
+                row = cursor.fetchone()
+                if row is None:
+                    self._put(cursor, project, new, _read(os.path.join(self.root, project, new)), st)
+                    return
+                cursor.execute('UPDATE roadmap_files SET filename = ?, size = ?, mtime_ns = ? WHERE id = ?',
+                               (new, st.st_size, st.st_mtime_ns, row[0]))
+                cursor.execute('UPDATE roadmap_fts SET filename = ? WHERE rowid = ?',
+                               (os.path.splitext(new)[0], row[0]))
+
+    def rename_project(self, old, new):
+        if not self.available:
+            return
+        with self._lock:
+            conn = self._conn()
+            with conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    UPDATE roadmap_fts SET project = ?
+                    WHERE rowid IN (SELECT id FROM roadmap_files WHERE project = ?)
+                ''', (new, old))
+                cursor.execute('UPDATE roadmap_files SET project = ? WHERE project = ?', (new, old))
+
+    def reconcile(self):
+        """Сверить индекс с диском: новые и изменённые (size, mtime) файлы
+        перечитать, исчезнувшие — убрать. Возвращает (обновлено, удалено)."""
+        if not self.available:
+            return 0, 0
+        on_disk = {}
+        if os.path.isdir(self.root):
+            for proj in os.scandir(self.root):
+                if not proj.is_dir():
+                    continue
+                for de in os.scandir(proj.path):
+                    if de.is_file():
+                        on_disk[(proj.name, de.name)] = de.stat()
+        with self._lock:
+            conn = self._conn()
+            with conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT id, project, filename, size, mtime_ns FROM roadmap_files')
+                indexed = {(row[1], row[2]): row for row in cursor.fetchall()}
+                gone = [row[0] for key, row in indexed.items() if key not in on_disk]
+                self._remove(cursor, gone)
+                updated = 0
+                for (project, filename), st in on_disk.items():
+                    row = indexed.get((project, filename))
+                    if row is not None and (row[3], row[4]) == (st.st_size, st.st_mtime_ns):
+                        continue
+                    content = _read(os.path.join(self.root, project, filename))
+                    self._put(cursor, project, filename, content, st)
+                    updated += 1
+        return updated, len(gone)
+
+    # ---- поиск ----
+
+    def search(self, text, limit=DEFAULT_LIMIT, project=None):
+        """Задачи по запросу, лучшие сначала: проект, файл, подсвеченное имя и фрагмент текста."""
+        query = match_query(text)
+        if query is None or not self.available:
+            return []
+        limit = max(1, min(int(limit), MAX_LIMIT))
+        where, params = '', [query]
+        if project:
+            where = 'AND f.project = ?'
+            params.append(project)
+        cursor = self._conn().cursor()
+        cursor.execute(f'''
+            SELECT f.project, f.filename, f.size, f.mtime_ns,
+                   highlight(roadmap_fts, 1, ?, ?),
+                   snippet(roadmap_fts, 2, ?, ?, '…', 16),
+                   bm25(roadmap_fts, {', '.join(map(str, WEIGHTS))}) AS rank
+            FROM roadmap_fts
+            JOIN roadmap_files f ON f.id = roadmap_fts.rowid
+            WHERE roadmap_fts MATCH ? {where}
+            ORDER BY rank
+            LIMIT ?
+        ''', list(MARKERS) * 2 + params + [limit])
+        return [{'project': project_name, 'filename': filename, 'size': size, 'mtime': mtime,
+                 'highlight': mark_up(title), 'snippet': mark_up(snippet), 'rank': round(rank, 4)}
+                for project_name, filename, size, mtime, title, snippet, rank in cursor.fetchall()]
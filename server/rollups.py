@@ -0,0 +1,197 @@
+"""Предагрегированные итоги discipline_days по неделям, месяцам и за всё время.
+
+Таблица `period_rollups` хранит количество дней, суммы I,S,W,E,C,H,ST,$
+и по каждой характеристике число дней с непустым итогом (cnt_*: средние,
+как SQL AVG, не учитывают дни, где total_* = NULL — например, строки,
+созданные отметкой из планировщика):
+kind='week' (ключ — понедельник ISO-недели), kind='month' (ключ 'YYYY-MM'),
+kind='all' (ключ 'all'). Итоги поддерживаются дельтами в той же транзакции,
+что и запись дня: до изменения снимаем `snapshot_days`, после —
+`apply_day_changes`. Суммы за произвольный диапазон дат собираются из целых
+месяцев/недель и нескольких крайних дней (`range_totals`).
+"""
+
+from datetime import date, timedelta
+
+TOTAL_COLUMNS = ('total_i', 'total_s', 'total_w', 'total_e', 'total_c', 'total_h', 'total_st', 'total_money')
+SUM_COLUMNS = ('sum_i', 'sum_s', 'sum_w', 'sum_e', 'sum_c', 'sum_h', 'sum_st', 'sum_money')
+COUNT_COLUMNS = ('cnt_i', 'cnt_s', 'cnt_w', 'cnt_e', 'cnt_c', 'cnt_h', 'cnt_st', 'cnt_money')
+# SQL-выражения ключа периода по столбцу date (как у week_key и date_str[:7])
+PERIOD_KEY_SQL = {
+    'week': "date(date, '-' || ((CAST(strftime('%w', date) AS INTEGER) + 6) % 7) || ' days')",
+    'month': "strftime('%Y-%m', date)",
+}
+
+
+def create_tables(cursor):
+    """Создать period_rollups; True — если в старой таблице не было cnt_* (нужен rebuild)."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS period_rollups (
+            kind TEXT NOT NULL,
+            period_key TEXT NOT NULL,
+            days_count INTEGER DEFAULT 0,
+            sum_i REAL DEFAULT 0.0,
+            sum_s REAL DEFAULT 0.0,
+            sum_w REAL DEFAULT 0.0,
+            sum_e REAL DEFAULT 0.0,
+            sum_c REAL DEFAULT 0.0,
+            sum_h REAL DEFAULT 0.0,
+            sum_st REAL DEFAULT 0.0,
+            sum_money REAL DEFAULT 0.0,
+            cnt_i INTEGER DEFAULT 0,
+            cnt_s INTEGER DEFAULT 0,
+            cnt_w INTEGER DEFAULT 0,
+            cnt_e INTEGER DEFAULT 0,
+            cnt_c INTEGER DEFAULT 0,
+            cnt_h INTEGER DEFAULT 0,
+            cnt_st INTEGER DEFAULT 0,
+            cnt_money INTEGER DEFAULT 0,
+            PRIMARY KEY (kind, period_key)
+        )
+    ''')
+    cursor.execute('PRAGMA table_info(period_rollups)')
+    existing = {row[1] for row in cursor.fetchall()}
+    missing = [c for c in COUNT_COLUMNS if c not in existing]
+    for column in missing:
+        cursor.execute(f'ALTER TABLE period_rollups ADD COLUMN {column} INTEGER DEFAULT 0')
+    return bool(missing)
+
+
+def week_key(day):
+    """Понедельник ISO-недели для даты (date)."""
+    return (day - timedelta(days=day.weekday())).isoformat()
+
+
+def period_keys(date_str):
+    day = date.fromisoformat(date_str)
+    return (('week', week_key(day)), ('month', date_str[:7]), ('all', 'all'))
+
+
+def _day_totals(cursor, date_str):
+    cursor.execute('SELECT ' + ', '.join(TOTAL_COLUMNS) + ' FROM discipline_days WHERE date = ?', (date_str,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return tuple(None if v is None else float(v) for v in row)
+
+
+def snapshot_days(conn, dates):
+    """Итоги дней до изменения: {date: кортеж из 8 итогов (None — пустой) или None}."""
+    cursor = conn.cursor()
+    return {d: _day_totals(cursor, d) for d in dict.fromkeys(dates)}
+
+
+def apply_day_changes(conn, before):
+    """Применить к итогам разницу между `before` и текущими строками discipline_days."""
+    cursor = conn.cursor()
+    for date_str, old in before.items():
+        new = _day_totals(cursor, date_str)
+        if old == new:
+            continue
+        days_delta = (new is not None) - (old is not None)
+        old = old or (None,) * len(TOTAL_COLUMNS)
+        new = new or (None,) * len(TOTAL_COLUMNS)
+        deltas = tuple((n or 0.0) - (o or 0.0) for n, o in zip(new, old))
+        count_deltas = tuple((n is not None) - (o is not None) for n, o in zip(new, old))
+        columns = SUM_COLUMNS + COUNT_COLUMNS
+        cursor.executemany(
+            'INSERT INTO period_rollups (kind, period_key, days_count, ' + ', '.join(columns) + ')'
+            ' VALUES (?, ?, ?, ' + ', '.join('?' * len(columns)) + ')'
+            ' ON CONFLICT(kind, period_key) DO UPDATE SET days_count = days_count + excluded.days_count, '
+            + ', '.join(f'{c} = {c} + excluded.{c}' for c in columns),
+            [(kind, key, days_delta) + deltas + count_deltas for kind, key in period_keys(date_str)],
+        )
+
+
+def rebuild(conn):
+    """Перестроить period_rollups по discipline_days (в транзакции вызывающего)."""
+    cursor = conn.cursor()
+    cursor.execute('DELETE FROM period_rollups')
+    sums = ', '.join(f'COALESCE(SUM({c}), 0.0)' for c in TOTAL_COLUMNS)
+    counts = ', '.join(f'COUNT({c})' for c in TOTAL_COLUMNS)
+    for kind, key_expr in (
+        ('week', PERIOD_KEY_SQL['week']),
+        ('month', PERIOD_KEY_SQL['month']),
+        ('all', "'all'"),
+    ):
+        cursor.execute(
+            'INSERT INTO period_rollups (kind, period_key, days_count, '
+            + ', '.join(SUM_COLUMNS + COUNT_COLUMNS) + ') '
+            f"SELECT '{kind}', {key_expr}, COUNT(*), {sums}, {counts} FROM discipline_days GROUP BY 2"
+        )
+
+
+def _month_end(day):
+    nxt = date(day.year + (day.month == 12), day.month % 12 + 1, 1)
+    return nxt - timedelta(days=1)
+
+
+def _pieces(start, end):
+    """Разбить [start, end] на целые месяцы, целые недели и диапазоны отдельных дней."""
+    months, weeks, day_ranges = [], [], []
+    cur = start
+    while cur <= end:
+        if cur.day == 1 and _month_end(cur) <= end:
+            months.append(cur.isoformat()[:7])
+            cur = _month_end(cur) + timedelta(days=1)
+        elif cur.weekday() == 0 and cur + timedelta(days=6) <= end:
+            weeks.append(cur.isoformat())
+            cur += timedelta(days=7)
+        else:
+            if day_ranges and day_ranges[-1][1] == cur - timedelta(days=1):
+                day_ranges[-1][1] = cur
+            else:
+                day_ranges.append([cur, cur])
+            cur += timedelta(days=1)
+    return months, weeks, day_ranges
+
+
+def range_totals(conn, start, end):
+    """Количество дней, суммы и числа непустых итогов за [start, end] (date), O(число периодов)."""
+    cursor = conn.cursor()
+    days_count = 0
+    sums = [0.0] * len(SUM_COLUMNS)
+    counts = [0] * len(COUNT_COLUMNS)
+
+    def _add(row):
+        nonlocal days_count
+        if row is None:
+            return
+        days_count += int(row[0] or 0)
+        for i, v in enumerate(row[1:1 + len(SUM_COLUMNS)]):
+            sums[i] += float(v or 0.0)
+        for i, v in enumerate(row[1 + len(SUM_COLUMNS):]):
+            counts[i] += int(v or 0)
+
+    if start > end:
+        return days_count, sums, counts
+
+    months, weeks, day_ranges = _pieces(start, end)
+    select = ('SELECT COALESCE(SUM(days_count), 0), '
+              + ', '.join(f'SUM({c})' for c in SUM_COLUMNS + COUNT_COLUMNS))
+    for kind, keys in (('month', months), ('week', weeks)):
+        if keys:
+            cursor.execute(
+                select + ' FROM period_rollups WHERE kind = ? AND period_key IN (' + ', '.join('?' * len(keys)) + ')',
+                [kind] + keys,
+            )
+            _add(cursor.fetchone())
+    day_select = ('SELECT COUNT(*), ' + ', '.join(f'SUM({c})' for c in TOTAL_COLUMNS) + ', '
+                  + ', '.join(f'COUNT({c})' for c in TOTAL_COLUMNS))
+    for first, last in day_ranges:
+        cursor.execute(day_select + ' FROM discipline_days WHERE date BETWEEN ? AND ?',
+                       (first.isoformat(), last.isoformat()))
+        _add(cursor.fetchone())
+    return days_count, sums, counts
+
+
+def all_time_totals(conn):
+    """Итоги за всё время из строки kind='all': (дней, суммы, числа непустых итогов)."""
+    cursor = conn.cursor()
+    cursor.execute('SELECT days_count, ' + ', '.join(SUM_COLUMNS + COUNT_COLUMNS)
+                   + " FROM period_rollups WHERE kind = 'all'")
+    row = cursor.fetchone()
+    if row is None:
+        return 0, [0.0] * len(SUM_COLUMNS), [0] * len(COUNT_COLUMNS)
+    return (int(row[0] or 0), [float(v or 0.0) for v in row[1:1 + len(SUM_COLUMNS)]],
+            [int(v or 0) for v in row[1 + len(SUM_COLUMNS):]])
@@ -0,0 +1,244 @@
+"""Инкрементальный пересчёт стриков.
+
+Для каждой привычки храним непрерывные серии успешных дней в таблице
+`streak_runs` (habit_id, start_date, end_date, length). Изменение одного дня
+затрагивает только серию, в которую этот день входит (или соседние серии):
+день добавляется — серии склеиваются, день убирается — серия делится.
+Строка в `streaks` затем обновляется по индексам: самая длинная серия и
+последняя серия. Стоимость не зависит от длины истории.
+
+Полная перестройка (`rebuild_all`) остаётся командой восстановления; серии
+всех привычек она считает за один векторный проход (NumPy, если установлен).
+"""
+
+from datetime import date, timedelta
+
+try:
+    import numpy as np
+except ImportError:  # полная перестройка работает и без NumPy, медленнее
+    np = None
+
+_EPOCH = date(1970, 1, 1)
+
+
+def _iso(day):
+    return (_EPOCH + timedelta(days=day)).isoformat()
+
+
+def _shift(date_str, days):
+    return (date.fromisoformat(date_str) + timedelta(days=days)).isoformat()
+
+
+def _has_success(cursor, habit_id, date_str):
+    cursor.execute(
+        'SELECT 1 FROM completed_habits WHERE habit_id = ? AND date = ? AND success = 1 LIMIT 1',
+        (habit_id, date_str),
+    )
+    return cursor.fetchone() is not None
+
+
+def _run_containing(cursor, habit_id, date_str):
+    cursor.execute('''
+        SELECT start_date, end_date FROM streak_runs
+        WHERE habit_id = ? AND start_date <= ?
+        ORDER BY start_date DESC LIMIT 1
+    ''', (habit_id, date_str))
+    row = cursor.fetchone()
+    if row and row[1] >= date_str:
+        return row[0], row[1]
+    return None
+
+
+def _insert_run(cursor, habit_id, start, end):
+    length = (date.fromisoformat(end) - date.fromisoformat(start)).days + 1
+    cursor.execute(
+        'INSERT INTO streak_runs (habit_id, start_date, end_date, length) VALUES (?, ?, ?, ?)',
+        (habit_id, start, end, length),
+    )
+
+
+def _add_day(cursor, habit_id, date_str):
+    start = end = date_str
+    cursor.execute('SELECT start_date FROM streak_runs WHERE habit_id = ? AND end_date = ?',
+                   (habit_id, _shift(date_str, -1)))
+    left = cursor.fetchone()
+    if left:
+        start = left[0]
+        cursor.execute('DELETE FROM streak_runs WHERE habit_id = ? AND start_date = ?', (habit_id, start))
+    cursor.execute('SELECT end_date FROM streak_runs WHERE habit_id = ? AND start_date = ?',
+                   (habit_id, _shift(date_str, 1)))
+    right = cursor.fetchone()
+    if right:
+        end = right[0]
+        cursor.execute('DELETE FROM streak_runs WHERE habit_id = ? AND start_date = ?',
+                       (habit_id, _shift(date_str, 1)))
+    _insert_run(cursor, habit_id, start, end)
+
+
+def _remove_day(cursor, habit_id, date_str, run):
+    start, end = run
+    cursor.execute('DELETE FROM streak_runs WHERE habit_id = ? AND start_date = ?', (habit_id, start))
+    if start < date_str:
+        _insert_run(cursor, habit_id, start, _shift(date_str, -1))
+    if date_str < end:
+        _insert_run(cursor, habit_id, _shift(date_str, 1), end)
+
+
+def refresh_streak_row(cursor, habit_id):
+    """Обновить строку `streaks` привычки по её сериям (два индексных запроса)."""
+    cursor.execute('''
+        SELECT end_date, length FROM streak_runs
+        WHERE habit_id = ? ORDER BY end_date DESC LIMIT 1
+    ''', (habit_id,))
+    last = cursor.fetchone()
+    if not last:
+        cursor.execute('''
+            INSERT OR REPLACE INTO streaks (habit_id, current_streak, longest_streak, last_date, success_days, first_date)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (habit_id, 0, 0, None, 0, None))
+        return
+    cursor.execute('SELECT MAX(length), SUM(length), MIN(start_date) FROM streak_runs WHERE habit_id = ?',
+                   (habit_id,))
+    longest, success_days, first_date = cursor.fetchone()
+    cursor.execute('''
+        INSERT OR REPLACE INTO streaks (habit_id, current_streak, longest_streak, last_date, success_days, first_date)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (habit_id, last[1], longest or 0, last[0], success_days or 0, first_date))
+
+
+def sync_day(conn, date_str, habit_ids):
+    """Привести серии привычек `habit_ids` в соответствие с completed_habits за `date_str`.
+
+    Работает в транзакции вызывающего (commit не делает). Возвращает множество
+    привычек, у которых состояние дня действительно изменилось.
+    """
+    cursor = conn.cursor()
+    changed = set()
+    for habit_id in habit_ids:
+        done = _has_success(cursor, habit_id, date_str)
+        run = _run_containing(cursor, habit_id, date_str)
+        if done and run is None:
+            _add_day(cursor, habit_id, date_str)
+        elif not done and run is not None:
+            _remove_day(cursor, habit_id, date_str, run)
+        else:
+            continue
+        refresh_streak_row(cursor, habit_id)
+        changed.add(habit_id)
+    return changed
+
+
+def success_habits_on(conn, date_str):
+    """Множество привычек с успешным выполнением за день."""
+    cursor = conn.cursor()
+    cursor.execute('SELECT DISTINCT habit_id FROM completed_habits WHERE date = ? AND success = 1', (date_str,))
+    return {row[0] for row in cursor.fetchall()}
+
+
+def _success_rows(cursor):
+    """(habit_id, date) успешных выполнений — последовательным проходом по таблице.
+
+    Сортировка и удаление повторов — уже в памяти: DISTINCT/ORDER BY в SQL
+    шёл бы по индексу habit_id с обращением к строке таблицы на каждую запись.
+    """
+    cursor.execute('SELECT habit_id, date FROM completed_habits WHERE success = 1')
+    return cursor.fetchall()
+
+
+def _runs_vectorized(rows):
+    """Серии и строки стриков всех привычек за один проход NumPy.
+
+    Успешные дни — отсортированные массивы (привычка, номер дня); граница
+    серии — смена привычки или разрыв в днях. По границам сразу получаются
+    начала, концы и длины всех серий, по группам привычек (reduceat) —
+    самая длинная серия, число успешных дней, первая и последняя серия.
+    """
+    try:
+        day = np.array([r[1] for r in rows], dtype='datetime64[D]').astype(np.int64)
+    except ValueError:
+        # даты не в формате YYYY-MM-DD — разбираем построчно
+        return _runs_python(rows)
+    habit = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+    order = np.lexsort((day, habit))
+    habit, day = habit[order], day[order]
+    fresh = np.ones(len(day), dtype=bool)
+    fresh[1:] = (habit[1:] != habit[:-1]) | (day[1:] != day[:-1])
+    habit, day = habit[fresh], day[fresh]
+
+    breaks = np.ones(len(day), dtype=bool)
+    breaks[1:] = (habit[1:] != habit[:-1]) | (day[1:] != day[:-1] + 1)
+    starts = np.flatnonzero(breaks)
+    ends = np.append(starts[1:], len(day)) - 1
+    run_habit, run_start, run_end = habit[starts], day[starts], day[ends]
+    length = run_end - run_start + 1
+
+    group = np.flatnonzero(np.append(True, run_habit[1:] != run_habit[:-1]))
+    last = np.append(group[1:], len(run_habit)) - 1
+    start_iso = np.datetime_as_string(run_start.astype('datetime64[D]')).tolist()
+    end_iso = np.datetime_as_string(run_end.astype('datetime64[D]')).tolist()
+
+    runs = list(zip(run_habit.tolist(), start_iso, end_iso, length.tolist()))
+    streak_rows = {}
+    for h, g, i, longest, total in zip(run_habit[group].tolist(), group.tolist(), last.tolist(),
+                                       np.maximum.reduceat(length, group).tolist(),
+                                       np.add.reduceat(length, group).tolist()):
+        # (current_streak, longest_streak, last_date, success_days, first_date)
+        streak_rows[h] = (runs[i][3], longest, end_iso[i], total, start_iso[g])
+    return runs, streak_rows
+
+
+def _runs_python(rows):
+    """То же без NumPy: сортировка пар (привычка, номер дня) и один проход."""
+    pairs = set()
+    for habit_id, d in rows:
+        try:
+            pairs.add((habit_id, (date.fromisoformat(d) - _EPOCH).days))
+        except (TypeError, ValueError):
+            continue
+    pairs = sorted(pairs)
+    runs, streak_rows = [], {}
+    i = 0
+    while i < len(pairs):
+        habit, start = pairs[i]
+        end = start
+        i += 1
+        while i < len(pairs) and pairs[i][0] == habit and pairs[i][1] == end + 1:
+            end = pairs[i][1]
+            i += 1
+        length = end - start + 1
+        runs.append((habit, _iso(start), _iso(end), length))
+        prev = streak_rows.get(habit)
+        if prev is None:
+            streak_rows[habit] = (length, length, _iso(end), length, _iso(start))
+        else:
+            streak_rows[habit] = (length, max(prev[1], length), _iso(end), prev[3] + length, prev[4])
+    return runs, streak_rows
+
+
+def rebuild_all(conn):
+    """Полностью перестроить streak_runs и streaks по истории (в транзакции вызывающего).
+
+    Успешные дни всех привычек читаются одним запросом, серии и строки
+    стриков считаются разом и пишутся двумя executemany.
+    """
+    cursor = conn.cursor()
+    success = _success_rows(cursor)
+    if not success:
+        runs, rows = [], {}
+    elif np is not None:
+        runs, rows = _runs_vectorized(success)
+    else:
+        runs, rows = _runs_python(success)
+
+    cursor.execute('DELETE FROM streak_runs')
+    cursor.executemany(
+        'INSERT INTO streak_runs (habit_id, start_date, end_date, length) VALUES (?, ?, ?, ?)',
+        runs,
+    )
+
+    cursor.execute('SELECT id FROM habits WHERE is_active = 1')
+    empty = (0, 0, None, 0, None)
+    cursor.executemany('''
+        INSERT OR REPLACE INTO streaks (habit_id, current_streak, longest_streak, last_date, success_days, first_date)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', [(habit_id,) + rows.get(habit_id, empty) for (habit_id,) in cursor.fetchall()])
@@ -0,0 +1,113 @@
+"""Метки изменений данных и условные ответы (ETag / 304).
+
+Каждая область данных (привычки, сочетания, дни, планировщик) имеет метку
+изменения — 64-битное число в маленьком файле рядом с БД (`habits.db-stamps`),
+отображённом в память через mmap. Чтение метки — обращение к памяти, без
+SQLite и без системных вызовов; файл общий для всех процессов-воркеров.
+Маршруты записи вызывают `bump(...)` после commit, GET-маршруты с
+`@conditional(...)` отдают ETag и отвечают 304 на совпадающий If-None-Match,
+не выполняя сам обработчик.
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+from email.utils import formatdate
+from functools import wraps
+
+from . import connection
+
+SCOPES = ('habits', 'combinations', 'days', 'planner')
+_SLOT = struct.Struct('<q')
+_SIZE = _SLOT.size * 8
+
+_maps = {}
+_lock = threading.Lock()
+
+
+def _stamps_path():
+    return os.path.abspath(connection.db_path()) + '-stamps'
+
+
+def _map():
+    path = _stamps_path()
+    mm = _maps.get(path)
+    if mm is not None:
+        return mm
+    with _lock:
+        mm = _maps.get(path)
+        if mm is None:
+            if not os.path.exists(path) or os.path.getsize(path) < _SIZE:
+                # новые метки: текущее время, чтобы ETag после пересоздания файла не совпадали со старыми
+                now = time.time_ns()
+                with open(path, 'wb') as f:
+                    f.write(b''.join(_SLOT.pack(now) for _ in range(_SIZE // _SLOT.size)))
+            with open(path, 'r+b') as f:
+                mm = mmap.mmap(f.fileno(), _SIZE)
+            _maps[path] = mm
+    return mm
+
+
+def stamp(scope):
+    """Текущая метка области данных."""
+    return _SLOT.unpack_from(_map(), SCOPES.index(scope) * _SLOT.size)[0]
+
+
+def bump(*scopes):
+    """Отметить изменение областей (вызывать после commit)."""
+    mm = _map()
+    with _lock:
+        for scope in scopes:
+            offset = SCOPES.index(scope) * _SLOT.size
+            prev = _SLOT.unpack_from(mm, offset)[0]
+            _SLOT.pack_into(mm, offset, max(prev + 1, time.time_ns()))
+
+
+def bumps(*scopes):
+    """Декоратор маршрута записи: после успешного ответа отметить изменение областей."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            result = view(*args, **kwargs)
+            status = result[1] if isinstance(result, tuple) and len(result) > 1 else getattr(result, 'status_code', 200)
+            if int(status) < 400:
+                bump(*scopes)
+            return result
+        return wrapper
+    return decorator
+
+
+def etag_for(scopes, extra=''):
+    stamps = '-'.join(str(stamp(scope)) for scope in scopes)
+    return hashlib.sha1(f'{stamps}|{extra}'.encode('utf-8')).hexdigest()[:20]
+
+
+def conditional(*scopes, key=None):
+    """Декоратор GET-маршрута: сильный ETag по меткам `scopes` и ответ 304 без обращения к БД.
+
+    `key` — функция без аргументов, добавляющая к ETag то, от чего ещё зависит
+    ответ (по умолчанию — путь с параметрами запроса).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            from flask import make_response, request
+
+            extra = key() if key else request.full_path
+            tag = etag_for(scopes, extra)
+            last_modified = formatdate(max(stamp(s) for s in scopes) / 1e9, usegmt=True)
+            if tag in request.if_none_match:
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(tag)
+            response.headers['Last-Modified'] = last_modified
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
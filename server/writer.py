@@ -0,0 +1,190 @@
+"""Единственный писатель: очередь записей в SQLite с групповым commit.
+
+Запись оформляется как единица работы — функция `fn(conn, *args)`, которая
+пишет через переданное соединение и сама commit не делает. Единицы
+передаются в очередь (`submit` возвращает Future, `write` ждёт результат),
+поток-писатель забирает все ожидающие единицы (до `max_batch`) и выполняет
+их в одной транзакции BEGIN IMMEDIATE: каждая — внутри своего SAVEPOINT,
+так что ошибка одной откатывает только её. После общего COMMIT вызывающие
+получают результаты. Чтения идут через свои соединения и писателя не ждут.
+
+Очередь своя у каждого процесса; между процессами-воркерами по-прежнему
+действует блокировка SQLite (busy_timeout).
+
+Единицы профилируемого запроса (server.profiling) выполняются не в потоке
+писателя, а сразу в потоке запроса — отдельной транзакцией на своём
+соединении: cProfile видит только поток, в котором включён.
+"""
+
+import os
+import queue
+import threading
+from concurrent.futures import Future
+
+from . import metrics
+from .connection import connect, db_path, open_connection
+
+_STOP = object()
+
+
+class WriteQueue:
+    """Поток-писатель с очередью единиц работы для одного файла БД."""
+
+    def __init__(self, path=None, max_batch=64, max_delay=0.0):
+        # max_delay > 0 — ждать догоняющие единицы (латентность в обмен на размер пачки);
+        # по умолчанию пачку составляет то, что накопилось, пока шла предыдущая транзакция
+        self.path = path or db_path()
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.batches = 0
+        self.units = 0
+        self._queue = queue.Queue()
+        self._inline = threading.local()
+        self._thread = threading.Thread(target=self._loop, name='sqlite-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, fn, *args, **kwargs):
+        """Поставить единицу работы в очередь; результат — Future."""
+        future = Future()
+        conn = self._unit_connection()
+        if conn is not None:
+            # вложенная запись из единицы работы — в текущей транзакции
+            try:
+                future.set_result(fn(conn, *args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        stats = metrics.current()
+        if stats is not None and stats.profiling:
+            self._run_inline((fn, args, kwargs, future, stats))
+            return future
+        self._queue.put((fn, args, kwargs, future, stats))
+        return future
+
+    def write(self, fn, *args, **kwargs):
+        """Выполнить единицу работы и вернуть её результат (или поднять её исключение)."""
+        return self.submit(fn, *args, **kwargs).result()
+
+    def _unit_connection(self):
+        """Соединение единицы работы, уже идущей в этом потоке, или None."""
+        if threading.current_thread() is self._thread:
+            return connect(self.path)
+        return getattr(self._inline, 'conn', None)
+
+    def _run_inline(self, item):
+        """Единица профилируемого запроса — в его потоке, своей транзакцией."""
+        stats = metrics.current()
+        conn = self._inline.conn = open_connection(self.path)
+        try:
+            self._run_batch(conn, [item])
+        finally:
+            self._inline.conn = None
+            conn.close()
+            # _run_batch отвязывает счётчики после единицы — вернуть их запросу
+            metrics.bind(stats)
+
+    def stop(self):
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _take_batch(self):
+        first = self._queue.get()
+        if first is _STOP:
+            return None
+        batch = [first]
+        while len(batch) < self.max_batch:
+            try:
+                item = self._queue.get(timeout=self.max_delay) if self.max_delay else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _loop(self):
+        conn = connect(self.path)
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                break
+            self._run_batch(conn, batch)
+
+    def _run_batch(self, conn, batch):
+        outcomes = []
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.execute('BEGIN IMMEDIATE')
+            for fn, args, kwargs, future, stats in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                metrics.bind(stats)
+                conn.execute('SAVEPOINT unit')
+                try:
+                    result = fn(conn, *args, **kwargs)
+                    conn.execute('RELEASE unit')
+                    outcomes.append((future, result, None))
+                except BaseException as e:
+                    conn.execute('ROLLBACK TO unit')
+                    conn.execute('RELEASE unit')
+                    outcomes.append((future, None, e))
+                finally:
+                    metrics.bind(None)
+            conn.commit()
+        except BaseException as e:
+            # не удалось начать или зафиксировать транзакцию — ошибка у всех единиц пачки
+            if conn.in_transaction:
+                conn.rollback()
+            for fn, args, kwargs, future, stats in batch:
+                if not future.done() and (future.running() or future.set_running_or_notify_cancel()):
+                    future.set_exception(e)
+            return
+        self.batches += 1
+        self.units += len(outcomes)
+        for fn, args, kwargs, future, stats in batch:
+            # общий COMMIT пачки засчитывается каждому запросу
+            if stats is not None:
+                stats.commits += 1
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+_writers = {}
+_lock = threading.Lock()
+
+
+def get_writer(path=None):
+    """Писатель процесса для файла БД (создаётся при первом обращении)."""
+    path = path or db_path()
+    writer = _writers.get(path)
+    if writer is None:
+        with _lock:
+            writer = _writers.get(path)
+            if writer is None:
+                writer = _writers[path] = WriteQueue(path)
+    return writer
+
+
+def write(fn, *args, **kwargs):
+    """Выполнить единицу работы через писателя текущей БД."""
+    return get_writer().write(fn, *args, **kwargs)
+
+
+def submit(fn, *args, **kwargs):
+    return get_writer().submit(fn, *args, **kwargs)
+
+
+def _reset_after_fork():
+    # потоки не переживают fork: в дочернем процессе писатель создаётся заново
+    global _lock
+    _writers.clear()
+    _lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -1,4 +1,4 @@
 @echo off
 cd /d C:\Users\AR1\Documents\v8\test
 call .venv\Scripts\activate.bat
-python app2.py
\ No newline at end of file
+python serve.py
\ No newline at end of file
@@ -85,13 +85,7 @@ function renderRoadmap(project, tasks){
     // each x == 1/3 of task completion
     const totalParts = tasks.length * 3 || 1;
     let gained = 0;
-    tasks.forEach(t=>{
-      const name = t.filename;
-      const m = name.match(/(?:\s([x]+))(?:\s|\.|$)/);
-      const xs = m ? (m[1] || '') : '';
-      const count = Math.min(3, xs.length);
-      gained += count;
-    });
+    tasks.forEach(t=>{ gained += Math.min(3, t.x_count || 0); });
     perc = Math.round((gained / totalParts) * 100);
   } else {
     const total = tasks.length || 1;
@@ -119,10 +113,8 @@ function renderRoadmap(project, tasks){
     // training style
     const isTraining = project.startsWith('!');
     if(isTraining){
-      // detect x count
-      const m = t.filename.match(/(?:\s([x]+))(?:\s|\.|$)/);
-      const xs = m ? (m[1] || '') : '';
-      const xcount = xs.length;
+      // число повторений — из метаданных задачи (planner_tasks)
+      const xcount = t.x_count || 0;
       if(xcount > 0 && xcount < 3){
         wrapper.classList.add('training');
         wrapper.classList.add('pending');
@@ -145,12 +137,9 @@ function renderRoadmap(project, tasks){
     
     const title = document.createElement('div');
     title.className = 'title';
-    let titleText = t.filename.replace(/\.[^/.]+$/, '');
-    if(t.completed){
-      const m = titleText.match(/^(.*)\s(\d{4}-\d{2}-\d{2})\sвыполнено$/i);
-      if(m){
-        titleText = m[1] + ' (' + m[2] + ')';
-      }
+    let titleText = t.core || t.filename.replace(/\.[^/.]+$/, '');
+    if(t.completed && t.date){
+      titleText += ' (' + t.date + ')';
     }
     title.textContent = titleText;
     textSection.appendChild(title);
@@ -200,12 +189,25 @@ function renderRoadmap(project, tasks){
   }
 }
 
+// Содержимое задачи грузится по требованию (список проекта содержит только метаданные)
+async function loadTaskContent(project, task){
+  if(task.content !== undefined) return task.content;
+  const r = await fetch('/api/planner/project/'+encodeURIComponent(project)+'/content/'+encodeURIComponent(task.filename));
+  task.content = r.ok ? await r.text() : '';
+  return task.content;
+}
+
 function showDetail(project, task, nodeEl){
   document.querySelectorAll('.nodes-col .node').forEach(n=>n.classList.remove('active'));
   nodeEl.classList.add('active');
   document.getElementById('detailTitle').textContent = task.filename;
-  document.getElementById('detailContent').textContent = task.content || '(пусто)';
-  document.getElementById('detailTextarea').value = task.content || '';
+  document.getElementById('detailContent').textContent = '…';
+  document.getElementById('detailTextarea').value = '';
+  loadTaskContent(project, task).then(content=>{
+    if(document.getElementById('detailTitle').textContent !== task.filename) return;
+    document.getElementById('detailContent').textContent = content || '(пусто)';
+    document.getElementById('detailTextarea').value = content || '';
+  });
   // fill deltas with zeros
   ['I','S','W','E','C','H','ST','$'].forEach(k=>{ const el = document.getElementById('d'+(k==='$'?'$':k)); if(el) el.value=''; });
 
@@ -271,5 +273,39 @@ window.addEventListener('load', ()=>{
   };
 });
 
-document.getElementById('refreshProjects').addEventListener('click', loadProjects);
+// Поиск по всем проектам (/api/planner/search): запрос после паузы во вводе
+let plannerSearchTimer = null;
+let plannerSearchSeq = 0;
+
+async function runPlannerSearch(){
+  const q = document.getElementById('plannerSearch').value.trim();
+  const el = document.getElementById('searchResults');
+  const seq = ++plannerSearchSeq;
+  if(!q){ el.innerHTML = ''; return; }
+  const res = await fetchJSON('/api/planner/search?limit=30&q='+encodeURIComponent(q));
+  if(seq !== plannerSearchSeq || res.status !== 'success') return;
+  el.innerHTML = '';
+  if(!res.data.length){ el.innerHTML = '<li class="small">Ничего не найдено</li>'; return; }
+  res.data.forEach(item=>{
+    const li = document.createElement('li');
+    li.style.cursor = 'pointer';
+    // highlight и snippet — экранированный сервером HTML с <mark>, проект — обычный текст
+    li.innerHTML = `<div><b>${item.highlight}</b> <span class="small"></span></div>`
+      + (item.snippet && item.snippet.includes('<mark>') ? `<div class="small">${item.snippet}</div>` : '');
+    li.querySelector('span.small').textContent = item.project.replace(/^!/, '');
+    li.onclick = ()=>loadProject(item.project);
+    el.appendChild(li);
+  });
+}
+
+document.getElementById('plannerSearch').addEventListener('input', ()=>{
+  clearTimeout(plannerSearchTimer);
+  plannerSearchTimer = setTimeout(runPlannerSearch, 150);
+});
+
+// «Обновить» подхватывает и файлы, добавленные в папки мимо планировщика
+document.getElementById('refreshProjects').addEventListener('click', async ()=>{
+  await fetchJSON('/api/planner/sync', { method:'POST' });
+  await loadProjects();
+});
 window.addEventListener('load', ()=>{ loadProjects(); });
@@ -31,7 +31,7 @@ function renderTasks(tasks){
     const li = document.createElement('li');
     const nameSpan = document.createElement('span');
     nameSpan.className='name';
-    nameSpan.textContent = t.filename.replace(/\.[^/.]+$/,'');
+    nameSpan.textContent = t.core || t.filename.replace(/\.[^/.]+$/,'');
     if(t.completed) li.classList.add('completed');
     nameSpan.onclick = ()=>{ selectTask(t); };
     li.appendChild(nameSpan);
@@ -45,11 +45,22 @@ function renderTasks(tasks){
 
 let currentTask = null;
 
+// Содержимое задачи грузится по требованию (список содержит только метаданные)
+async function loadTaskContent(task){
+  if(task.content !== undefined) return task.content;
+  const r = await fetch('/api/planner/project/tasks/content/'+encodeURIComponent(task.filename));
+  task.content = r.ok ? await r.text() : '';
+  return task.content;
+}
+
 function selectTask(task){
   currentTask = task;
   document.getElementById('taskDetail').style.display='block';
   document.getElementById('detailName').textContent = task.filename.replace(/\.[^/.]+$/,'');
-  document.getElementById('detailContent').value = task.content || '';
+  document.getElementById('detailContent').value = '';
+  loadTaskContent(task).then(content=>{
+    if(currentTask === task) document.getElementById('detailContent').value = content || '';
+  });
   ['I','S','W','E','C','H','ST','$'].forEach(k=>{ const el=document.getElementById('d'+(k==='$'?'$':k)); if(el) el.value=''; });
 }
 
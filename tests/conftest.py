@@ -0,0 +1,74 @@
+"""Общие фикстуры: временная БД и приложение на ней."""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from server.connection import close_thread_connections, connect  # noqa: E402
+from server.db import init_db  # noqa: E402
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / 'habits.db')
+    init_db(path)
+    yield path
+    close_thread_connections()
+
+
+@pytest.fixture
+def conn(db_path):
+    """Соединение с пустой БД со схемой (commit — на усмотрение теста)."""
+    return connect(db_path)
+
+
+@pytest.fixture
+def app(tmp_path):
+    """app2 на временной БД и пустой папке дорожных карт."""
+    import app2
+    roadmaps = tmp_path / 'roadmaps'
+    roadmaps.mkdir()
+    application = app2.create_app({
+        'DATABASE': str(tmp_path / 'habits.db'),
+        'ROADMAPS_DIR': str(roadmaps),
+        'ROADMAP_INDEX_DB': str(tmp_path / 'roadmaps.index.db'),
+        'TESTING': True,
+    })
+    yield application
+    close_thread_connections()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def habit_ids(client):
+    """Четыре привычки в справочнике."""
+    ids = []
+    for name, category in (('Бег', 'Спорт'), ('Чтение', 'Ум'), ('Медитация', 'Ум'), ('Отжимания', 'Спорт')):
+        res = client.post('/api/habits', json={'name': name, 'category': category, 'i': 1, 's': 2})
+        ids.append(res.get_json()['habit_id'])
+    return ids
+
+
+@pytest.fixture
+def save_day(client):
+    """save_day(date, {habit_id: success}, method='POST'|'PATCH'|'DIFF', **поля дня) -> JSON ответа."""
+    def _save(day, done, method='POST', **fields):
+        body = {'date': day, 'day_number': 1, 'friction_index': 1,
+                'habits': [{'habit_id': habit_id, 'success': success, 'quantity': 1, 'i': 1.0, 's': 0.5}
+                           for habit_id, success in done.items()],
+                'totals': {'I': float(len(done)), 'S': 1.0}}
+        body.update(fields)
+        if method == 'PATCH':
+            res = client.patch(f'/api/completions/{day}', json=body)
+        else:
+            res = client.post('/api/completions', json=dict(body, diff=method == 'DIFF'))
+        assert res.status_code == 200, res.get_json()
+        return res.get_json()
+    return _save
@@ -0,0 +1,58 @@
+"""ETag / 304: метки областей данных меняются при записи и только при ней."""
+
+DAY = '2025-04-01'
+
+
+def _etag(client, url):
+    res = client.get(url)
+    assert res.status_code == 200
+    assert res.headers['ETag']
+    return res.headers['ETag']
+
+
+def _status(client, url, etag):
+    return client.get(url, headers={'If-None-Match': etag}).status_code
+
+
+def test_unchanged_data_answers_304(client, habit_ids):
+    etag = _etag(client, '/api/habits')
+    assert _status(client, '/api/habits', etag) == 304
+    # другой запрос — другой ETag
+    assert _etag(client, '/api/habits?category=Ум') != etag
+
+
+def test_write_invalidates_its_scope(client, habit_ids, save_day):
+    habits = _etag(client, '/api/habits')
+    day = _etag(client, f'/api/completions/{DAY}')
+    assert _status(client, f'/api/completions/{DAY}', day) == 304
+
+    save_day(DAY, {habit_ids[0]: True})
+    assert _status(client, f'/api/completions/{DAY}', day) == 200
+
+    client.post('/api/habits', json={'name': 'Планка', 'category': 'Спорт'})
+    assert _status(client, '/api/habits', habits) == 200
+
+
+def test_other_scope_and_failed_writes_keep_etag(client, habit_ids):
+    etag = _etag(client, '/api/habits')
+
+    assert client.post('/api/planner/create_project', json={'name': 'Проект'}).status_code == 200
+    assert _status(client, '/api/habits', etag) == 304
+
+    # дубликат привычки — 400, метка не меняется
+    assert client.post('/api/habits', json={'name': 'Бег', 'category': 'Спорт'}).status_code == 400
+    assert _status(client, '/api/habits', etag) == 304
+
+
+def test_patch_and_day_move_invalidate_days(client, habit_ids, save_day):
+    save_day(DAY, {habit_ids[0]: True})
+    etag = _etag(client, '/api/stats/totals')
+    assert _status(client, '/api/stats/totals', etag) == 304
+
+    save_day(DAY, {habit_ids[0]: False}, method='PATCH')
+    assert _status(client, '/api/stats/totals', etag) == 200
+
+    etag = _etag(client, '/api/stats/totals')
+    assert client.post('/api/completions/change_date',
+                       json={'old_date': DAY, 'new_date': '2025-04-02'}).status_code == 200
+    assert _status(client, '/api/stats/totals', etag) == 200
@@ -0,0 +1,114 @@
+"""Выгрузка (/api/export/*) -> импорт (/api/import) в пустую базу: история совпадает."""
+
+import pytest
+
+from server.connection import connect
+
+DAYS = ('2025-05-01', '2025-05-02', '2025-05-03', '2025-05-05')
+
+
+def _history(db_path):
+    conn = connect(db_path)
+    completions = conn.execute('''
+        SELECT ch.date, h.name, h.category, ch.quantity, ch.success, ch.i, ch.s, ch.day_number
+        FROM completed_habits ch JOIN habits h ON h.id = ch.habit_id ORDER BY ch.date, h.name
+    ''').fetchall()
+    days = conn.execute('SELECT date, day_number, state, total_i, total_s, total_st, friction_index '
+                        'FROM discipline_days ORDER BY date').fetchall()
+    streaks = conn.execute('''
+        SELECT h.name, s.current_streak, s.longest_streak, s.last_date, s.success_days
+        FROM streaks s JOIN habits h ON h.id = s.habit_id WHERE s.success_days > 0 ORDER BY h.name
+    ''').fetchall()
+    conn.rollback()
+    return completions, days, streaks
+
+
+@pytest.fixture
+def source(app, client, habit_ids, save_day):
+    a, b, c, d = habit_ids
+    save_day(DAYS[0], {a: True, b: True}, state='ok', friction_index=3)
+    save_day(DAYS[1], {a: True, c: False})
+    save_day(DAYS[2], {a: True, b: True, d: True}, thoughts='строка, с "кавычками"\nи переносом')
+    save_day(DAYS[3], {b: False})
+    return _history(app.config['DATABASE'])
+
+
+@pytest.mark.parametrize('fmt', ['ndjson', 'csv'])
+def test_round_trip(app, client, tmp_path, source, fmt):
+    exported = {}
+    for kind in ('completions', 'days'):
+        res = client.get(f'/api/export/{kind}?format={fmt}')
+        assert res.status_code == 200
+        exported[kind] = res.get_data()
+        res.close()
+
+    import app2
+    target = str(tmp_path / 'target.db')
+    app2.create_app(dict(app.config, DATABASE=target))
+    fresh = app.test_client()
+    for kind in ('completions', 'days'):
+        res = fresh.post(f'/api/import?format={fmt}', data=exported[kind])
+        assert res.get_json()['status'] == 'success', res.get_json()
+
+    assert _history(target) == source
+
+
+def test_export_filters(client, source, habit_ids):
+    res = client.get(f'/api/export/completions?format=ndjson&start={DAYS[1]}&end={DAYS[2]}&habit_id={habit_ids[0]}')
+    lines = res.get_data().decode('utf-8').splitlines()
+    res.close()
+    assert len(lines) == 2
+    assert all('"Бег"' in line for line in lines)
+
+
+def _rows(db_path, sql):
+    conn = connect(db_path)
+    rows = conn.execute(sql).fetchall()
+    conn.rollback()
+    return rows
+
+
+def test_bad_rows_are_skipped_before_writing(app, client):
+    csv_body = ('date,habit_name,category,quantity,success,i,s,day_number\n'
+                '2025-06-01,Йога,Спорт,1,1,1,1,1\n'
+                '2025-06-02,Йога,Спорт,1,1,1,1,abc\n'
+                'not-a-date,Йога,Спорт,1,1,1,1,3\n'
+                '2025-02-30,Йога,Спорт,1,1,1,1,4\n'
+                '2025-06-03,Йога,Спорт,x,1,1,1,5\n'
+                '2025-06-04,Йога,Спорт,1,1,1,1,6\n')
+    res = client.post('/api/import?format=csv', data=csv_body.encode('utf-8'))
+    body = res.get_json()
+    assert body['status'] == 'success', body
+    assert (body['completions'], body['days'], body['skipped']) == (2, 2, 4)
+
+    db_path = app.config['DATABASE']
+    assert _rows(db_path, 'SELECT date, day_number FROM discipline_days ORDER BY date') == [
+        ('2025-06-01', 1), ('2025-06-04', 6)]
+    assert _rows(db_path, 'SELECT success_days FROM streaks WHERE success_days > 0') == [(2,)]
+
+
+def test_failed_batch_leaves_imported_days_finished(app):
+    from server import importer, rollups
+    db_path = app.config['DATABASE']
+    conn = connect(db_path)
+    conn.execute("CREATE TRIGGER fail_day BEFORE INSERT ON completed_habits WHEN NEW.date = '2025-06-02' "
+                 "BEGIN SELECT RAISE(ABORT, 'сбой записи'); END")
+    conn.commit()
+
+    records = [{'date': '2025-06-01', 'habit_name': 'Йога', 'category': 'Спорт', 'i': 1, 'day_number': 1},
+               {'date': '2025-06-02', 'habit_name': 'Плавание', 'category': 'Спорт', 'i': 1, 'day_number': 2}]
+    job = importer.Importer(batch_rows=1)
+    with pytest.raises(Exception, match='сбой записи'):
+        job.run(records)
+
+    # откатанная пачка не оставила следов в памяти импорта
+    assert ('Плавание', 'Спорт') not in job.habits
+    assert job.cleared == {'2025-06-01'} and set(job.days) == {'2025-06-01'}
+    assert (job.stats['completions'], job.stats['batches']) == (1, 1)
+
+    # записанная пачка досчитана: день, стрик и итоги периода
+    assert _rows(db_path, 'SELECT date, day_number FROM discipline_days') == [('2025-06-01', 1)]
+    assert _rows(db_path, 'SELECT h.name, s.success_days FROM streaks s JOIN habits h ON h.id = s.habit_id '
+                          'WHERE s.success_days > 0') == [('Йога', 1)]
+    days_count, sums, _ = rollups.all_time_totals(connect(db_path))
+    assert days_count == 1 and sums[0] > 0
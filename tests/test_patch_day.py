@@ -0,0 +1,106 @@
+"""PATCH /api/completions/<date>: сохранение дня по разнице."""
+
+import pytest
+
+from server.connection import connect
+
+DAY = '2025-03-10'
+
+
+def _rows(app, day):
+    conn = connect(app.config['DATABASE'])
+    rows = conn.execute('SELECT habit_id, success, quantity, i, s FROM completed_habits '
+                        'WHERE date = ? ORDER BY habit_id', (day,)).fetchall()
+    totals = conn.execute('SELECT total_i, total_s, friction_index FROM discipline_days WHERE date = ?',
+                          (day,)).fetchone()
+    conn.rollback()
+    return rows, totals
+
+
+def test_patch_applies_only_the_difference(app, habit_ids, save_day):
+    a, b, c, d = habit_ids
+    save_day(DAY, {a: True, b: True, c: False})
+
+    res = save_day(DAY, {a: True, b: False, d: True}, method='PATCH')
+    assert res['changes'] == {'inserted': 1, 'updated': 1, 'deleted': 1}
+
+    again = save_day(DAY, {a: True, b: False, d: True}, method='PATCH')
+    assert again['changes'] == {'inserted': 0, 'updated': 0, 'deleted': 0}
+
+
+def test_patch_matches_full_save(app, habit_ids, save_day):
+    a, b, c, d = habit_ids
+    body = {a: True, b: False, d: True}
+    save_day('2025-03-11', {a: False, c: True})
+    save_day('2025-03-11', body, method='PATCH', friction_index=4)
+    save_day('2025-03-12', body, friction_index=4)
+
+    assert _rows(app, '2025-03-11') == _rows(app, '2025-03-12')
+
+
+def test_patch_keeps_unchanged_row_ids(app, habit_ids, save_day):
+    a, b = habit_ids[:2]
+    save_day(DAY, {a: True, b: True})
+    conn = connect(app.config['DATABASE'])
+    before = dict(conn.execute('SELECT habit_id, id FROM completed_habits WHERE date = ?', (DAY,)).fetchall())
+    conn.rollback()
+
+    save_day(DAY, {a: True, b: False}, method='PATCH')
+
+    after = dict(conn.execute('SELECT habit_id, id FROM completed_habits WHERE date = ?', (DAY,)).fetchall())
+    conn.rollback()
+    assert after == before
+
+
+def test_patch_rejects_malformed_date(client):
+    for bad in ('2025-13-01', 'yesterday', '2025-02-30'):
+        res = client.patch(f'/api/completions/{bad}', json={'habits': []})
+        assert res.status_code == 400
+        assert res.get_json()['status'] == 'error'
+
+
+@pytest.fixture
+def composite(client, app):
+    """Составная привычка с двумя подзадачами: (habit_id, [subtask_id, ...])."""
+    res = client.post('/api/habits', json={'name': 'Зарядка', 'category': 'Спорт', 'is_composite': True,
+                                           'subtasks': [{'name': 'Приседания'}, {'name': 'Планка'}]})
+    habit_id = res.get_json()['habit_id']
+    conn = connect(app.config['DATABASE'])
+    subtasks = [row[0] for row in conn.execute('SELECT id FROM habit_subtasks WHERE habit_id = ? ORDER BY id',
+                                               (habit_id,)).fetchall()]
+    conn.rollback()
+    return habit_id, subtasks
+
+
+def _body(habits, **fields):
+    return dict({'date': DAY, 'day_number': 2, 'habits': habits, 'totals': {'I': 1.0}}, **fields)
+
+
+def test_full_save_and_patch_write_the_same_rows(client, composite):
+    habit_id, (first, second) = composite
+    body = _body([{'habit_id': habit_id, 'subtask_id': first, 'success': True, 'quantity': 3},
+                  {'habit_id': habit_id, 'subtask_id': second, 'success': False}])
+    assert client.post('/api/completions', json=body).status_code == 200
+
+    res = client.patch(f'/api/completions/{DAY}', json=body)
+    assert res.get_json()['changes'] == {'inserted': 0, 'updated': 0, 'deleted': 0}
+
+
+def test_string_ids_match_stored_rows(client, composite):
+    habit_id, (first, second) = composite
+    client.post('/api/completions', json=_body([{'habit_id': habit_id, 'subtask_id': first, 'success': True}]))
+
+    res = client.patch(f'/api/completions/{DAY}',
+                       json=_body([{'habit_id': str(habit_id), 'subtask_id': str(first), 'success': False}]))
+    assert res.get_json()['changes'] == {'inserted': 0, 'updated': 1, 'deleted': 0}
+
+
+def test_repeated_patch_with_loose_types_is_a_no_op(client, habit_ids):
+    body = _body([{'habit_id': habit_ids[0], 'success': True, 'quantity': '5', 'i': '1.5'},
+                  {'habit_id': habit_ids[1], 'success': 1, 'quantity': 2}],
+                 day_number='2', state=7)
+    first = client.patch(f'/api/completions/{DAY}', json=body).get_json()['changes']
+    assert first == {'inserted': 2, 'updated': 0, 'deleted': 0}
+
+    again = client.patch(f'/api/completions/{DAY}', json=body).get_json()['changes']
+    assert again == {'inserted': 0, 'updated': 0, 'deleted': 0}
@@ -0,0 +1,56 @@
+"""Расписание повторений: next_due в planner_tasks, выборка и счётчики по индексу."""
+
+from datetime import date, timedelta
+
+from server import planner_due, planner_tasks
+
+TODAY = '2026-10-17'
+
+
+def _add(conn, project, filename, marks_on):
+    """Задача с отметками в указанные дни (обучающий проект — повторения)."""
+    planner_tasks.add_task(conn, project, filename, today=marks_on[0] if marks_on else TODAY)
+    for day in marks_on:
+        planner_tasks.set_mark(conn, project, filename, True, today=day)
+    return planner_tasks.get_task(conn, project, filename)
+
+
+def _days_ago(n):
+    return (date.fromisoformat(TODAY) - timedelta(days=n)).isoformat()
+
+
+def test_next_due_follows_intervals():
+    assert planner_due.next_due('!P', 'open', 0, TODAY) == TODAY
+    assert planner_due.next_due('!P', 'open', 1, TODAY) == _days_ago(-1)
+    assert planner_due.next_due('!P', 'open', 2, TODAY) == _days_ago(-3)
+    assert planner_due.next_due('!P', 'open', 3, TODAY) is None
+    assert planner_due.next_due('!P', 'done', 1, TODAY) is None
+    assert planner_due.next_due('P', 'open', 0, TODAY) is None
+
+
+def test_due_matches_brute_force(conn):
+    _add(conn, '!Слова', 'new.txt', [])                            # x=0 с сегодняшнего дня — сегодня
+    _add(conn, '!Слова', 'once.txt', [_days_ago(2)])               # x=1, +1 день — просрочена на 1
+    _add(conn, '!Слова', 'twice.txt', [_days_ago(5), _days_ago(1)])  # x=2, +3 дня — через 2 дня
+    _add(conn, '!Грамматика', 'done.txt', [_days_ago(9)] * 3)     # выполнена — не планируется
+    _add(conn, 'Проект', 'plain.txt', [])                          # не обучающий проект
+
+    due = planner_due.due(conn, TODAY)
+    expected = sorted((t['next_due'], t['filename'])
+                      for project in ('!Слова', '!Грамматика', 'Проект')
+                      for t in planner_tasks.list_tasks(conn, project)
+                      if t['next_due'] is not None and t['next_due'] <= TODAY)
+    assert [(d['next_due'], d['filename']) for d in due] == expected == [(_days_ago(1), 'once.txt'),
+                                                                         (TODAY, 'new.txt')]
+    assert due[0]['overdue_days'] == 1
+
+    summary = planner_due.summary(conn, TODAY)
+    assert (summary['overdue'], summary['due_today'], summary['due_total']) == (1, 1, 2)
+    assert summary['by_project'] == {'!Слова': 2}
+    assert {u['date']: u['count'] for u in summary['upcoming']}[_days_ago(-2)] == 1
+
+
+def test_due_uses_partial_index(conn):
+    plan = conn.execute('EXPLAIN QUERY PLAN SELECT id FROM planner_tasks '
+                        'WHERE next_due IS NOT NULL AND next_due <= ?', (TODAY,)).fetchall()
+    assert any('idx_planner_tasks_due' in row[-1] for row in plan)
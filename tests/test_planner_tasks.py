@@ -0,0 +1,109 @@
+"""planner_tasks: отметки задач и выгрузка состояния в имена файлов старого формата."""
+
+import os
+
+import pytest
+
+from server import planner_tasks
+
+TODAY = '2026-10-17'
+
+# последовательности отметок (True — отметить, False — снять)
+MARK_SEQUENCES = [
+    [],
+    [True],
+    [True, True],
+    [True, True, True],
+    [True, True, True, False],
+    [True, True, True, False, True],
+    [True, False],
+    [True, True, False, False, False],
+]
+
+
+def _apply(conn, project, filename, marks):
+    for mark in marks:
+        planner_tasks.set_mark(conn, project, filename, mark, today=TODAY)
+    return planner_tasks.get_task(conn, project, filename)
+
+
+def _state(task):
+    return task['state'], task['x_count'], task['date']
+
+
+def _round_trip(conn, root, project, task):
+    """Выгрузить задачу в имя старого формата и прочитать её заново из папки."""
+    os.makedirs(os.path.join(root, project), exist_ok=True)
+    name = planner_tasks.legacy_name(project, task, task['filename'])
+    with open(os.path.join(root, project, name), 'w', encoding='utf-8') as f:
+        f.write('содержимое')
+    conn.execute('DELETE FROM planner_tasks')
+    planner_tasks.reconcile(conn, root)
+    return planner_tasks.get_task(conn, project, name)
+
+
+@pytest.mark.parametrize('project', ['!Слова', 'Проект'])
+@pytest.mark.parametrize('marks', MARK_SEQUENCES)
+def test_legacy_name_round_trip(conn, tmp_path, project, marks):
+    planner_tasks.add_task(conn, project, 'Урок.txt', today=TODAY)
+    task = _apply(conn, project, 'Урок.txt', marks)
+
+    restored = _round_trip(conn, str(tmp_path / 'roadmaps'), project, task)
+
+    assert restored is not None
+    assert _state(restored) == _state(task)
+    assert restored['core'] == task['core']
+
+
+def test_unmark_finished_training_task_reopens_it(conn):
+    planner_tasks.add_task(conn, '!Слова', 'Урок.txt', today=TODAY)
+
+    done = _apply(conn, '!Слова', 'Урок.txt', [True] * planner_tasks.TRAINING_REPEATS)
+    assert done['completed'] and done['next_due'] is None
+
+    reopened = _apply(conn, '!Слова', 'Урок.txt', [False])
+    assert reopened['state'] == planner_tasks.STATE_OPEN
+    assert reopened['x_count'] == planner_tasks.TRAINING_REPEATS - 1
+    assert reopened['next_due'] is not None
+
+
+def test_toggle_training_marks_fully_repeated_tasks_done(conn):
+    conn.execute("INSERT INTO planner_tasks (project, filename, core, x_count) VALUES ('P', 'a xxx.txt', 'a', 3)")
+    conn.execute("INSERT INTO planner_tasks (project, filename, core) VALUES ('P', 'b.txt', 'b')")
+
+    planner_tasks.rename_project(conn, 'P', '!P', today=TODAY)
+
+    a, b = planner_tasks.list_tasks(conn, '!P')
+    assert a['completed'] and a['next_due'] is None
+    assert not b['completed'] and b['date'] == TODAY and b['next_due'] == TODAY
+
+
+def test_export_names_and_sync_round_trip(client, app):
+    root = app.config['ROADMAPS_DIR']
+    assert client.post('/api/planner/create_project', json={'name': 'Слова'}).status_code == 200
+    assert client.post('/api/planner/toggle_training', json={'project': 'Слова'}).get_json()['status'] == 'success'
+    project = '!Слова'
+    created = client.post('/api/planner/task', json={'project': project, 'filename': 'Урок.txt',
+                                                     'content': 'текст'}).get_json()
+    assert created['status'] == 'success'
+    for mark in (True, True, True, False):
+        res = client.post('/api/planner/complete', json={'project': project, 'filename': 'Урок.txt', 'mark': mark})
+        assert res.get_json()['status'] == 'success'
+    before = client.get(f'/api/planner/project/{project}').get_json()['data']
+
+    exported = client.post('/api/planner/export_names', json={'project': project}).get_json()
+    assert exported['status'] == 'success'
+    (renamed,) = exported['renamed']
+    assert os.listdir(os.path.join(root, project)) == [renamed['to']]
+
+    # другая установка: та же папка, но таблица пустая — состояние читается из имён
+    with app.app_context():
+        from server.connection import get_db
+        get_db().execute('DELETE FROM planner_tasks')
+        get_db().commit()
+    synced = client.post('/api/planner/sync').get_json()
+    assert synced['added'] == 1
+    after = client.get(f'/api/planner/project/{project}').get_json()['data']
+
+    keys = ('core', 'state', 'completed', 'x_count', 'date')
+    assert [{k: t[k] for k in keys} for t in after] == [{k: t[k] for k in keys} for t in before]
@@ -0,0 +1,28 @@
+"""Профиль запроса включает единицы работы писателя, а не только ожидание Future."""
+
+import os
+
+import pytest
+
+
+@pytest.fixture
+def profiled(app, tmp_path):
+    app.config.update(PROFILING=True, PROFILE_DIR=str(tmp_path / 'profiles'))
+    yield app.config['PROFILE_DIR']
+    app.config['PROFILING'] = False
+
+
+def test_profile_contains_write_units(client, habit_ids, profiled):
+    body = {'date': '2025-06-01', 'day_number': 1, 'friction_index': 1,
+            'habits': [{'habit_id': habit_ids[0], 'success': True, 'i': 1.0}]}
+    res = client.post('/api/completions', json=body, headers={'X-Profile': '1'})
+    assert res.status_code == 200, res.get_json()
+    name = res.headers['X-Profile']
+    assert name not in ('', 'busy')
+
+    with open(os.path.join(profiled, name + '.txt'), encoding='utf-8') as f:
+        summary = f.read()
+    # единица сохранения дня и её SQL видны в профиле запроса
+    assert '_store_day' in summary
+    assert 'INSERT INTO completed_habits' in summary
+
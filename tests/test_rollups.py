@@ -0,0 +1,94 @@
+"""period_rollups: инкрементальные дельты против полной перестройки и средние против SQL AVG."""
+
+import random
+from datetime import date, timedelta
+
+import pytest
+
+from server import rollups
+
+START = date(2024, 1, 1)
+DAYS = 120
+
+
+def _rollup_rows(conn):
+    cursor = conn.execute('SELECT * FROM period_rollups ORDER BY kind, period_key')
+    return [tuple(round(v, 6) if isinstance(v, float) else v for v in row) for row in cursor.fetchall()]
+
+
+def _random_totals(rng):
+    # дни из планировщика (быстрая отметка) создаются с NULL-итогами, дельты заполняют их частично
+    kind = rng.random()
+    if kind < 0.2:
+        return (None,) * len(rollups.TOTAL_COLUMNS)
+    if kind < 0.4:
+        return tuple(rng.choice([None, rng.randint(-3, 10)]) for _ in rollups.TOTAL_COLUMNS)
+    return tuple(float(rng.randint(-5, 20)) for _ in rollups.TOTAL_COLUMNS)
+
+
+def _write_day(conn, date_str, totals):
+    before = rollups.snapshot_days(conn, [date_str])
+    if totals is False:
+        conn.execute('DELETE FROM discipline_days WHERE date = ?', (date_str,))
+    else:
+        conn.execute(
+            'INSERT OR REPLACE INTO discipline_days (date, day_number, ' + ', '.join(rollups.TOTAL_COLUMNS) + ') '
+            'VALUES (?, 1, ' + ', '.join('?' * len(rollups.TOTAL_COLUMNS)) + ')', (date_str,) + totals)
+    rollups.apply_day_changes(conn, before)
+
+
+@pytest.fixture
+def history(conn):
+    rng = random.Random(7)
+    for _ in range(400):
+        day = (START + timedelta(days=rng.randrange(DAYS))).isoformat()
+        _write_day(conn, day, False if rng.random() < 0.15 else _random_totals(rng))
+    return conn
+
+
+def test_incremental_rollups_match_rebuild(history):
+    incremental = _rollup_rows(history)
+    rollups.rebuild(history)
+    assert _rollup_rows(history) == incremental
+
+
+@pytest.mark.parametrize('offset,length', [(0, DAYS), (3, 7), (10, 45), (31, 60), (50, 1), (100, 30)])
+def test_range_totals_match_sql(history, offset, length):
+    start = START + timedelta(days=offset)
+    end = start + timedelta(days=length - 1)
+    days_count, sums, counts = rollups.range_totals(history, start, end)
+
+    columns = rollups.TOTAL_COLUMNS
+    row = history.execute(
+        'SELECT COUNT(*), ' + ', '.join(f'COALESCE(SUM({c}), 0), AVG({c})' for c in columns)
+        + ' FROM discipline_days WHERE date BETWEEN ? AND ?', (start.isoformat(), end.isoformat())).fetchone()
+    assert days_count == row[0]
+    for i in range(len(columns)):
+        expected_sum, expected_avg = row[1 + 2 * i], row[2 + 2 * i]
+        assert sums[i] == pytest.approx(expected_sum)
+        assert (sums[i] / counts[i] if counts[i] else None) == pytest.approx(expected_avg)
+
+
+def test_all_time_totals_skip_null_days(history):
+    days_count, sums, counts = rollups.all_time_totals(history)
+    row = history.execute('SELECT COUNT(*), COUNT(total_i), AVG(total_i) FROM discipline_days').fetchone()
+    assert (days_count, counts[0]) == row[:2]
+    assert counts[0] < days_count
+    assert sums[0] / counts[0] == pytest.approx(row[2])
+
+
+def test_old_rollups_without_counts_are_rebuilt(db_path, conn):
+    from server.db import init_db
+    _write_day(conn, '2024-01-01', (1.0,) * len(rollups.TOTAL_COLUMNS))
+    _write_day(conn, '2024-01-02', (None,) * len(rollups.TOTAL_COLUMNS))
+    conn.execute('DROP TABLE period_rollups')
+    conn.execute('CREATE TABLE period_rollups (kind TEXT NOT NULL, period_key TEXT NOT NULL, '
+                 'days_count INTEGER DEFAULT 0, ' + ', '.join(f'{c} REAL DEFAULT 0.0' for c in rollups.SUM_COLUMNS)
+                 + ', PRIMARY KEY (kind, period_key))')
+    conn.execute("INSERT INTO period_rollups (kind, period_key, days_count, sum_i) VALUES ('all', 'all', 2, 1.0)")
+    conn.commit()
+
+    init_db(db_path)
+
+    days_count, sums, counts = rollups.all_time_totals(conn)
+    assert (days_count, sums[0], counts[0]) == (2, 1.0, 1)
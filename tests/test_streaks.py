@@ -0,0 +1,66 @@
+"""Стрики и итоги, поддерживаемые при каждом сохранении дня, против полной перестройки."""
+
+import random
+from datetime import date, timedelta
+
+from server import rollups, streaks
+from server.connection import connect
+
+START = date(2025, 1, 1)
+DAYS = 60
+
+
+def _snapshot(conn):
+    def rows(sql):
+        return [tuple(round(v, 6) if isinstance(v, float) else v for v in row)
+                for row in conn.execute(sql).fetchall()]
+    return {
+        'streaks': rows('SELECT habit_id, current_streak, longest_streak, last_date, success_days, first_date '
+                        'FROM streaks WHERE success_days > 0 ORDER BY habit_id'),
+        'runs': rows('SELECT habit_id, start_date, end_date, length FROM streak_runs ORDER BY habit_id, start_date'),
+        # после переноса дня у периода может остаться пустая строка (days_count = 0) — перестройка её не создаёт
+        'rollups': rows('SELECT * FROM period_rollups WHERE days_count > 0 ORDER BY kind, period_key'),
+    }
+
+
+def test_incremental_matches_full_rebuild(app, client, habit_ids, save_day):
+    rng = random.Random(11)
+    for step in range(150):
+        day = (START + timedelta(days=rng.randrange(DAYS))).isoformat()
+        if step % 25 == 24:
+            target = (START + timedelta(days=rng.randrange(DAYS))).isoformat()
+            assert client.post('/api/completions/change_date',
+                               json={'old_date': day, 'new_date': target}).status_code == 200
+            continue
+        done = {habit_id: rng.random() < 0.7 for habit_id in rng.sample(habit_ids, rng.randint(0, len(habit_ids)))}
+        save_day(day, done, method=rng.choice(['POST', 'PATCH', 'DIFF']))
+
+    conn = connect(app.config['DATABASE'])
+    incremental = _snapshot(conn)
+    assert incremental['runs'], 'история должна содержать серии'
+
+    streaks.rebuild_all(conn)
+    rollups.rebuild(conn)
+    rebuilt = _snapshot(conn)
+    conn.rollback()
+
+    assert incremental == rebuilt
+
+
+def test_streak_breaks_and_heals(app, habit_ids, save_day):
+    habit = habit_ids[0]
+    for offset in range(5):
+        save_day((START + timedelta(days=offset)).isoformat(), {habit: True})
+    conn = connect(app.config['DATABASE'])
+
+    def row():
+        values = conn.execute('SELECT current_streak, longest_streak FROM streaks WHERE habit_id = ?',
+                              (habit,)).fetchone()
+        conn.rollback()
+        return values
+
+    assert row() == (5, 5)
+    save_day((START + timedelta(days=2)).isoformat(), {habit: False})
+    assert row() == (2, 2)
+    save_day((START + timedelta(days=2)).isoformat(), {habit: True}, method='PATCH')
+    assert row() == (5, 5)
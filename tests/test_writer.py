@@ -0,0 +1,118 @@
+"""WriteQueue: пачка в одной транзакции, SAVEPOINT на единицу, откат только упавшей."""
+
+import threading
+
+import pytest
+
+from server import metrics
+from server.connection import connect
+from server.writer import WriteQueue
+
+
+@pytest.fixture
+def queue(db_path):
+    writer = WriteQueue(db_path)
+    connect(db_path).execute('CREATE TABLE t (v INTEGER UNIQUE)')
+    connect(db_path).commit()
+    yield writer
+    writer.stop()
+
+
+def _insert(conn, value):
+    conn.execute('INSERT INTO t (v) VALUES (?)', (value,))
+    return value
+
+
+def _values(db_path):
+    conn = connect(db_path)
+    values = [row[0] for row in conn.execute('SELECT v FROM t ORDER BY v').fetchall()]
+    conn.rollback()
+    return values
+
+
+def _hold(queue):
+    """Занять писателя единицей, которая ждёт события, — следующие соберутся в одну пачку."""
+    started, release = threading.Event(), threading.Event()
+
+    def unit(conn):
+        started.set()
+        release.wait(5)
+
+    future = queue.submit(unit)
+    started.wait(5)
+    return future, release
+
+
+def test_failed_unit_rolls_back_alone(queue, db_path):
+    held, release = _hold(queue)
+    batches = queue.batches
+
+    def partial_then_fail(conn):
+        _insert(conn, 100)
+        _insert(conn, 1)          # нарушает UNIQUE: откатывается вся единица, включая 100
+
+    futures = [queue.submit(_insert, 1), queue.submit(partial_then_fail), queue.submit(_insert, 2)]
+    release.set()
+    held.result(5)
+
+    assert futures[0].result(5) == 1
+    with pytest.raises(Exception, match='UNIQUE'):
+        futures[1].result(5)
+    assert futures[2].result(5) == 2
+    assert _values(db_path) == [1, 2]
+    # удерживающая единица — своя пачка, три остальные — одна общая
+    assert queue.batches == batches + 2
+
+
+def test_exception_type_is_preserved(queue, db_path):
+    def boom(conn):
+        _insert(conn, 7)
+        raise KeyError('нет такой привычки')
+
+    with pytest.raises(KeyError):
+        queue.write(boom)
+    assert queue.write(_insert, 8) == 8
+    assert _values(db_path) == [8]
+
+
+def test_nested_write_runs_in_the_same_transaction(queue, db_path):
+    def outer(conn):
+        _insert(conn, 1)
+        inner = queue.write(_insert, 2)     # из потока писателя — сразу, без очереди
+        raise RuntimeError(f'после вложенной записи {inner}')
+
+    with pytest.raises(RuntimeError):
+        queue.write(outer)
+    # вложенная запись была частью единицы outer и откатилась вместе с ней
+    assert _values(db_path) == []
+
+
+def test_writes_are_visible_to_readers_after_result(queue, db_path):
+    for value in range(20):
+        queue.submit(_insert, value)
+    queue.write(_insert, 100)
+    assert _values(db_path) == list(range(20)) + [100]
+
+
+def test_profiled_request_writes_in_its_own_thread(queue, db_path):
+    stats = metrics.RequestStats()
+    stats.profiling = True
+    metrics.bind(stats)
+    try:
+        threads = []
+
+        def outer(conn):
+            threads.append(threading.current_thread())
+            _insert(conn, 1)
+            queue.write(_insert, 2)            # вложенная — в той же транзакции
+            raise RuntimeError('откатить обе')
+
+        with pytest.raises(RuntimeError):
+            queue.write(outer)
+        assert queue.write(_insert, 3) == 3
+        assert metrics.current() is stats
+    finally:
+        metrics.bind(None)
+    assert threads == [threading.current_thread()]
+    assert stats.commits == 2
+    assert _values(db_path) == [3]